@@ -2,7 +2,9 @@
 Django settings for backend project.
 """
 
+import importlib.util
 import os
+import re
 from pathlib import Path
 from datetime import timedelta
 import dj_database_url
@@ -41,6 +43,7 @@ INSTALLED_APPS = [
 
 # ── Middleware ──
 MIDDLEWARE = [
+    'dashboard.profiling.ProfilingMiddleware',  # no-op unless PROFILING_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -63,7 +66,9 @@ CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_HEADERS = [
     'accept', 'accept-encoding', 'authorization', 'content-type',
     'dnt', 'origin', 'user-agent', 'x-csrftoken', 'x-requested-with',
+    'idempotency-key', 'x-profile', 'x-plant',
 ]
+CORS_EXPOSE_HEADERS = ['x-profile-id']
 
 ROOT_URLCONF = 'backend.urls'
 
@@ -86,11 +91,24 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 # ── Database ──
+# Postgres uses a psycopg 3 connection pool per process; DB_POOL=False falls
+# back to one persistent connection per thread. Keep gunicorn workers x
+# DB_POOL_MAX_SIZE (plus job workers) under the server's connection limit.
+# Without DATABASE_URL, SQLite is used.
+DB_POOL = os.environ.get('DB_POOL', 'True') == 'True'
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '5'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))  # seconds to wait for a free connection
+DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', '1800'))  # recycle connections after this
+DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', '300'))  # close surplus idle connections after this
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '600'))  # unpooled persistent connections only
+
 try:
     DATABASES = {
         'default': dj_database_url.config(
             default='sqlite:///' + str(BASE_DIR / 'db.sqlite3'),
-            conn_max_age=600
+            conn_max_age=DB_CONN_MAX_AGE,
+            conn_health_checks=True,
         )
     }
 except Exception as e:
@@ -102,6 +120,21 @@ except Exception as e:
         }
     }
 
+if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    if importlib.util.find_spec('psycopg_pool') is None:
+        print("WARNING: psycopg_pool is not installed; using unpooled database connections.")
+    else:
+        # With CONN_HEALTH_CHECKS on, Django has the pool ping each connection
+        # as it is checked out and replace broken ones.
+        DATABASES['default']['CONN_MAX_AGE'] = 0  # the pool owns connection reuse
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+            'max_lifetime': DB_POOL_MAX_LIFETIME,
+            'max_idle': DB_POOL_MAX_IDLE,
+        }
+
 # ── Auth ──
 AUTH_USER_MODEL = 'users.CustomUser'
 
@@ -124,10 +157,14 @@ REST_FRAMEWORK = {
 
 # ── JWT Settings ──
 SIMPLE_JWT = {
+    # Also how long /api/snapshots/ keeps trusting a token's claims (see SNAPSHOTS_ENABLED).
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=12),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Tokens carry the user's role and plant code (see dashboard.snapshots).
+    'TOKEN_OBTAIN_SERIALIZER': 'dashboard.serializers.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'dashboard.serializers.ClaimsTokenRefreshSerializer',
 }
 
 # ── i18n ──
@@ -140,6 +177,170 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'dashboard.staticfiles.ViteManifestStaticFilesStorage',
+    },
+}
+
+# ── Frontend ──
+# Integrated mode: Django serves the Vite build (frontend/dist) through
+# WhiteNoise. Build it with `VITE_BASE=/static/ VITE_API_URL=/api npm run build`
+# before `collectstatic`; index.html is served for every non-API path.
+SERVE_FRONTEND = os.environ.get('SERVE_FRONTEND', 'False') == 'True'
+FRONTEND_DIST_DIR = BASE_DIR / 'frontend' / 'dist'
+FRONTEND_INDEX_MAX_AGE = int(os.environ.get('FRONTEND_INDEX_MAX_AGE', '0'))  # seconds; revalidated by ETag after
+if SERVE_FRONTEND:
+    STATICFILES_DIRS.append(FRONTEND_DIST_DIR)
+
+
+def WHITENOISE_IMMUTABLE_FILE_TEST(path, url):
+    # Cache forever: Django's hashed copies (name.0123456789ab.css) and
+    # Vite's hashed build output (assets/name-AbC12_-x.js).
+    return bool(re.match(r'^/static/(.+\.[0-9a-f]{12}\.\w+|assets/.+-[\w-]{8}\.\w+)$', url))
+
+# ── Plants ──
+# Rows created without a plant (and by admins not scoped to one) go here.
+DEFAULT_PLANT_CODE = os.environ.get('DEFAULT_PLANT_CODE', 'main')
+
+# ── Background Jobs ──
+JOBS_CONCURRENCY = int(os.environ.get('JOBS_CONCURRENCY', '2'))
+JOBS_WORKER_MODE = os.environ.get('JOBS_WORKER_MODE', 'threads')  # 'threads' or 'processes'
+JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', '1.0'))
+JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', '3'))
+JOBS_RETRY_BACKOFF = float(os.environ.get('JOBS_RETRY_BACKOFF', '10'))  # seconds, doubled per attempt
+JOBS_MAX_BACKOFF = float(os.environ.get('JOBS_MAX_BACKOFF', '3600'))
+JOBS_STALE_TIMEOUT = int(os.environ.get('JOBS_STALE_TIMEOUT', '1800'))
+# Running jobs refresh locked_at this often (seconds); keep it well under the stale timeout.
+JOBS_HEARTBEAT_INTERVAL = float(os.environ.get('JOBS_HEARTBEAT_INTERVAL', '60'))
+
+# ── Activity Feed ──
+ACTIVITY_BUFFER_SIZE = int(os.environ.get('ACTIVITY_BUFFER_SIZE', '50'))
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', '2.0'))  # seconds
+ACTIVITY_RETENTION_DAYS = int(os.environ.get('ACTIVITY_RETENTION_DAYS', '90'))
+
+# ── Archival ──
+ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', '12'))
+ARCHIVE_LIST_LIMIT = int(os.environ.get('ARCHIVE_LIST_LIMIT', '500'))
+
+# ── Dedupe ──
+# Identical gas tanks count as one double-submit only when each was created
+# within this many seconds of the previous copy.
+DEDUPE_SUBMIT_WINDOW = int(os.environ.get('DEDUPE_SUBMIT_WINDOW', '120'))
+
+# ── Inventory Valuation ──
+# 'average' (weighted-average cost) or 'fifo'; run rebuild_valuation after changing it.
+INVENTORY_VALUATION_METHOD = os.environ.get('INVENTORY_VALUATION_METHOD', 'average')
+
+# ── Cycle Counts ──
+CYCLE_COUNT_MAX_LINES = int(os.environ.get('CYCLE_COUNT_MAX_LINES', '5000'))  # SKUs per uploaded count
+
+# ── Gas Forecasting ──
+GAS_FORECAST_HISTORY_DAYS = int(os.environ.get('GAS_FORECAST_HISTORY_DAYS', '120'))  # readings older than this are ignored
+GAS_MIN_READINGS = int(os.environ.get('GAS_MIN_READINGS', '3'))  # below this a tank uses its gas type's average rate
+GAS_FORECAST_Z = float(os.environ.get('GAS_FORECAST_Z', '1.64'))  # width of the empty-date band (1.64 ≈ 90%)
+GAS_REFILL_THRESHOLD = float(os.environ.get('GAS_REFILL_THRESHOLD', '0.05'))  # rise, as a fraction of capacity, that counts as a refill
+GAS_REORDER_FRACTION = float(os.environ.get('GAS_REORDER_FRACTION', '0.15'))  # refill before a tank drops below this
+GAS_REFILL_WINDOW_DAYS = float(os.environ.get('GAS_REFILL_WINDOW_DAYS', '7'))  # how early a tank may be topped up
+GAS_SCHEDULE_HORIZON_DAYS = int(os.environ.get('GAS_SCHEDULE_HORIZON_DAYS', '60'))
+GAS_DELIVERY_COST = float(os.environ.get('GAS_DELIVERY_COST', '0'))  # fixed cost of one delivery trip
+GAS_BATCH_BY_TYPE = os.environ.get('GAS_BATCH_BY_TYPE', 'False') == 'True'  # separate trips per gas type (one supplier each)
+GAS_REFRESH_DELAY = int(os.environ.get('GAS_REFRESH_DELAY', '30'))  # seconds; readings within it share one refresh
+
+# ── Periodic Reports ──
+# Generated by the `reports.generate_due` job (started with
+# `manage.py generate_reports --schedule`) or by running the command from cron.
+REPORTS_DIR = os.environ.get('REPORTS_DIR', str(BASE_DIR / 'reports'))
+REPORTS_FORMATS = [f for f in os.environ.get('REPORTS_FORMATS', 'xlsx,pdf').split(',') if f]  # xlsx, pdf, csv
+REPORTS_LOOKBACK = int(os.environ.get('REPORTS_LOOKBACK', '2'))  # complete weeks/months rechecked per run
+REPORTS_SCHEDULE_INTERVAL = int(os.environ.get('REPORTS_SCHEDULE_INTERVAL', '86400'))  # seconds between runs, 0 = once
+REPORTS_DOWNLOAD_MAX_AGE = int(os.environ.get('REPORTS_DOWNLOAD_MAX_AGE', '86400'))  # seconds
+
+# ── Webhooks ──
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', '100'))  # events per POST to one endpoint
+WEBHOOK_BATCH_DELAY = int(os.environ.get('WEBHOOK_BATCH_DELAY', '5'))  # seconds; events within it share one delivery run
+WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', '10'))  # seconds per request
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '8'))  # then the delivery is dead-lettered
+WEBHOOK_RETRY_BACKOFF = float(os.environ.get('WEBHOOK_RETRY_BACKOFF', '30'))  # seconds, doubled per attempt
+WEBHOOK_MAX_BACKOFF = float(os.environ.get('WEBHOOK_MAX_BACKOFF', '21600'))
+
+# ── Admin ──
+# Changelists of large tables (tasks, QC reports) count at most this many
+# matching rows; bigger unfiltered Postgres tables show the planner's estimate.
+ADMIN_COUNT_LIMIT = int(os.environ.get('ADMIN_COUNT_LIMIT', '10000'))
+
+# ── Viewer Snapshots ──
+# Pre-rendered JSON of the dashboard and lists for viewers, rebuilt by the
+# worker after writes; serve them at /api/snapshots/<name>/.
+#
+# Trade-off: to serve without queries, the snapshot view trusts the role and
+# plant claims of the access token and never loads the user. A user who is
+# deactivated, moved to another plant or given another role keeps reading the
+# snapshots their token names until it expires: up to
+# SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'] (12 hours). Every other endpoint reads
+# the user and sees the change at once. The frontend does not refresh tokens,
+# so shortening the lifetime also logs everyone out sooner; if that window is
+# too long for you, shorten it and accept the extra logins, or leave
+# snapshots off.
+SNAPSHOTS_ENABLED = os.environ.get('SNAPSHOTS_ENABLED', 'False') == 'True'
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', str(BASE_DIR / 'snapshots'))
+SNAPSHOT_DELAY = int(os.environ.get('SNAPSHOT_DELAY', '10'))  # seconds; writes within it share one rebuild
+
+# ── Barcode Scans ──
+SCAN_CACHE_SIZE = int(os.environ.get('SCAN_CACHE_SIZE', '10000'))  # scanned codes resolved per process
+SCAN_BATCH_MAX = int(os.environ.get('SCAN_BATCH_MAX', '1000'))  # events per POST /api/scan/
+
+# ── Idempotency Keys ──
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', '86400'))  # seconds a stored response is replayed
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', '60'))  # seconds before an unfinished key is abandoned
+IDEMPOTENCY_WAIT = float(os.environ.get('IDEMPOTENCY_WAIT', '5'))  # seconds a duplicate waits for the original
+IDEMPOTENCY_MAX_RECORDS = int(os.environ.get('IDEMPOTENCY_MAX_RECORDS', '50000'))
+IDEMPOTENCY_PRUNE_EVERY = int(os.environ.get('IDEMPOTENCY_PRUNE_EVERY', '100'))  # new keys between prunes
+
+# ── Profiling ──
+# Admins send `X-Profile: 1` to profile a request; PROFILING_SAMPLE_RATE
+# profiles that fraction of all requests. Summarize with `manage.py profile_report`.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'sample')  # 'sample' or 'cprofile'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_SAMPLE_INTERVAL = float(os.environ.get('PROFILING_SAMPLE_INTERVAL', '0.005'))  # seconds
+PROFILING_DIR = os.environ.get('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', '200'))
+
+# ── Batch Requests ──
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '20'))
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '4'))  # threads for parallel GETs
+
+# ── Response Cache ──
+# Backend for cached API responses: 'locmem' (per process, LRU), 'file' or 'db'
+# (shared between processes; run `manage.py createcachetable` for 'db').
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'locmem')
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', '300'))  # seconds, 0 disables
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+
+_RESPONSE_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'dashboard-responses'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache',
+             os.environ.get('RESPONSE_CACHE_DIR', str(BASE_DIR / '.cache' / 'responses'))),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'dashboard_response_cache'),
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': _RESPONSE_CACHE_BACKENDS[RESPONSE_CACHE_BACKEND][0],
+        'LOCATION': _RESPONSE_CACHE_BACKENDS[RESPONSE_CACHE_BACKEND][1],
+        'TIMEOUT': RESPONSE_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': RESPONSE_CACHE_MAX_ENTRIES,
+            # file/db backends evict 1/CULL_FREQUENCY of entries when full.
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
@@ -1,8 +1,9 @@
 """
 URL configuration for backend project.
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.shortcuts import redirect
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 # Remove this line: from dashboard.views import RegisterView  # This was causing the issue
@@ -13,6 +14,14 @@ urlpatterns = [
     path('users/', include('users.urls')),  # If you have users app
 ]
 
+# Integrated mode: every other path is a client-side route of the React app.
+if settings.SERVE_FRONTEND:
+    from dashboard.views import spa_index
+
+    urlpatterns += [
+        re_path(r'^(?!api/|admin/|users/|static/).*$', spa_index, name='spa_index'),
+    ]
+
 # Optional: Redirect root to dashboard
 # urlpatterns += [
 #     path('', lambda request: redirect('dashboard/')),
@@ -0,0 +1,91 @@
+"""
+Server-side activity log.
+
+ViewSets call ``record()`` after a write. Events are held in an in-process
+buffer and written with one ``bulk_create`` per batch by a background flusher
+thread, so logging never adds an INSERT to the request that caused it.
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ActivityEvent
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    def __init__(self):
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, event):
+        with self._lock:
+            # If the database is unreachable, drop the oldest events rather
+            # than growing without bound.
+            if len(self._events) >= settings.ACTIVITY_BUFFER_SIZE * 10:
+                self._events.popleft()
+            self._events.append(event)
+            full = len(self._events) >= settings.ACTIVITY_BUFFER_SIZE
+        self._ensure_flusher()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            batch = list(self._events)
+            self._events.clear()
+        if not batch:
+            return 0
+        try:
+            ActivityEvent.objects.bulk_create(batch, batch_size=500)
+        except Exception:
+            logger.exception("Dropped %s activity events", len(batch))
+            return 0
+        return len(batch)
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='activity-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(settings.ACTIVITY_FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+            connection.close()
+
+
+_buffer = EventBuffer()
+atexit.register(_buffer.flush)
+
+
+def flush():
+    """Write any buffered events now. Returns the number written."""
+    return _buffer.flush()
+
+
+def record(user, verb, instance):
+    """Queue an activity event for ``instance``; it is kept only if the write commits."""
+    event = ActivityEvent(
+        user=user if user is not None and user.is_authenticated else None,
+        username=getattr(user, 'username', '') or '',
+        plant_id=getattr(instance, 'plant_id', None),
+        verb=verb,
+        resource=instance._meta.model_name,
+        object_id=str(instance.pk) if instance.pk is not None else '',
+        object_repr=str(instance)[:200],
+        created_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: _buffer.add(event))
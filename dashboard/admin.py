@@ -1,21 +1,127 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Powder, Task, QCReport, GasRecord
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+
+from .models import Powder, Task, QCReport, GasRecord, WebhookEndpoint, WebhookDelivery
+from .pagination import keyset_page
+
+CURSOR_VAR = 'cursor'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts that stay cheap on big tables: an unfiltered Postgres table
+    reports the planner's row estimate (``reltuples``) once it is past
+    ``ADMIN_COUNT_LIMIT``, and filtered counts stop at that limit.
+    """
+    estimated = capped = False
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        queryset = self.object_list
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > limit:
+                self.estimated = True
+                return row[0]
+        count = queryset.order_by()[:limit + 1].count()
+        self.capped = count > limit
+        return min(count, limit)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Pages newest-first with a ``?cursor=`` instead of ``OFFSET``, so the
+    last page costs what the first does. Sorting by a column falls back to
+    numbered pages.
+    """
+
+    def get_results(self, request):
+        self.keyset = ORDER_VAR not in self.params
+        if not self.keyset:
+            return super().get_results(request)
+
+        cursor = request.keyset_cursor
+        try:
+            rows, next_cursor = keyset_page(self.queryset, cursor, self.list_per_page)
+        except ValidationError:
+            raise IncorrectLookupParameters
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = bool(cursor or next_cursor)
+        self.first_page_url = self.get_query_string() if cursor else None
+        self.next_page_url = self.get_query_string({CURSOR_VAR: next_cursor}) if next_cursor else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist for tables with millions of rows: no exact counts, keyset pages."""
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    change_list_template = 'admin/keyset_change_list.html'
+
+    def changelist_view(self, request, extra_context=None):
+        # The cursor is not a field lookup; ChangeList would reject it as one.
+        request.keyset_cursor = request.GET.get(CURSOR_VAR)
+        if request.keyset_cursor is not None:
+            request.GET = request.GET.copy()
+            del request.GET[CURSOR_VAR]
+        return super().changelist_view(request, extra_context)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
 
 @admin.register(Powder)
 class PowderAdmin(admin.ModelAdmin):
-    list_display = ('name', 'sku', 'current_stock', 'min_level', 'status')
+    list_display = ('name', 'sku', 'plant', 'current_stock', 'min_level', 'stock_status')
+    list_filter = ('plant',)
     search_fields = ('name', 'sku')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_status()
+
+    @admin.display(description='Status', ordering='stock_status')
+    def stock_status(self, obj):
+        return obj.stock_status
+
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
-    list_display = ('title', 'status', 'priority', 'assignee')
-    list_filter = ('status', 'priority')
+class TaskAdmin(LargeTableAdmin):
+    list_display = ('title', 'plant', 'status', 'priority', 'assignee', 'created_at')
+    list_filter = ('plant', 'status')
+    search_fields = ('title__startswith',)
 
 @admin.register(QCReport)
-class QCReportAdmin(admin.ModelAdmin):
-    list_display = ('batch_id', 'powder_type', 'inspector', 'date', 'result')
-    list_filter = ('result', 'date')
+class QCReportAdmin(LargeTableAdmin):
+    list_display = ('batch_id', 'plant', 'powder_type', 'inspector', 'date', 'result')
+    list_filter = ('plant', 'result')
+    search_fields = ('batch_id__startswith',)
+    date_hierarchy = 'date'
 
 @admin.register(GasRecord)
 class GasRecordAdmin(admin.ModelAdmin):
-    list_display = ('type', 'current_level', 'capacity', 'refill_date')
\ No newline at end of file
+    list_display = ('type', 'plant', 'current_level', 'capacity', 'refill_date')
+    list_filter = ('plant',)
+
+@admin.register(WebhookEndpoint)
+class WebhookEndpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'url', 'plant', 'is_active', 'last_success_at', 'last_failure_at')
+    list_filter = ('is_active', 'plant')
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'endpoint', 'event', 'status', 'attempts', 'next_attempt_at', 'created_at')
+    list_filter = ('status', 'event')
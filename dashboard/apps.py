@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'dashboard'
\ No newline at end of file
+    name = 'dashboard'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import gas, reports, snapshots, webhooks  # noqa: F401  (register job handlers)
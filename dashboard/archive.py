@@ -0,0 +1,132 @@
+"""
+Hot/cold archival.
+
+Closed rows (done tasks, old QC reports, gas tanks left empty) are moved into
+``ArchivedRecord`` as compressed JSON so the live tables and their indexes
+only hold working data. A tank's reading history is stored in its payload
+(its forecast is derived and simply dropped). List and detail endpoints
+read the archive only when asked with ``?include_archived=1``.
+"""
+import json
+import zlib
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedRecord, Task, QCReport, GasRecord, GasReading
+from .serializers import TaskSerializer, QCReportSerializer, GasRecordSerializer, GasReadingSerializer
+
+
+class ArchivePolicy:
+    def __init__(self, model, serializer_class, closed, record_date, related=(), extra=None):
+        self.model = model
+        self.serializer_class = serializer_class
+        # closed(cutoff) -> Q selecting rows that may be archived
+        self.closed = closed
+        # record_date(instance) -> the date the archive is indexed by
+        self.record_date = record_date
+        # relations the serializer reads, fetched with the candidates
+        self.related = related
+        # extra(rows) -> {pk: dict} of dependent data stored with each row,
+        # for dependents that are deleted along with it
+        self.extra = extra
+
+    @property
+    def name(self):
+        return self.model._meta.model_name
+
+    def candidates(self, cutoff):
+        qs = self.model.objects.filter(self.closed(cutoff)).order_by('pk')
+        return qs.select_related(*self.related) if self.related else qs
+
+
+def _gas_readings(tanks):
+    """The level history of ``tanks``, oldest first."""
+    readings = {tank.pk: [] for tank in tanks}
+    rows = GasReading.objects.filter(tank__in=tanks).order_by('recorded_at', 'id')
+    for item in GasReadingSerializer(rows, many=True).data:
+        readings[item['tank']].append(dict(item))
+    return {pk: {'readings': history} for pk, history in readings.items()}
+
+
+POLICIES = {
+    policy.name: policy for policy in (
+        ArchivePolicy(Task, TaskSerializer,
+                      lambda cutoff: Q(status='done', updated_at__lt=cutoff),
+                      lambda task: task.updated_at.date(),
+                      related=('assignee',)),
+        ArchivePolicy(QCReport, QCReportSerializer,
+                      lambda cutoff: Q(date__lt=cutoff.date()),
+                      lambda report: report.date),
+        # Tanks are live records; only one left empty and untouched is closed.
+        ArchivePolicy(GasRecord, GasRecordSerializer,
+                      lambda cutoff: Q(current_level__lte=0, updated_at__lt=cutoff),
+                      lambda record: record.updated_at.date(),
+                      extra=_gas_readings),
+    )
+}
+
+
+def compress(data):
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode(), 6)
+
+
+def decompress(payload):
+    return json.loads(zlib.decompress(bytes(payload)))
+
+
+def cutoff_for(months):
+    return timezone.now() - timedelta(days=30 * months)
+
+
+def archive(policy, cutoff, batch_size=1000):
+    """Move every closed row older than ``cutoff`` into the archive. Returns the count."""
+    moved = 0
+    while True:
+        rows = list(policy.candidates(cutoff)[:batch_size])
+        if not rows:
+            return moved
+        data = policy.serializer_class(rows, many=True).data
+        extra = policy.extra(rows) if policy.extra else {}
+        records = [
+            ArchivedRecord(
+                model_name=policy.name,
+                original_id=row.pk,
+                plant_id=row.plant_id,
+                record_date=policy.record_date(row),
+                payload=compress({**item, **extra.get(row.pk, {})}),
+            )
+            for row, item in zip(rows, data)
+        ]
+        with transaction.atomic():
+            ArchivedRecord.objects.bulk_create(records)
+            policy.model.objects.filter(pk__in=[row.pk for row in rows]).delete()
+        moved += len(rows)
+
+
+def archived_rows(model, date_from=None, date_to=None, limit=500, plant=None):
+    """
+    Decoded archive payloads for ``model``, newest first, flagged
+    ``archived: true``; only those of ``plant`` (an id) when given.
+    """
+    qs = ArchivedRecord.objects.filter(model_name=model._meta.model_name)
+    if plant is not None:
+        qs = qs.filter(plant_id=plant)
+    if date_from:
+        qs = qs.filter(record_date__gte=date_from)
+    if date_to:
+        qs = qs.filter(record_date__lte=date_to)
+    return [
+        {**decompress(payload), 'archived': True}
+        for payload in qs.order_by('-record_date', '-original_id').values_list('payload', flat=True)[:limit]
+    ]
+
+
+def archived_row(model, pk, plant=None):
+    qs = ArchivedRecord.objects.filter(model_name=model._meta.model_name, original_id=pk)
+    if plant is not None:
+        qs = qs.filter(plant_id=plant)
+    record = qs.first()
+    return None if record is None else {**decompress(record.payload), 'archived': True}
@@ -0,0 +1,143 @@
+"""
+Multiplexed API requests.
+
+``POST /api/batch/`` carries a list of sub-requests::
+
+    {"requests": [{"method": "GET", "path": "/api/powders/"},
+                  {"method": "POST", "path": "/api/tasks/", "body": {...},
+                   "headers": {"Idempotency-Key": "..."}}]}
+
+Each sub-request is dispatched straight to its view, skipping middleware,
+and is authenticated as the user of the batch request without re-checking
+the token. Runs of consecutive GETs execute in parallel on a thread pool;
+writes run one at a time, in order, between them. Responses come back in
+request order as ``{"status": ..., "body": ...}``.
+"""
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+BATCH_PATH = '/api/batch/'
+
+
+class BatchError(Exception):
+    """The batch payload itself is invalid."""
+
+
+def parse(payload):
+    """Validate the payload and return a list of (method, path, body, headers)."""
+    items = payload.get('requests') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError("'requests' must be a non-empty list.")
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        raise BatchError(f"At most {settings.BATCH_MAX_REQUESTS} requests per batch.")
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise BatchError(f"Request {index} must be an object.")
+        method = str(item.get('method', 'GET')).upper()
+        path = item.get('path')
+        if method not in METHODS:
+            raise BatchError(f"Request {index}: unsupported method '{method}'.")
+        if not isinstance(path, str) or not path.startswith('/api/') or urlsplit(path).path == BATCH_PATH:
+            raise BatchError(f"Request {index}: 'path' must be an /api/ URL other than the batch endpoint.")
+        headers = item.get('headers') or {}
+        if not isinstance(headers, dict):
+            raise BatchError(f"Request {index}: 'headers' must be an object.")
+        parsed.append((method, path, item.get('body'), headers))
+    return parsed
+
+
+def _sub_request(parent, method, path, body, headers):
+    url = urlsplit(path)
+    content = json.dumps(body).encode() if body is not None else b''
+    environ = {
+        key: value for key, value in parent.META.items()
+        if not key.startswith('HTTP_') and key not in ('CONTENT_TYPE', 'CONTENT_LENGTH', 'QUERY_STRING')
+    }
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'HTTP_HOST': parent.META.get('HTTP_HOST', ''),
+        'wsgi.input': io.BytesIO(content),
+    })
+    # The plant the client picked applies to every sub-request.
+    if 'HTTP_X_PLANT' in parent.META:
+        environ['HTTP_X_PLANT'] = parent.META['HTTP_X_PLANT']
+    for name, value in headers.items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = str(value)
+
+    request = WSGIRequest(environ)
+    # DRF authenticates requests carrying these as the given user/token.
+    request._force_auth_user = parent.user
+    request._force_auth_token = parent.auth
+    return request
+
+
+def _dispatch(parent, method, path, body, headers):
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return {'status': 404, 'body': {'detail': 'Not found.'}}
+
+    try:
+        response = match.func(_sub_request(parent, method, path, body, headers), *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+    except Exception:
+        logger.exception("Batched %s %s failed", method, path)
+        return {'status': 500, 'body': {'detail': 'Internal server error.'}}
+
+    content = response.content.decode(response.charset or 'utf-8') if response.content else ''
+    if content and response.get('Content-Type', '').startswith('application/json'):
+        content = json.loads(content)
+    return {'status': response.status_code, 'body': content}
+
+
+def _dispatch_in_thread(parent, item):
+    try:
+        return _dispatch(parent, *item)
+    finally:
+        connection.close()
+
+
+def execute(parent, items):
+    """Run parsed sub-requests for ``parent`` and return their results in order."""
+    results = [None] * len(items)
+    # Inside a transaction (tests, ATOMIC_REQUESTS) other threads could not
+    # see uncommitted rows, so everything runs on this thread.
+    parallel = settings.BATCH_MAX_WORKERS > 1 and not connection.in_atomic_block
+
+    index = 0
+    with ThreadPoolExecutor(max_workers=settings.BATCH_MAX_WORKERS) if parallel else nullcontext() as pool:
+        while index < len(items):
+            if items[index][0] != 'GET':
+                results[index] = _dispatch(parent, *items[index])
+                index += 1
+                continue
+            run = []
+            while index < len(items) and items[index][0] == 'GET':
+                run.append(index)
+                index += 1
+            if pool is None or len(run) == 1:
+                for i in run:
+                    results[i] = _dispatch(parent, *items[i])
+            else:
+                for i, result in zip(run, pool.map(lambda i: _dispatch_in_thread(parent, items[i]), run)):
+                    results[i] = result
+    return results
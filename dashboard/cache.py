@@ -0,0 +1,154 @@
+"""
+Response cache for read endpoints.
+
+Entries live in the ``responses`` cache alias and are keyed by the request
+path, the user's role and plant scope, the normalized query string and the
+current generation of every model the response was built from. Writes bump those
+generations (``post_save``/``post_delete`` via ``dashboard.signals``, and
+explicitly with ``bump()`` after bulk ``update()``/``delete()`` or raw SQL)
+once the write commits, so stale entries are never read again and simply
+age out of the cache.
+
+Hit/miss counters are per process and reported by ``/api/metrics/``.
+"""
+import hashlib
+import threading
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from rest_framework.response import Response
+
+from users.permissions import plant_scope
+
+from .models import (
+    CacheGeneration, Powder, Task, QCReport, GasRecord, Location, StockLevel, StockMovement,
+    Lot, StickerPrint, PowderValuation, CostLayer, GasReading, GasForecast,
+)
+
+# Models whose writes invalidate cached responses.
+TRACKED_MODELS = (
+    Powder, Task, QCReport, GasRecord, Location, StockLevel, StockMovement,
+    Lot, StickerPrint, PowderValuation, CostLayer, GasReading, GasForecast,
+)
+
+_stats = {'hits': 0, 'misses': 0, 'stores': 0}
+_stats_lock = threading.Lock()
+# Models bumped on this thread and not yet flushed (see bump()).
+_pending = threading.local()
+
+
+def _cache():
+    return caches['responses']
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def enabled():
+    return settings.RESPONSE_CACHE_TIMEOUT > 0
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def bump(*models):
+    """
+    Invalidate cached responses built from any of ``models``.
+
+    Inside a transaction the generations are bumped once it commits, each
+    model once however many writes bumped it: writers never hold locks on
+    the few hot ``CacheGeneration`` rows, and a rollback invalidates nothing.
+    """
+    _pending.models = getattr(_pending, 'models', set()) | set(models)
+    # Every call registers a flush, so one dropped with a rolled-back
+    # savepoint cannot strand the models of the writes that did commit.
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    models, _pending.models = getattr(_pending, 'models', set()), set()
+    if not models:
+        return
+    for model in models:
+        label = _label(model)
+        if CacheGeneration.objects.filter(model=label).update(generation=F('generation') + 1):
+            continue
+        try:
+            with transaction.atomic():
+                CacheGeneration.objects.create(model=label, generation=2)
+        except IntegrityError:
+            CacheGeneration.objects.filter(model=label).update(generation=F('generation') + 1)
+
+    from . import snapshots  # which imports this module
+    snapshots.schedule(models)
+
+
+def generations(models):
+    labels = sorted({_label(m) for m in models})
+    current = dict(CacheGeneration.objects.filter(model__in=labels).values_list('model', 'generation'))
+    return [(label, current.get(label, 1)) for label in labels]
+
+
+def make_key(request, models):
+    params = sorted((k, v) for k, values in request.query_params.lists() for v in values)
+    role = getattr(request.user, 'role', '') or 'anonymous'
+    plant = str(plant_scope(request)) if request.user.is_authenticated else ''
+    raw = '|'.join([request.path, role, plant, urlencode(params), repr(generations(models))])
+    return 'resp:' + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def cached(request, models, build):
+    """
+    Return the cached response for ``request`` or call ``build()`` and cache
+    its data if it succeeded.
+    """
+    if not enabled():
+        return build()
+
+    key = make_key(request, models)
+    data = _cache().get(key)
+    if data is not None:
+        _count('hits')
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    _count('misses')
+    response = build()
+    if response.status_code == 200:
+        _cache().set(key, response.data)
+        _count('stores')
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+def cache_response(*models):
+    """Decorator for function views (below ``@api_view``) caching GET responses."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            return cached(request, models, lambda: view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def stats():
+    with _stats_lock:
+        counters = dict(_stats)
+    lookups = counters['hits'] + counters['misses']
+    return {
+        'backend': settings.RESPONSE_CACHE_BACKEND,
+        'timeout': settings.RESPONSE_CACHE_TIMEOUT,
+        'max_entries': settings.RESPONSE_CACHE_MAX_ENTRIES,
+        **counters,
+        'hit_rate': round(counters['hits'] / lookups, 4) if lookups else None,
+    }
@@ -0,0 +1,175 @@
+"""
+Cycle counts: bulk physical stock counts reconciled against the books.
+
+``create()`` stores the counted quantities of a whole upload in one
+``bulk_create``. ``report()`` computes every line's variance against the
+book quantity (``Powder.current_stock``, or the ``StockLevel`` of the
+count's location) and values it at ``price_per_kg`` in a single annotated
+query. ``approve()`` freezes those variances on the lines and sets the book
+quantities to the counted ones with set-based UPDATEs in one transaction,
+then writes the ``adjust`` movements of the lines that changed with one
+``bulk_create`` and values them (and checks critical levels) in one pass.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Abs, Coalesce
+from django.utils import timezone
+
+from . import cache, valuation, webhooks
+from .models import CycleCount, CycleCountLine, Powder, StockLevel, StockMovement
+
+QUANTITY = DecimalField(max_digits=12, decimal_places=3)
+
+
+class CountError(Exception):
+    """A count that cannot be created or approved."""
+
+
+def create(entries, *, plant, location=None, user=None, note=''):
+    """
+    Open a count of ``plant`` (an id) from ``entries``, a list of
+    ``{'sku'|'powder': ..., 'counted': ...}``.
+
+    SKUs are resolved in one query; a SKU counted more than once (several
+    bins) is summed. Unknown SKUs, and powders of other plants, raise
+    ``CountError`` listing all of them.
+    """
+    powders = Powder.objects.filter(plant_id=plant)
+    skus = {e['sku'] for e in entries if e.get('sku')}
+    by_sku = dict(powders.filter(sku__in=skus).values_list('sku', 'pk'))
+    ids = {e['powder'] for e in entries if e.get('powder')}
+    known_ids = set(powders.filter(pk__in=ids).values_list('pk', flat=True))
+
+    missing = sorted(skus - by_sku.keys()) + sorted(str(pk) for pk in ids - known_ids)
+    if missing:
+        raise CountError(f"Unknown powders: {', '.join(missing)}.")
+
+    counted = {}
+    for entry in entries:
+        powder_id = by_sku[entry['sku']] if entry.get('sku') else entry['powder']
+        counted[powder_id] = counted.get(powder_id, Decimal(0)) + entry['counted']
+
+    with transaction.atomic():
+        count = CycleCount.objects.create(
+            plant_id=plant, location=location, note=note, created_by=_user(user),
+        )
+        CycleCountLine.objects.bulk_create(
+            CycleCountLine(count=count, powder_id=powder_id, counted=quantity)
+            for powder_id, quantity in counted.items()
+        )
+    return count
+
+
+def _book_quantity(count):
+    """Expression for a line's book quantity, relative to ``CycleCountLine``."""
+    if count.location_id is None:
+        return Subquery(Powder.objects.filter(pk=OuterRef('powder_id')).values('current_stock')[:1])
+    level = StockLevel.objects.filter(powder_id=OuterRef('powder_id'), location_id=count.location_id)
+    return Coalesce(Subquery(level.values('quantity')[:1]), Value(Decimal(0)), output_field=QUANTITY)
+
+
+def _price():
+    return Subquery(Powder.objects.filter(pk=OuterRef('powder_id')).values('price_per_kg')[:1])
+
+
+def variances(count):
+    """Lines of ``count`` annotated with ``expected``, ``variance`` and ``variance_value``."""
+    lines = CycleCountLine.objects.filter(count=count)
+    if count.status == 'approved':
+        return lines.annotate(expected=F('book_quantity'), variance=F('adjustment'), variance_value=F('adjustment_value'))
+    expected = _book_quantity(count)
+    return lines.annotate(
+        expected=expected,
+        variance=F('counted') - expected,
+        variance_value=(F('counted') - expected) * F('powder__price_per_kg'),
+    )
+
+
+def report(count):
+    """Variance report: every line, largest value variance first, plus totals."""
+    rows = list(
+        variances(count)
+        .order_by(Abs('variance_value').desc(), 'powder__sku')
+        .values('powder_id', 'counted', 'expected', 'variance', 'variance_value',
+                sku=F('powder__sku'), name=F('powder__name'))
+    )
+    with_variance = [row for row in rows if row['variance']]
+    return {
+        'lines': rows,
+        'summary': {
+            'lines': len(rows),
+            'with_variance': len(with_variance),
+            'accuracy': round(1 - len(with_variance) / len(rows), 4) if rows else None,
+            'net_value': sum((row['variance_value'] or 0 for row in rows), Decimal(0)),
+            'gross_value': sum((abs(row['variance_value'] or 0) for row in rows), Decimal(0)),
+        },
+    }
+
+
+def approve(count, user=None):
+    """
+    Post every variance of an open count as one atomic adjustment.
+
+    The variances are recomputed under lock at approval time, so stock moved
+    since the report was read is accounted for rather than overwritten.
+    """
+    with transaction.atomic():
+        count = CycleCount.objects.select_for_update().get(pk=count.pk)
+        if count.status != 'open':
+            raise CountError(f"Count is {count.status}.")
+        lines = CycleCountLine.objects.filter(count=count)
+        powder_ids = list(lines.values_list('powder_id', flat=True))
+        # Hold the counted powders until the adjustments are written.
+        list(Powder.objects.select_for_update().filter(pk__in=powder_ids).values_list('pk', flat=True))
+
+        book = _book_quantity(count)
+        lines.update(
+            book_quantity=book,
+            adjustment=F('counted') - book,
+            adjustment_value=(F('counted') - book) * _price(),
+        )
+
+        counted = Subquery(lines.filter(powder_id=OuterRef('powder_id')).values('counted')[:1])
+        adjustment = Subquery(lines.filter(powder_id=OuterRef('pk')).values('adjustment')[:1])
+        if count.location_id is None:
+            Powder.objects.filter(pk__in=powder_ids).update(
+                current_stock=Subquery(lines.filter(powder_id=OuterRef('pk')).values('counted')[:1]),
+            )
+        else:
+            StockLevel.objects.bulk_create(
+                [StockLevel(powder_id=pk, location_id=count.location_id) for pk in powder_ids],
+                ignore_conflicts=True,
+            )
+            StockLevel.objects.filter(location_id=count.location_id, powder_id__in=powder_ids).update(quantity=counted)
+            Powder.objects.filter(pk__in=powder_ids).update(current_stock=F('current_stock') + adjustment)
+        cache.bump(Powder, StockLevel)
+
+        changed = list(lines.exclude(adjustment=0).select_related('powder').order_by('powder__sku'))
+        movements = StockMovement.objects.bulk_create(
+            StockMovement(
+                powder=line.powder, kind='adjust', quantity=line.adjustment, location_id=count.location_id,
+                created_by=_user(user), note=f"Cycle count #{count.pk}",
+            )
+            for line in changed
+        )
+        webhooks.powders_critical((line.powder, line.adjustment) for line in changed)
+        valuation.apply_many(movements)
+
+        count.status = 'approved'
+        count.approved_by = _user(user)
+        count.approved_at = timezone.now()
+        count.save(update_fields=['status', 'approved_by', 'approved_at'])
+    return count
+
+
+def cancel(count):
+    if CycleCount.objects.filter(pk=count.pk, status='open').update(status='cancelled') == 0:
+        raise CountError("Only open counts can be cancelled.")
+    count.status = 'cancelled'
+    return count
+
+
+def _user(user):
+    return user if user is not None and user.is_authenticated else None
@@ -0,0 +1,136 @@
+"""
+Set-based duplicate detection and removal.
+
+A rule names a model, the natural-key fields that identify one logical
+record, and which copy survives. Duplicates are ranked with
+``ROW_NUMBER() OVER (PARTITION BY <keys> ORDER BY <keep>)`` in one query and
+everything past the first row of each partition is deleted in batches.
+
+A rule with a ``window`` only catches double-submits: a row is a copy of the
+one before it in its partition if it was created within ``window`` of it;
+a longer gap starts a new record with the same key.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import FirstValue, Lag, RowNumber
+
+from . import cache, gas
+from .models import QCReport, GasRecord, GasReading
+
+
+class DedupeRule:
+    def __init__(self, model, keys, keep, merge=None, window=None):
+        self.model = model
+        self.keys = tuple(keys)
+        # Ordering within a duplicate group; the first row is kept. With a
+        # window it must be oldest first by created_at.
+        self.keep = tuple(keep)
+        self.window = window
+        # merge(pairs) moves what must outlive a deleted row, given
+        # (deleted pk, surviving pk) pairs, before the rows are deleted.
+        self.merge = merge
+
+    @property
+    def name(self):
+        return self.model._meta.model_name
+
+    def _order_by(self):
+        return [F(f[1:]).desc() if f.startswith('-') else F(f).asc() for f in self.keep]
+
+    def _window(self, expression):
+        return Window(expression, partition_by=[F(k) for k in self.keys], order_by=self._order_by())
+
+    def ranked(self):
+        """Every row with its rank in its duplicate group and the pk of the group's survivor."""
+        return self.model.objects.order_by().annotate(
+            dup_rank=self._window(RowNumber()),
+            survivor=self._window(FirstValue('pk')),
+        )
+
+    def surplus(self):
+        """(pk, surviving pk) of every row to delete."""
+        if self.window is None:
+            return list(self.ranked().filter(dup_rank__gt=1).values_list('pk', 'survivor'))
+
+        rows = (
+            self.ranked()
+            .annotate(
+                copies=Window(Count('pk'), partition_by=[F(k) for k in self.keys]),
+                previous_at=self._window(Lag('created_at')),
+            )
+            .filter(copies__gt=1)
+            .values_list('pk', 'survivor', 'created_at', 'previous_at')
+        )
+        pairs, kept = [], {}
+        # Rows of one partition share a survivor; walk each oldest first.
+        for pk, group, created_at, previous_at in sorted(rows, key=lambda row: (row[1], row[2], row[0])):
+            if previous_at is None or created_at - previous_at > self.window:
+                kept[group] = pk
+            else:
+                pairs.append((pk, kept[group]))
+        return pairs
+
+
+def _merge_gas_readings(pairs):
+    """Keep the level history of removed tanks on the tank that survives."""
+    removed = defaultdict(list)
+    for pk, survivor in pairs:
+        removed[survivor].append(pk)
+    for survivor, pks in removed.items():
+        GasReading.objects.filter(tank_id__in=pks).update(tank_id=survivor)
+    cache.bump(GasReading)
+    gas.schedule_refresh()
+
+
+RULES = {
+    rule.name: rule for rule in (
+        # Re-submitted inspections: the latest entry for a batch on a day wins.
+        DedupeRule(QCReport, keys=('plant', 'batch_id', 'date'), keep=('-created_at', '-id')),
+        # Double-submitted gas readings: keep the original submission.
+        # Separate tanks can hold identical readings, so only copies created
+        # within DEDUPE_SUBMIT_WINDOW of each other count.
+        DedupeRule(GasRecord, keys=('plant', 'type', 'capacity', 'current_level', 'refill_date', 'cost', 'created_by'),
+                   keep=('created_at', 'id'), merge=_merge_gas_readings,
+                   window=timedelta(seconds=settings.DEDUPE_SUBMIT_WINDOW)),
+    )
+}
+
+
+def report(rule, sample=10):
+    """Dry-run summary: duplicate groups, surplus rows and a few example keys."""
+    copies = Counter(survivor for _, survivor in rule.surplus())
+    biggest = copies.most_common(sample)
+    rows = rule.model.objects.filter(pk__in=[pk for pk, _ in biggest]).values('pk', *rule.keys)
+    keys = {row.pop('pk'): row for row in rows}
+    return {
+        'rule': rule.name,
+        'keys': rule.keys,
+        'groups': len(copies),
+        'surplus_rows': sum(copies.values()),
+        'examples': [{**keys[pk], 'copies': extra + 1} for pk, extra in biggest],
+    }
+
+
+def delete_duplicates(rule, batch_size=500):
+    """
+    Delete every non-surviving duplicate. Returns the row count.
+
+    The surplus rows are found with one ranking query and deleted through the
+    ORM ``batch_size`` at a time, after the rule's ``merge``, so cascades to
+    dependent rows and the delete signals (response cache, search index, scan
+    cache) run as for any delete.
+    """
+    surplus = rule.surplus()
+    deleted = 0
+    for start in range(0, len(surplus), batch_size):
+        batch = surplus[start:start + batch_size]
+        with transaction.atomic():
+            if rule.merge:
+                rule.merge(batch)
+            _, counts = rule.model.objects.filter(pk__in=[pk for pk, _ in batch]).delete()
+        deleted += counts.get(rule.model._meta.label, 0)
+    return deleted
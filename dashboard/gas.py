@@ -0,0 +1,269 @@
+"""
+Gas consumption forecasting and refill scheduling.
+
+Every change to a tank's level is kept as a ``GasReading``. ``refresh()``
+fits each tank's consumption rate by least squares over its readings since
+the last refill, in one ordered pass over the readings table (running sums
+per tank, no per-tank queries), and stores the result in ``GasForecast``:
+the rate and its standard error, when the tank reaches the reorder level
+(``GAS_REORDER_FRACTION`` of capacity) and when it runs empty, with a
+``GAS_FORECAST_Z`` confidence band. Tanks with too little history borrow the
+average rate of their gas type, scaled to their capacity.
+
+New readings queue a ``gas.refresh_forecasts`` job, so the table is rebuilt
+by the worker rather than on every request.
+
+``schedule()`` turns the forecasts into delivery trips. Each tank has to be
+refilled in a window that closes at its (pessimistic) reorder time and opens
+``GAS_REFILL_WINDOW_DAYS`` earlier; the fewest trips that serve every window
+is interval stabbing, solved exactly by sweeping windows in closing order and
+sending a truck at the first unserved close. A trip never serves two plants.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache, jobs
+from .models import GasForecast, GasReading, GasRecord
+
+REFRESH_JOB = 'gas.refresh_forecasts'
+DAY = 86400.0
+
+
+class _Series:
+    """Running least-squares sums of one tank's readings since its last refill."""
+    __slots__ = ('origin', 'n', 'st', 'sy', 'stt', 'sty', 'syy', 'level', 'at')
+
+    def __init__(self):
+        self.n = 0
+
+    def add(self, at, level, refill_threshold):
+        if self.n and level > self.level + refill_threshold:
+            self.n = 0  # refilled: only the current drawdown says anything about the rate
+        if not self.n:
+            self.origin = at
+            self.st = self.sy = self.stt = self.sty = self.syy = 0.0
+        t = (at - self.origin).total_seconds() / DAY
+        self.n += 1
+        self.st += t
+        self.sy += level
+        self.stt += t * t
+        self.sty += t * level
+        self.syy += level * level
+        self.level, self.at = level, at
+
+    def fit(self):
+        """(rate per day, standard error or None), or None without enough spread in time."""
+        if self.n < 2:
+            return None
+        sxx = self.stt - self.st * self.st / self.n
+        if sxx <= 1e-9:
+            return None
+        slope = (self.sty - self.st * self.sy / self.n) / sxx
+        intercept = (self.sy - slope * self.st) / self.n
+        stderr = None
+        if self.n > 2:
+            sse = max(self.syy - intercept * self.sy - slope * self.sty, 0.0)
+            stderr = math.sqrt(sse / (self.n - 2) / sxx)
+        return -slope, stderr
+
+
+def _after(at, level, target, rate):
+    """When a tank at ``level`` at ``at`` reaches ``target``, consuming ``rate`` per day."""
+    if rate is None or rate <= 0:
+        return None
+    return at + timedelta(days=max(level - target, 0.0) / rate)
+
+
+def compute(now=None):
+    """Unsaved ``GasForecast`` rows for every tank."""
+    now = now or timezone.now()
+    tanks = {tank.pk: tank for tank in GasRecord.objects.only('id', 'type', 'capacity', 'current_level', 'updated_at')}
+    series = defaultdict(_Series)
+    readings = (
+        GasReading.objects
+        .filter(recorded_at__gte=now - timedelta(days=settings.GAS_FORECAST_HISTORY_DAYS), tank__in=list(tanks))
+        .order_by('tank_id', 'recorded_at', 'id')
+        .values_list('tank_id', 'recorded_at', 'level')
+    )
+    for tank_id, at, level in readings.iterator(chunk_size=2000):
+        series[tank_id].add(at, level, settings.GAS_REFILL_THRESHOLD * tanks[tank_id].capacity)
+
+    fits = {}
+    by_type = defaultdict(list)
+    for tank_id, s in series.items():
+        fit = s.fit() if s.n >= settings.GAS_MIN_READINGS else None
+        if fit is None:
+            continue
+        fits[tank_id] = fit
+        capacity = tanks[tank_id].capacity
+        if fit[0] > 0 and capacity > 0:
+            by_type[tanks[tank_id].type].append(fit[0] / capacity)
+
+    type_rates = {}
+    for gas_type, rates in by_type.items():
+        mean = sum(rates) / len(rates)
+        spread = math.sqrt(sum((r - mean) ** 2 for r in rates) / (len(rates) - 1)) if len(rates) > 1 else None
+        type_rates[gas_type] = (mean, spread)
+
+    z = settings.GAS_FORECAST_Z
+    forecasts = []
+    for tank_id, tank in tanks.items():
+        s = series.get(tank_id)
+        level, level_at = (s.level, s.at) if s else (tank.current_level, tank.updated_at)
+        forecast = GasForecast(tank=tank, readings=s.n if s else 0, level=level, level_at=level_at)
+
+        if tank_id in fits:
+            forecast.source = 'tank'
+            forecast.rate_per_day, forecast.rate_stderr = fits[tank_id]
+        elif tank.type in type_rates and tank.capacity > 0:
+            forecast.source = 'type'
+            mean, spread = type_rates[tank.type]
+            forecast.rate_per_day = mean * tank.capacity
+            forecast.rate_stderr = spread * tank.capacity if spread is not None else None
+        else:
+            forecast.source = 'none'
+            forecast.rate_per_day, forecast.rate_stderr = 0.0, None
+
+        rate = forecast.rate_per_day
+        margin = z * (forecast.rate_stderr or 0.0)
+        forecast.empty_at = _after(level_at, level, 0.0, rate)
+        forecast.empty_earliest = _after(level_at, level, 0.0, rate + margin)
+        forecast.empty_latest = _after(level_at, level, 0.0, rate - margin)
+        forecast.reorder_at = _after(level_at, level, settings.GAS_REORDER_FRACTION * tank.capacity, rate + margin)
+        forecasts.append(forecast)
+    return forecasts
+
+
+def refresh(now=None):
+    """Recompute and store every tank's forecast. Returns the number of tanks."""
+    forecasts = compute(now)
+    fields = [f.name for f in GasForecast._meta.concrete_fields if not f.primary_key]
+    with transaction.atomic():
+        GasForecast.objects.bulk_create(forecasts, update_conflicts=True, unique_fields=['tank'], update_fields=fields)
+        GasForecast.objects.exclude(tank__in=[f.tank_id for f in forecasts]).delete()
+        cache.bump(GasForecast)
+    return len(forecasts)
+
+
+def schedule_refresh():
+    """Queue a forecast refresh; readings arriving together share one job."""
+    return jobs.enqueue(REFRESH_JOB, unique=True, delay=settings.GAS_REFRESH_DELAY)
+
+
+def record_reading(tank, level, *, user=None, recorded_at=None):
+    """Log a reading, update the tank's current level and queue a refresh."""
+    with transaction.atomic():
+        reading = GasReading.objects.create(
+            tank=tank, level=level, recorded_at=recorded_at or timezone.now(),
+            created_by=user if user is not None and user.is_authenticated else None,
+        )
+        latest = tank.readings.order_by('-recorded_at', '-id').values_list('level', flat=True).first()
+        if tank.current_level != latest:
+            tank.current_level = latest
+            tank.save(update_fields=['current_level', 'updated_at'])
+        schedule_refresh()
+    return reading
+
+
+@jobs.register(REFRESH_JOB)
+def refresh_job(job):
+    return {'tanks': refresh()}
+
+
+def _trip_groups(windows):
+    """Greedy interval stabbing: fewest dates such that every (open, close) window contains one."""
+    trips = []
+    for window in sorted(windows, key=lambda w: w['close']):
+        if trips and window['open'] <= trips[-1]['date']:
+            trips[-1]['tanks'].append(window)
+        else:
+            trips.append({'date': window['close'], 'tanks': [window]})
+    return trips
+
+
+def schedule(now=None, horizon_days=None, plant=None):
+    """
+    Refill trips for tanks (of ``plant``, an id) that need gas within ``horizon_days``.
+
+    A trip is dated at the close of the first window it serves, the latest
+    day that still serves it, which lets it pick up every tank whose window
+    is already open by then.
+    """
+    now = now or timezone.now()
+    horizon = now + timedelta(days=horizon_days if horizon_days is not None else settings.GAS_SCHEDULE_HORIZON_DAYS)
+    span = timedelta(days=settings.GAS_REFILL_WINDOW_DAYS)
+
+    windows = []
+    forecasts = GasForecast.objects.select_related('tank').filter(reorder_at__isnull=False)
+    if plant is not None:
+        forecasts = forecasts.filter(tank__plant_id=plant)
+    for forecast in forecasts:
+        tank = forecast.tank
+        close = max(forecast.reorder_at, now)
+        if close - span > horizon:
+            continue
+        windows.append({
+            'tank': tank.pk,
+            'plant': tank.plant_id,
+            'type': tank.type,
+            'open': max(close - span, now),
+            'close': close,
+            'overdue': forecast.reorder_at <= now,
+            'forecast': forecast,
+        })
+
+    # A truck serves one plant; with GAS_BATCH_BY_TYPE, one gas type too.
+    groups = defaultdict(list)
+    for window in windows:
+        groups[window['plant'], window['type'] if settings.GAS_BATCH_BY_TYPE else None].append(window)
+
+    trips = []
+    for (plant_id, _), group in groups.items():
+        for trip in _trip_groups(group):
+            trip['plant'] = plant_id
+            trips.append(trip)
+    trips.sort(key=lambda trip: (trip['date'], trip['plant']))
+
+    result = []
+    for trip in trips:
+        stops = []
+        for window in trip['tanks']:
+            forecast, tank = window['forecast'], window['forecast'].tank
+            elapsed = (trip['date'] - forecast.level_at).total_seconds() / DAY
+            level = max(forecast.level - forecast.rate_per_day * elapsed, 0.0)
+            quantity = max(tank.capacity - level, 0.0)
+            stops.append({
+                'tank': tank.pk,
+                'type': tank.type,
+                'overdue': window['overdue'],
+                'reorder_at': forecast.reorder_at,
+                'empty_at': forecast.empty_at,
+                'level_at_delivery': round(level, 3),
+                'refill_quantity': round(quantity, 3),
+                'refill_cost': round(tank.cost * quantity / tank.capacity, 2) if tank.capacity > 0 else 0.0,
+            })
+        gas_cost = sum(stop['refill_cost'] for stop in stops)
+        result.append({
+            'date': trip['date'],
+            'plant': trip['plant'],
+            'tanks': stops,
+            'delivery_cost': settings.GAS_DELIVERY_COST,
+            'gas_cost': round(gas_cost, 2),
+            'total_cost': round(gas_cost + settings.GAS_DELIVERY_COST, 2),
+        })
+
+    return {
+        'horizon': horizon,
+        'trips': result,
+        'tanks': len(windows),
+        'delivery_cost': round(settings.GAS_DELIVERY_COST * len(result), 2),
+        'total_cost': round(sum(trip['total_cost'] for trip in result), 2),
+        # Against sending one truck per tank.
+        'trips_saved': len(windows) - len(result),
+        'savings': round(settings.GAS_DELIVERY_COST * (len(windows) - len(result)), 2),
+    }
@@ -0,0 +1,133 @@
+"""
+``Idempotency-Key`` support for POST endpoints.
+
+The first request with a given key (per user) inserts a ``pending``
+``IdempotencyRecord``; the unique constraint on (scope, key) is the lock, so
+concurrent duplicates wait for that request instead of running again. Its
+successful response is stored and replayed to every retry until
+``IDEMPOTENCY_TTL`` expires, without touching the model tables. Failed
+requests release the key so the client can retry. Expired records are pruned
+and the table is capped at ``IDEMPOTENCY_MAX_RECORDS`` rows.
+"""
+import hashlib
+import itertools
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http.request import RawPostDataException
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+_new_keys = itertools.count(1)
+
+
+def _fingerprint(request):
+    try:
+        body = request.body
+    except RawPostDataException:
+        body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder).encode()
+    return hashlib.sha256(b'\n'.join([request.method.encode(), request.path.encode(), body])).hexdigest()
+
+
+def _claim(scope, key, fingerprint):
+    """Insert the pending record for ``key``; returns (record, created)."""
+    try:
+        with transaction.atomic():
+            record = IdempotencyRecord.objects.create(
+                scope=scope, key=key, fingerprint=fingerprint,
+                expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_TTL),
+            )
+    except IntegrityError:
+        return IdempotencyRecord.objects.filter(scope=scope, key=key).first(), False
+    if next(_new_keys) % settings.IDEMPOTENCY_PRUNE_EVERY == 0:
+        prune()
+    return record, True
+
+
+def _abandoned(record):
+    now = timezone.now()
+    if record.expires_at <= now:
+        return True
+    # The original request died before storing its response.
+    return record.state == 'pending' and record.created_at <= now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def handle(request, handler):
+    """Run ``handler()`` at most once per ``Idempotency-Key``; requests without one run as usual."""
+    key = request.headers.get(HEADER, '').strip()
+    if not key:
+        return handler()
+    if len(key) > 255:
+        return Response({'detail': f'{HEADER} must be at most 255 characters.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    scope = str(request.user.pk) if request.user.is_authenticated else 'anonymous'
+    fingerprint = _fingerprint(request)
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+    while True:
+        record, created = _claim(scope, key, fingerprint)
+        if created:
+            break
+        if record is not None:
+            if _abandoned(record):
+                # Conditional delete: only one waiter takes the key over.
+                IdempotencyRecord.objects.filter(pk=record.pk, state=record.state).delete()
+                continue
+            if record.fingerprint != fingerprint:
+                return Response({'detail': f'{HEADER} was already used for a different request.'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.state == 'completed':
+                return _replay(record)
+        if time.monotonic() >= deadline:
+            return Response({'detail': 'A request with this key is still being processed.'},
+                            status=status.HTTP_409_CONFLICT)
+        time.sleep(0.1)
+
+    try:
+        response = handler()
+    except Exception:
+        IdempotencyRecord.objects.filter(pk=record.pk).delete()
+        raise
+    if response.status_code >= 400:
+        IdempotencyRecord.objects.filter(pk=record.pk).delete()
+        return response
+
+    record.state = 'completed'
+    record.status_code = response.status_code
+    record.response_body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+    record.save(update_fields=['state', 'status_code', 'response_body'])
+    return response
+
+
+def idempotent(view):
+    """Decorator for function views (below ``@api_view``)."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return handle(request, lambda: view(request, *args, **kwargs))
+    return wrapper
+
+
+def prune(max_records=None):
+    """Delete expired records, then the oldest beyond ``max_records``. Returns the count."""
+    max_records = max_records if max_records is not None else settings.IDEMPOTENCY_MAX_RECORDS
+    deleted = IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+    boundary = next(iter(
+        IdempotencyRecord.objects.order_by('-id').values_list('id', flat=True)[max_records:max_records + 1]
+    ), None)
+    if boundary is not None:
+        deleted += IdempotencyRecord.objects.filter(id__lte=boundary).delete()[0]
+    return deleted
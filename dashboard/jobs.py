@@ -0,0 +1,218 @@
+"""
+Database-backed background job queue.
+
+Jobs are rows in the ``Job`` table. Handlers are plain functions registered
+with ``@register('name')`` and receive the ``Job`` instance, so they can read
+``job.payload`` and report progress with ``job.set_progress()``. Workers are
+started with ``python manage.py run_worker``.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def register(name):
+    """Decorator registering ``func`` as the handler for jobs called ``name``."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_handler(name):
+    return _registry.get(name)
+
+
+def enqueue(name, payload=None, *, user=None, priority=0, delay=0, max_attempts=None, unique=False):
+    """
+    Queue a job and return it.
+
+    With ``unique=True`` an already queued job with the same name and payload
+    is returned instead of creating a second one.
+    """
+    payload = payload or {}
+    if unique:
+        existing = Job.objects.filter(name=name, status='queued', payload=payload).first()
+        if existing:
+            return existing
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        priority=priority,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _due_jobs(names=None):
+    qs = Job.objects.filter(status='queued', run_after__lte=timezone.now())
+    if names:
+        qs = qs.filter(name__in=names)
+    return qs.order_by('-priority', 'run_after', 'id')
+
+
+def claim_next(worker_id, names=None):
+    """
+    Atomically take the next due job and mark it running, or return None.
+
+    Postgres uses ``SELECT ... FOR UPDATE SKIP LOCKED`` so concurrent workers
+    never wait on each other. Backends without it (SQLite) claim optimistically:
+    a conditional UPDATE only succeeds for the worker that still sees the row
+    as queued, and losers move on to the next candidate.
+    """
+    now = timezone.now()
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _due_jobs(names).select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = 'running'
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.locked_at = now
+            job.save(update_fields=['status', 'attempts', 'locked_by', 'locked_at', 'updated_at'])
+            return job
+
+    for pk in _due_jobs(names).values_list('pk', flat=True)[:10]:
+        claimed = Job.objects.filter(pk=pk, status='queued').update(
+            status='running', attempts=F('attempts') + 1,
+            locked_by=worker_id, locked_at=now, updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at ``JOBS_MAX_BACKOFF`` seconds."""
+    base = settings.JOBS_RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+    return min(base, settings.JOBS_MAX_BACKOFF) * random.uniform(0.8, 1.2)
+
+
+def run_job(job):
+    """Execute a claimed job and record its outcome."""
+    handler = get_handler(job.name)
+    if handler is None:
+        job.status = 'failed'
+        job.error = f"No handler registered for '{job.name}'"
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        return job
+
+    try:
+        result = handler(job)
+    except Exception:
+        logger.exception("Job %s failed (attempt %s/%s)", job.pk, job.attempts, job.max_attempts)
+        job.error = traceback.format_exc()[-5000:]
+        job.locked_by = ''
+        job.locked_at = None
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'run_after', 'locked_by', 'locked_at', 'finished_at', 'updated_at'])
+        return job
+
+    job.status = 'done'
+    job.result = result
+    job.progress = 100
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'progress', 'error', 'finished_at', 'updated_at'])
+    return job
+
+
+def heartbeat(job):
+    """Move a running job's ``locked_at`` forward, so ``requeue_stale()`` leaves it alone."""
+    return Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(locked_at=timezone.now())
+
+
+class _Heartbeat(threading.Thread):
+    """Calls ``heartbeat(job)`` every ``interval`` seconds while the job runs."""
+
+    def __init__(self, job, interval):
+        super().__init__(name=f'job-heartbeat-{job.pk}', daemon=True)
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    heartbeat(self.job)
+                except Exception:
+                    logger.exception("Heartbeat of job %s failed", self.job.pk)
+        finally:
+            connection.close()
+
+
+def requeue_stale(timeout=None):
+    """
+    Return jobs whose worker died mid-run to the queue. Returns the count.
+
+    A job is stale once its ``locked_at`` heartbeat is older than ``timeout``
+    seconds. Stale jobs that have used all their attempts are failed instead
+    of run again.
+    """
+    timeout = timeout if timeout is not None else settings.JOBS_STALE_TIMEOUT
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', error=f"Worker stopped responding (no heartbeat for {timeout}s).",
+        locked_by='', locked_at=None, finished_at=now, updated_at=now,
+    )
+    if failed:
+        logger.warning("Failed %s stale job(s) out of attempts", failed)
+    return stale.update(status='queued', locked_by='', locked_at=None, run_after=now, updated_at=now)
+
+
+def work(stop_event, *, names=None, poll_interval=1.0, burst=False):
+    """
+    Claim and run jobs until ``stop_event`` is set.
+
+    A heartbeat thread refreshes each job's ``locked_at`` while it runs. In
+    burst mode the loop exits as soon as the queue is empty.
+    """
+    worker_id = default_worker_id()
+    processed = 0
+    while not stop_event.is_set():
+        close_old_connections()
+        job = claim_next(worker_id, names)
+        if job is None:
+            if burst:
+                break
+            stop_event.wait(poll_interval)
+            continue
+        beat = _Heartbeat(job, settings.JOBS_HEARTBEAT_INTERVAL)
+        beat.start()
+        try:
+            run_job(job)
+        finally:
+            beat.stopped.set()
+            beat.join()
+        processed += 1
+    connection.close()
+    return processed
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import archive
+
+
+class Command(BaseCommand):
+    help = 'Move done tasks, old QC reports and empty gas tanks into the compressed archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*',
+                            help=f"Models to archive (default: all). Available: {', '.join(archive.POLICIES)}")
+        parser.add_argument('--months', type=int, default=settings.ARCHIVE_AFTER_MONTHS,
+                            help='Archive rows closed more than this many months ago')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        names = options['models'] or list(archive.POLICIES)
+        unknown = [name for name in names if name not in archive.POLICIES]
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(unknown)}")
+
+        cutoff = archive.cutoff_for(options['months'])
+        for name in names:
+            policy = archive.POLICIES[name]
+            if options['dry_run']:
+                self.stdout.write(f"{name}: {policy.candidates(cutoff).count()} rows would be archived")
+                continue
+            moved = archive.archive(policy, cutoff, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"{name}: archived {moved} rows"))
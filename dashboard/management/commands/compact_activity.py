@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dashboard.models import ActivityEvent
+
+
+class Command(BaseCommand):
+    help = 'Delete activity events past the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ACTIVITY_RETENTION_DAYS,
+                            help='Keep events newer than this many days')
+        parser.add_argument('--max-rows', type=int, default=None,
+                            help='Also keep at most this many of the newest events')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted = self._delete_batched(ActivityEvent.objects.filter(created_at__lt=cutoff), options['batch_size'])
+
+        if options['max_rows'] is not None:
+            # The newest row past the cap marks the boundary; everything at or
+            # below it in feed order goes.
+            newest_first = ActivityEvent.objects.order_by('-created_at', '-id')
+            boundary = next(iter(newest_first[options['max_rows']:options['max_rows'] + 1]), None)
+            if boundary:
+                older = ActivityEvent.objects.filter(created_at__lt=boundary.created_at) | \
+                    ActivityEvent.objects.filter(created_at=boundary.created_at, id__lte=boundary.id)
+                deleted += self._delete_batched(older, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} activity events'))
+
+    def _delete_batched(self, queryset, batch_size):
+        # Short batches keep each DELETE's lock window small on a busy table.
+        total = 0
+        while True:
+            ids = list(queryset.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            total += ActivityEvent.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import dedupe
+
+
+class Command(BaseCommand):
+    help = 'Remove duplicate rows by natural key, ranked in one query per rule and deleted in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('rules', nargs='*',
+                            help=f"Rules to run (default: all). Available: {', '.join(dedupe.RULES)}")
+        parser.add_argument('--dry-run', action='store_true', help='Report duplicates without deleting')
+
+    def handle(self, *args, **options):
+        names = options['rules'] or list(dedupe.RULES)
+        unknown = [name for name in names if name not in dedupe.RULES]
+        if unknown:
+            raise CommandError(f"Unknown rule(s): {', '.join(unknown)}")
+
+        for name in names:
+            rule = dedupe.RULES[name]
+            summary = dedupe.report(rule)
+            self.stdout.write(
+                f"{name}: {summary['groups']} duplicate groups, {summary['surplus_rows']} surplus rows "
+                f"(keys: {', '.join(rule.keys)})"
+            )
+            for example in summary['examples']:
+                self.stdout.write(f"  {example}")
+
+            if options['dry_run'] or not summary['surplus_rows']:
+                continue
+            deleted = dedupe.delete_duplicates(rule)
+            self.stdout.write(self.style.SUCCESS(f"{name}: deleted {deleted} duplicate rows"))
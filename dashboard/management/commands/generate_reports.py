@@ -0,0 +1,44 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import reports
+from dashboard.models import ReportArtifact
+
+
+class Command(BaseCommand):
+    help = 'Generate the periodic reports whose data changed (recent complete weeks and months by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', choices=list(reports.BUILDERS),
+                            help='Report kind (repeatable; default: all)')
+        parser.add_argument('--period', action='append', choices=[p for p, _ in ReportArtifact.PERIOD_CHOICES],
+                            help='week or month (repeatable; default: both)')
+        parser.add_argument('--format', action='append', choices=list(reports.RENDERERS),
+                            help='Output format (repeatable; default: REPORTS_FORMATS)')
+        parser.add_argument('--date', type=date.fromisoformat,
+                            help='Only the period containing this ISO date (may be the current one)')
+        parser.add_argument('--force', action='store_true', help='Re-render even if the data is unchanged')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Queue the recurring reports.generate_due job for the worker and exit')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            job = reports.schedule(delay=0)
+            self.stdout.write(self.style.SUCCESS(f"Queued job {job.pk}"))
+            return
+
+        rendered_count = 0
+        for period in options['period'] or [p for p, _ in ReportArtifact.PERIOD_CHOICES]:
+            days = [options['date']] if options['date'] else reports.due_periods(period, settings.REPORTS_LOOKBACK)
+            for day in days:
+                for kind in options['kind'] or list(reports.BUILDERS):
+                    for fmt in options['format'] or settings.REPORTS_FORMATS:
+                        try:
+                            artifact, rendered = reports.generate(kind, period, day, fmt, force=options['force'])
+                        except reports.ReportError as e:
+                            raise CommandError(str(e))
+                        rendered_count += rendered
+                        self.stdout.write(f"{artifact.file}: {'rendered' if rendered else 'unchanged'}")
+        self.stdout.write(self.style.SUCCESS(f"{rendered_count} reports rendered"))
@@ -0,0 +1,49 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dashboard import profiling
+
+
+class Command(BaseCommand):
+    help = 'Summarize request profiles: hot functions, slow SQL and folded stacks per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=settings.PROFILING_DIR, help='Directory holding the captures')
+        parser.add_argument('--endpoint', help='Only endpoints containing this text (e.g. "powder-list")')
+        parser.add_argument('--top', type=int, default=15, help='Rows per section')
+        parser.add_argument('--folded-dir',
+                            help='Write one flamegraph-compatible .folded file per endpoint here (sample '
+                                 'counts, or for cProfile captures microseconds rebuilt from the caller graph)')
+
+    def handle(self, *args, **options):
+        captures = profiling.load_captures(options['dir'], options['endpoint'])
+        if not captures:
+            self.stdout.write(f"No captures in {options['dir']}")
+            return
+
+        folded_dir = Path(options['folded_dir']) if options['folded_dir'] else None
+        if folded_dir:
+            folded_dir.mkdir(parents=True, exist_ok=True)
+
+        for row in profiling.aggregate(captures, options['top']):
+            self.stdout.write(self.style.MIGRATE_HEADING(row['endpoint']))
+            self.stdout.write(
+                f"  {row['captures']} captures, avg {row['avg_duration'] * 1000:.1f} ms "
+                f"(max {row['max_duration'] * 1000:.1f} ms), SQL avg {row['avg_sql_time'] * 1000:.1f} ms "
+                f"in {row['avg_queries']:.1f} queries"
+            )
+            self.stdout.write('  Hot functions (self / cumulative):')
+            for fn in row['hot_functions']:
+                self.stdout.write(f"    {fn['self']:>10}  {fn['cumulative']:>10}  {fn['function']}")
+            self.stdout.write('  Slowest SQL (total s / count):')
+            for query in row['slowest_sql']:
+                self.stdout.write(f"    {query['time']:>10.4f}  {query['count']:>5}  {query['sql'][:120]}")
+
+            if folded_dir and row['folded']:
+                name = re.sub(r'[^A-Za-z0-9_.-]+', '_', row['endpoint']).strip('_')
+                path = folded_dir / f'{name}.folded'
+                path.write_text(''.join(f"{stack} {count}\n" for stack, count in row['folded'].most_common()))
+                self.stdout.write(f"  Folded stacks: {path}")
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dashboard import snapshots
+
+
+class Command(BaseCommand):
+    help = 'Render the viewer snapshots whose data changed since they were last published'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-render every snapshot')
+
+    def handle(self, *args, **options):
+        counts = snapshots.publish(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {counts['rendered']} snapshots, {counts['written']} changed, in {settings.SNAPSHOT_DIR}"
+        ))
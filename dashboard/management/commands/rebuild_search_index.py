@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from dashboard import search
+from dashboard.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from powders, tasks and QC reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--if-empty', action='store_true',
+                            help='Only build when the index has no documents yet')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and SearchDocument.objects.exists():
+            self.stdout.write('Search index already populated, skipping')
+            return
+
+        total = 0
+        with transaction.atomic():
+            SearchDocument.objects.all().delete()
+            for model in search.SEARCHABLE:
+                batch = []
+                for instance in model.objects.order_by('pk').iterator(chunk_size=options['batch_size']):
+                    batch.append(search.build_document(instance))
+                    if len(batch) >= options['batch_size']:
+                        total += len(SearchDocument.objects.bulk_create(batch))
+                        batch = []
+                total += len(SearchDocument.objects.bulk_create(batch))
+                self.stdout.write(f"Indexed {model._meta.verbose_name_plural}")
+
+            if connection.vendor == 'sqlite':
+                # Re-derive the FTS5 table in one pass rather than trusting
+                # per-row triggers after a mass delete.
+                with connection.cursor() as cursor:
+                    cursor.execute("INSERT INTO dashboard_searchdocument_fts(dashboard_searchdocument_fts) VALUES ('rebuild')")
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} documents'))
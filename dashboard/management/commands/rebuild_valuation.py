@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import valuation
+from dashboard.models import Powder, PowderValuation
+
+
+class Command(BaseCommand):
+    help = 'Recompute inventory valuation (running totals and FIFO layers) from the stock ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('skus', nargs='*', help='Powder SKUs to rebuild (default: all)')
+        parser.add_argument('--if-empty', action='store_true',
+                            help='Only build when no valuation exists yet')
+
+    def handle(self, *args, **options):
+        if valuation.method() not in valuation.METHODS:
+            raise CommandError(f"INVENTORY_VALUATION_METHOD must be one of {', '.join(valuation.METHODS)}")
+        if options['if_empty'] and PowderValuation.objects.exists():
+            self.stdout.write('Valuation already populated, skipping')
+            return
+
+        powders = Powder.objects.order_by('sku')
+        if options['skus']:
+            powders = powders.filter(sku__in=options['skus'])
+
+        for powder in powders:
+            replayed = valuation.rebuild(powder)
+            self.stdout.write(f"{powder.sku}: {replayed} movements")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt valuation ({valuation.method()})"))
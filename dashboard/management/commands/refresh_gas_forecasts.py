@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import gas
+
+
+class Command(BaseCommand):
+    help = 'Refit gas consumption rates and recompute every tank\'s forecast'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', action='store_true', help='Also print the refill schedule')
+
+    def handle(self, *args, **options):
+        tanks = gas.refresh()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed forecasts for {tanks} tanks"))
+        if not options['schedule']:
+            return
+
+        plan = gas.schedule()
+        for trip in plan['trips']:
+            tanks = ', '.join(f"#{stop['tank']} {stop['type']} ({stop['refill_quantity']:g})" for stop in trip['tanks'])
+            self.stdout.write(f"{trip['date']:%Y-%m-%d}  {tanks}  cost {trip['total_cost']:.2f}")
+        self.stdout.write(f"{len(plan['trips'])} trips for {plan['tanks']} tanks, {plan['trips_saved']} saved")
@@ -0,0 +1,93 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from dashboard import jobs
+
+
+def _process_main(work_kwargs):
+    """Entry point for worker processes (spawned, so Django must be set up again)."""
+    import django
+    django.setup()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    jobs.work(stop, **work_kwargs)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOBS_CONCURRENCY,
+                            help='Number of worker threads or processes')
+        parser.add_argument('--mode', choices=['threads', 'processes'], default=settings.JOBS_WORKER_MODE)
+        parser.add_argument('--queue', action='append', default=None,
+                            help='Only run jobs with this name (repeatable)')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL)
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue is empty instead of polling forever')
+
+    def handle(self, *args, **options):
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+        concurrency = max(1, options['concurrency'])
+        work_kwargs = {
+            'names': options['queue'],
+            'poll_interval': options['poll_interval'],
+            'burst': options['burst'],
+        }
+        self.stdout.write(f"Starting {concurrency} worker {options['mode']}...")
+
+        if options['mode'] == 'processes':
+            self._run_processes(concurrency, work_kwargs)
+        else:
+            self._run_threads(concurrency, work_kwargs)
+
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
+
+    def _run_threads(self, concurrency, work_kwargs):
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+        threads = [
+            threading.Thread(
+                target=jobs.work,
+                args=(stop,),
+                kwargs=work_kwargs,
+                name=f'job-worker-{i}',
+            )
+            for i in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        # Join with a timeout so the main thread keeps receiving signals.
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+
+    def _run_processes(self, concurrency, work_kwargs):
+        # Child processes must not inherit this process's database connections.
+        connections.close_all()
+        ctx = multiprocessing.get_context('spawn')
+        processes = [ctx.Process(target=_process_main, args=(work_kwargs,), name=f'job-worker-{i}')
+                     for i in range(concurrency)]
+        for process in processes:
+            process.start()
+
+        def shutdown(*_):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        for process in processes:
+            process.join()
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(blank=True, default='', max_length=150)),
+                ('verb', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('resource', models.CharField(max_length=50)),
+                ('object_id', models.CharField(blank=True, default='', max_length=50)),
+                ('object_repr', models.CharField(blank=True, default='', max_length=200)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='activity_feed_idx'), models.Index(fields=['user', '-created_at', '-id'], name='activity_user_idx'), models.Index(fields=['resource', '-created_at', '-id'], name='activity_resource_idx')],
+            },
+        ),
+    ]
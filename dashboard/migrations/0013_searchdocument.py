@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:15
+
+from django.db import migrations, models
+
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE dashboard_searchdocument_fts USING fts5(
+        title, body,
+        content='dashboard_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER dashboard_searchdocument_ai AFTER INSERT ON dashboard_searchdocument BEGIN
+        INSERT INTO dashboard_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER dashboard_searchdocument_ad AFTER DELETE ON dashboard_searchdocument BEGIN
+        INSERT INTO dashboard_searchdocument_fts(dashboard_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER dashboard_searchdocument_au AFTER UPDATE ON dashboard_searchdocument BEGIN
+        INSERT INTO dashboard_searchdocument_fts(dashboard_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO dashboard_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS dashboard_searchdocument_au",
+    "DROP TRIGGER IF EXISTS dashboard_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS dashboard_searchdocument_ai",
+    "DROP TABLE IF EXISTS dashboard_searchdocument_fts",
+]
+
+POSTGRES_FORWARD = [
+    """ALTER TABLE dashboard_searchdocument ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(body, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX dashboard_searchdocument_vector_idx ON dashboard_searchdocument USING GIN (search_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS dashboard_searchdocument_vector_idx",
+    "ALTER TABLE dashboard_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def create_fulltext_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD})
+
+
+def drop_fulltext_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_activityevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('doc_type', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_searchdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='task_board_idx'),
+        ),
+    ]
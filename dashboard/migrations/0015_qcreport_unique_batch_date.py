@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Existing duplicates must go before the constraint can be created. This is
+# the same window-function DELETE as dashboard.dedupe, inlined so the
+# migration does not depend on application code.
+DELETE_DUPLICATES = """
+    DELETE FROM dashboard_qcreport WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY batch_id, date ORDER BY created_at DESC, id DESC
+            ) AS dup_rank
+            FROM dashboard_qcreport
+        ) ranked WHERE dup_rank > 1
+    )
+"""
+
+DELETE_ORPHANED_DOCUMENTS = """
+    DELETE FROM dashboard_searchdocument
+    WHERE doc_type = 'qcreport' AND object_id NOT IN (SELECT id FROM dashboard_qcreport)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0014_task_board_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(DELETE_DUPLICATES, migrations.RunSQL.noop),
+        migrations.RunSQL(DELETE_ORPHANED_DOCUMENTS, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='qcreport',
+            constraint=models.UniqueConstraint(fields=('batch_id', 'date'), name='unique_qc_batch_date'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0015_qcreport_unique_batch_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=30)),
+                ('original_id', models.BigIntegerField()),
+                ('record_date', models.DateField()),
+                ('payload', models.BinaryField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_name', '-record_date'], name='archive_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('model_name', 'original_id'), name='unique_archived_record')],
+            },
+        ),
+    ]
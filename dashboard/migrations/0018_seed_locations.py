@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def seed_locations(apps, schema_editor):
+    """Turn each distinct Powder.location string into a Location holding that powder's stock."""
+    Powder = apps.get_model('dashboard', 'Powder')
+    Location = apps.get_model('dashboard', 'Location')
+    StockLevel = apps.get_model('dashboard', 'StockLevel')
+
+    locations = {}
+    levels = []
+    for powder in Powder.objects.exclude(location='').only('id', 'location', 'current_stock'):
+        name = powder.location.strip()
+        if not name:
+            continue
+        key = name.lower()
+        if key not in locations:
+            locations[key] = Location.objects.get_or_create(name=name)[0]
+        levels.append(StockLevel(powder_id=powder.id, location=locations[key], quantity=powder.current_stock))
+    StockLevel.objects.bulk_create(levels, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0017_locations'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_locations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:20
+
+import datetime
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0018_seed_locations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StickerPrint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(blank=True, default='', max_length=200)),
+                ('copies', models.PositiveIntegerField(default=1)),
+                ('printed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-printed_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='qcreport',
+            name='powder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='qc_reports', to='dashboard.powder'),
+        ),
+        migrations.CreateModel(
+            name='Lot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, unique=True)),
+                ('received_on', models.DateField(default=datetime.date.today)),
+                ('quantity', models.FloatField(default=0)),
+                ('supplier', models.CharField(blank=True, default='', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('powder', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lots', to='dashboard.powder')),
+            ],
+            options={
+                'ordering': ['-received_on', '-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='qcreport',
+            name='lot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='qc_reports', to='dashboard.lot'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='lot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='dashboard.lot'),
+        ),
+        migrations.AddIndex(
+            model_name='qcreport',
+            index=models.Index(fields=['powder', 'result', '-date'], name='qc_powder_result_idx'),
+        ),
+        migrations.AddField(
+            model_name='stickerprint',
+            name='lot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sticker_prints', to='dashboard.lot'),
+        ),
+        migrations.AddField(
+            model_name='stickerprint',
+            name='powder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sticker_prints', to='dashboard.powder'),
+        ),
+        migrations.AddField(
+            model_name='stickerprint',
+            name='printed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='lot',
+            index=models.Index(fields=['powder', '-received_on'], name='lot_powder_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+import re
+
+from django.db import migrations
+
+LABEL = re.compile(r'(.+?)\s*\(([^()]+)\)')
+
+
+def link_qc_reports(apps, schema_editor):
+    """
+    Resolve QCReport.powder_type / batch_id strings to Powder and Lot rows.
+
+    Mirrors PowderManager.resolve and LotManager.resolve: SKU, name or
+    "Name (SKU)" for powders; a lot is created per batch ID whose powder is
+    known. Unresolvable strings are left unlinked.
+    """
+    Powder = apps.get_model('dashboard', 'Powder')
+    Lot = apps.get_model('dashboard', 'Lot')
+    QCReport = apps.get_model('dashboard', 'QCReport')
+
+    by_sku, by_name = {}, {}
+    for powder in Powder.objects.order_by('pk').only('id', 'sku', 'name'):
+        by_sku.setdefault(powder.sku.strip().lower(), powder.id)
+        by_name.setdefault(powder.name.strip().lower(), powder.id)
+
+    def resolve(reference):
+        reference = (reference or '').strip()
+        match = LABEL.fullmatch(reference)
+        if match and match.group(2).strip().lower() in by_sku:
+            return by_sku[match.group(2).strip().lower()]
+        return by_sku.get(reference.lower()) or by_name.get(reference.lower())
+
+    lots = dict(Lot.objects.values_list('code', 'id'))
+    lot_powder = dict(Lot.objects.values_list('id', 'powder_id'))
+    for report in QCReport.objects.filter(lot__isnull=True).order_by('date', 'pk').iterator():
+        powder_id = report.powder_id or resolve(report.powder_type)
+        code = (report.batch_id or '').strip()
+        lot_id = lots.get(code)
+        if lot_id is None and code and powder_id:
+            lot = Lot.objects.create(code=code, powder_id=powder_id, received_on=report.date)
+            lots[code] = lot_id = lot.id
+            lot_powder[lot.id] = powder_id
+        if powder_id is None and lot_id is not None:
+            powder_id = lot_powder[lot_id]
+        if powder_id or lot_id:
+            QCReport.objects.filter(pk=report.pk).update(powder_id=powder_id, lot_id=lot_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0019_lots'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_qc_reports, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0020_link_qc_reports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PowderValuation',
+            fields=[
+                ('powder', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valuation', serialize=False, to='dashboard.powder')),
+                ('quantity', models.DecimalField(decimal_places=3, default=0, max_digits=12)),
+                ('value', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='balance_quantity',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='balance_value',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=16),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='value_change',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=16),
+        ),
+        migrations.AlterField(
+            model_name='powder',
+            name='current_stock',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='stocklevel',
+            name='quantity',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='quantity',
+            field=models.DecimalField(decimal_places=3, max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('remaining', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('movement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cost_layers', to='dashboard.stockmovement')),
+                ('powder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='dashboard.powder')),
+            ],
+            options={
+                'ordering': ['received_at', 'id'],
+                'indexes': [models.Index(condition=models.Q(('remaining__gt', 0)), fields=['powder', 'received_at', 'id'], name='cost_layer_open_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_readings(apps, schema_editor):
+    """Start every tank's history with its current level."""
+    GasRecord = apps.get_model('dashboard', 'GasRecord')
+    GasReading = apps.get_model('dashboard', 'GasReading')
+    GasReading.objects.bulk_create(
+        GasReading(tank_id=tank.id, level=tank.current_level, recorded_at=tank.updated_at)
+        for tank in GasRecord.objects.only('id', 'current_level', 'updated_at')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0023_idempotencyrecord'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GasForecast',
+            fields=[
+                ('tank', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='dashboard.gasrecord')),
+                ('source', models.CharField(choices=[('tank', 'Tank history'), ('type', 'Gas type average'), ('none', 'No consumption data')], default='none', max_length=10)),
+                ('readings', models.PositiveIntegerField(default=0)),
+                ('rate_per_day', models.FloatField(default=0)),
+                ('rate_stderr', models.FloatField(blank=True, null=True)),
+                ('level', models.FloatField(default=0)),
+                ('level_at', models.DateTimeField(blank=True, null=True)),
+                ('reorder_at', models.DateTimeField(blank=True, null=True)),
+                ('empty_at', models.DateTimeField(blank=True, null=True)),
+                ('empty_earliest', models.DateTimeField(blank=True, null=True)),
+                ('empty_latest', models.DateTimeField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['empty_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GasReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.FloatField()),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('tank', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='dashboard.gasrecord')),
+            ],
+            options={
+                'ordering': ['-recorded_at', '-id'],
+                'indexes': [models.Index(fields=['tank', 'recorded_at'], name='gas_reading_tank_idx')],
+            },
+        ),
+        migrations.RunPython(seed_readings, migrations.RunPython.noop),
+    ]
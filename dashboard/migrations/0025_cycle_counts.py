@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0024_gas_forecasting'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CycleCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('approved', 'Approved'), ('cancelled', 'Cancelled')], default='open', max_length=10)),
+                ('note', models.CharField(blank=True, default='', max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('approved_at', models.DateTimeField(blank=True, null=True)),
+                ('approved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='cycle_counts', to='dashboard.location')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CycleCountLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counted', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('book_quantity', models.DecimalField(blank=True, decimal_places=3, max_digits=12, null=True)),
+                ('adjustment', models.DecimalField(blank=True, decimal_places=3, max_digits=12, null=True)),
+                ('adjustment_value', models.DecimalField(blank=True, decimal_places=4, max_digits=16, null=True)),
+                ('count', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='dashboard.cyclecount')),
+                ('powder', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='dashboard.powder')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('count', 'powder'), name='unique_cycle_count_powder')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0025_cycle_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('inventory', 'Inventory'), ('qc', 'QC pass rate'), ('gas', 'Gas cost')], max_length=20)),
+                ('period', models.CharField(choices=[('week', 'Weekly'), ('month', 'Monthly')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('params_key', models.CharField(max_length=64)),
+                ('format', models.CharField(choices=[('xlsx', 'Excel'), ('pdf', 'PDF'), ('csv', 'CSV')], max_length=10)),
+                ('data_hash', models.CharField(max_length=64)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('file', models.CharField(max_length=255)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-period_start', 'kind', 'format'],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'period', 'period_start', 'params_key', 'format'), name='unique_report_artifact')],
+            },
+        ),
+    ]
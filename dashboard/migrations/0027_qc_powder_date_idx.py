@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0026_report_artifacts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='qcreport',
+            index=models.Index(fields=['powder', '-date', '-id'], name='qc_powder_date_idx'),
+        ),
+    ]
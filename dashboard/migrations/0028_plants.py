@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:46
+
+import django.db.models.deletion
+import users.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0027_qc_powder_date_idx'),
+        ('users', '0002_plants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='qcreport',
+            name='unique_qc_batch_date',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_board_idx',
+        ),
+        migrations.AddField(
+            model_name='cyclecount',
+            name='plant',
+            field=models.ForeignKey(default=users.models.default_plant_id, on_delete=django.db.models.deletion.PROTECT, related_name='cycle_counts', to='users.plant'),
+        ),
+        migrations.AddField(
+            model_name='gasrecord',
+            name='plant',
+            field=models.ForeignKey(default=users.models.default_plant_id, on_delete=django.db.models.deletion.PROTECT, related_name='gas_records', to='users.plant'),
+        ),
+        migrations.AddField(
+            model_name='powder',
+            name='plant',
+            field=models.ForeignKey(default=users.models.default_plant_id, on_delete=django.db.models.deletion.PROTECT, related_name='powders', to='users.plant'),
+        ),
+        migrations.AddField(
+            model_name='qcreport',
+            name='plant',
+            field=models.ForeignKey(default=users.models.default_plant_id, on_delete=django.db.models.deletion.PROTECT, related_name='qc_reports', to='users.plant'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='plant',
+            field=models.ForeignKey(default=users.models.default_plant_id, on_delete=django.db.models.deletion.PROTECT, related_name='tasks', to='users.plant'),
+        ),
+        migrations.AlterField(
+            model_name='powder',
+            name='sku',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='gasrecord',
+            index=models.Index(fields=['plant', '-created_at'], name='gas_plant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='powder',
+            index=models.Index(fields=['plant', '-updated_at'], name='powder_plant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qcreport',
+            index=models.Index(fields=['plant', '-created_at'], name='qc_plant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['plant', 'status', '-created_at', '-id'], name='task_board_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='powder',
+            constraint=models.UniqueConstraint(fields=('plant', 'sku'), name='unique_powder_sku_per_plant'),
+        ),
+        migrations.AddConstraint(
+            model_name='qcreport',
+            constraint=models.UniqueConstraint(fields=('plant', 'batch_id', 'date'), name='unique_qc_batch_date'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_assignees(apps, schema_editor):
+    """
+    Resolve the free-text Task.assignee to users: username, "First Last",
+    email or a first name only one user has, case-insensitively. Names that
+    match nobody (or several people) are kept at the end of the description.
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Task = apps.get_model('dashboard', 'Task')
+
+    keys = {}
+    for user in User.objects.order_by('pk'):
+        full_name = f'{user.first_name} {user.last_name}'.strip()
+        for key in {user.username, full_name, user.email, user.first_name}:
+            key = (key or '').strip().lower()
+            if key:
+                keys.setdefault(key, set()).add(user.pk)
+    # Usernames are unique, so they win over a clashing name.
+    for user in User.objects.order_by('pk'):
+        keys[user.username.strip().lower()] = {user.pk}
+
+    for task in Task.objects.exclude(assignee_name='').order_by('pk').iterator():
+        matches = keys.get(task.assignee_name.strip().lower(), set())
+        if len(matches) == 1:
+            Task.objects.filter(pk=task.pk).update(assignee_id=next(iter(matches)))
+        else:
+            description = f'{task.description}\n\nAssignee: {task.assignee_name}'.strip()
+            Task.objects.filter(pk=task.pk).update(description=description)
+
+
+def restore_assignee_names(apps, schema_editor):
+    Task = apps.get_model('dashboard', 'Task')
+    for task in Task.objects.filter(assignee__isnull=False).select_related('assignee').iterator():
+        Task.objects.filter(pk=task.pk).update(assignee_name=task.assignee.username)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0028_plants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='task',
+            old_name='assignee',
+            new_name='assignee_name',
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='assignee',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assigned_tasks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(link_assignees, restore_assignee_names),
+        migrations.RemoveField(
+            model_name='task',
+            name='assignee_name',
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assignee', 'status', '-created_at'], name='task_assignee_idx'),
+        ),
+    ]
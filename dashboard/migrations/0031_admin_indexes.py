@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0030_webhooks'),
+        ('users', '0002_plants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='qcreport',
+            index=models.Index(fields=['-created_at', '-id'], name='qc_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qcreport',
+            index=models.Index(fields=['result', '-created_at', '-id'], name='qc_result_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qcreport',
+            index=models.Index(fields=['date'], name='qc_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qcreport',
+            index=models.Index(fields=['batch_id'], name='qc_batch_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['-created_at', '-id'], name='task_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='task_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['title'], name='task_title_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0031_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lot',
+            name='powder',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='dashboard.powder'),
+        ),
+    ]
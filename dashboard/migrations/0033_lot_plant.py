@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:21
+
+import django.db.models.deletion
+import users.models
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_plants(apps, schema_editor):
+    """
+    Put each lot in its powder's plant, and unlink QC reports that were
+    attached to a lot (or, through it, a powder) of another plant.
+    """
+    Powder = apps.get_model('dashboard', 'Powder')
+    Lot = apps.get_model('dashboard', 'Lot')
+    QCReport = apps.get_model('dashboard', 'QCReport')
+
+    Lot.objects.update(plant_id=Subquery(Powder.objects.filter(pk=OuterRef('powder_id')).values('plant_id')[:1]))
+    QCReport.objects.exclude(lot__isnull=True).exclude(lot__plant_id=F('plant_id')).update(lot=None)
+    QCReport.objects.exclude(powder__isnull=True).exclude(powder__plant_id=F('plant_id')).update(powder=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0032_lot_powder_cascade'),
+        ('users', '0002_plants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lot',
+            name='plant',
+            field=models.ForeignKey(default=users.models.default_plant_id, on_delete=django.db.models.deletion.PROTECT, related_name='lots', to='users.plant'),
+        ),
+        migrations.RunPython(backfill_plants, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='lot',
+            name='code',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='lot',
+            constraint=models.UniqueConstraint(fields=('plant', 'code'), name='unique_lot_code_per_plant'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:23
+
+import django.db.models.deletion
+import users.models
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+SEARCHABLE = {'powder': 'Powder', 'task': 'Task', 'qcreport': 'QCReport'}
+# Activity resources (model names) whose rows belong to a plant.
+PLANT_RESOURCES = ('powder', 'task', 'qcreport', 'gasrecord', 'lot', 'cyclecount', 'stickerprint', 'webhookendpoint')
+
+
+def _plant_of(model):
+    return Subquery(model.objects.filter(pk=OuterRef('object_id')).values('plant_id')[:1])
+
+
+def backfill_plants(apps, schema_editor):
+    """
+    Stamp search documents, sticker prints and activity events with the
+    plant of the row they describe. Events of deleted rows stay unscoped.
+    """
+    SearchDocument = apps.get_model('dashboard', 'SearchDocument')
+    StickerPrint = apps.get_model('dashboard', 'StickerPrint')
+    ActivityEvent = apps.get_model('dashboard', 'ActivityEvent')
+    Lot = apps.get_model('dashboard', 'Lot')
+    Powder = apps.get_model('dashboard', 'Powder')
+
+    for doc_type, name in SEARCHABLE.items():
+        model = apps.get_model('dashboard', name)
+        SearchDocument.objects.filter(doc_type=doc_type).update(plant_id=_plant_of(model))
+
+    StickerPrint.objects.filter(lot__isnull=False).update(
+        plant_id=Subquery(Lot.objects.filter(pk=OuterRef('lot_id')).values('plant_id')[:1]))
+    StickerPrint.objects.filter(lot__isnull=True, powder__isnull=False).update(
+        plant_id=Subquery(Powder.objects.filter(pk=OuterRef('powder_id')).values('plant_id')[:1]))
+
+    for resource in PLANT_RESOURCES:
+        model = apps.get_model('dashboard', resource)
+        plants = dict(model.objects.values_list('pk', 'plant_id'))
+        by_plant = {}
+        for pk, plant_id in plants.items():
+            by_plant.setdefault(plant_id, []).append(str(pk))
+        for plant_id, ids in by_plant.items():
+            for start in range(0, len(ids), 500):
+                ActivityEvent.objects.filter(resource=resource, object_id__in=ids[start:start + 500]).update(
+                    plant_id=plant_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0033_lot_plant'),
+        ('users', '0002_plants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activityevent',
+            name='plant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.plant'),
+        ),
+        migrations.AddField(
+            model_name='searchdocument',
+            name='plant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.plant'),
+        ),
+        migrations.AddField(
+            model_name='stickerprint',
+            name='plant',
+            field=models.ForeignKey(default=users.models.default_plant_id, on_delete=django.db.models.deletion.PROTECT, related_name='sticker_prints', to='users.plant'),
+        ),
+        migrations.RunPython(backfill_plants, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='activityevent',
+            index=models.Index(fields=['plant', '-created_at', '-id'], name='activity_plant_idx'),
+        ),
+    ]
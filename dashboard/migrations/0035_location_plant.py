@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:40
+
+import django.db.models.deletion
+import users.models
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def split_locations(apps, schema_editor):
+    """
+    Put each location in the plant whose stock it holds. A location used by
+    several plants (stock levels, movements, cycle counts) stays with the
+    first and is copied for each other plant, whose rows move to the copy.
+    """
+    Location = apps.get_model('dashboard', 'Location')
+    StockLevel = apps.get_model('dashboard', 'StockLevel')
+    StockMovement = apps.get_model('dashboard', 'StockMovement')
+    CycleCount = apps.get_model('dashboard', 'CycleCount')
+
+    for location in Location.objects.order_by('pk'):
+        used = Q(location=location) | Q(to_location=location)
+        plants = (
+            set(StockLevel.objects.filter(location=location).values_list('powder__plant_id', flat=True))
+            | set(StockMovement.objects.filter(used).values_list('powder__plant_id', flat=True))
+            | set(CycleCount.objects.filter(location=location).values_list('plant_id', flat=True))
+        ) - {None}
+        if not plants:
+            continue
+        first, *others = sorted(plants)
+        Location.objects.filter(pk=location.pk).update(plant_id=first)
+        for plant_id in others:
+            copy = Location.objects.create(plant_id=plant_id, name=location.name, kind=location.kind)
+            StockLevel.objects.filter(location=location, powder__plant_id=plant_id).update(location=copy)
+            StockMovement.objects.filter(location=location, powder__plant_id=plant_id).update(location=copy)
+            StockMovement.objects.filter(to_location=location, powder__plant_id=plant_id).update(to_location=copy)
+            CycleCount.objects.filter(location=location, plant_id=plant_id).update(location=copy)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0034_plant_scoped_feeds'),
+        ('users', '0002_plants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='plant',
+            field=models.ForeignKey(default=users.models.default_plant_id, on_delete=django.db.models.deletion.PROTECT, related_name='locations', to='users.plant'),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.RunPython(split_locations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(fields=('plant', 'name'), name='unique_location_name_per_plant'),
+        ),
+    ]
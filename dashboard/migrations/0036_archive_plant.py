@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:42
+
+import django.db.models.deletion
+import users.models
+import json
+import zlib
+
+from django.db import migrations, models
+
+
+def backfill_plants(apps, schema_editor):
+    """Copy each archived row's plant out of its payload; rows from before plants keep the default."""
+    ArchivedRecord = apps.get_model('dashboard', 'ArchivedRecord')
+    by_plant = {}
+    for pk, payload in ArchivedRecord.objects.values_list('pk', 'payload').iterator():
+        plant = json.loads(zlib.decompress(bytes(payload))).get('plant')
+        if plant is not None:
+            by_plant.setdefault(plant, []).append(pk)
+    for plant, pks in by_plant.items():
+        for start in range(0, len(pks), 500):
+            ArchivedRecord.objects.filter(pk__in=pks[start:start + 500]).update(plant_id=plant)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0035_location_plant'),
+        ('users', '0002_plants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedrecord',
+            name='plant',
+            field=models.ForeignKey(default=users.models.default_plant_id, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.plant'),
+        ),
+        migrations.RunPython(backfill_plants, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='archivedrecord',
+            index=models.Index(fields=['model_name', 'plant', '-record_date', '-original_id'], name='archive_plant_idx'),
+        ),
+    ]
@@ -1,19 +1,93 @@
-from datetime import date
-from django.db import models
+import re
+import secrets
+from datetime import date, timedelta
+from django.db import models, transaction
+from django.db.models import Avg, Case, Count, DecimalField, F, FloatField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
+
+from users.models import default_plant_id
+
+
+class PowderQuerySet(models.QuerySet):
+    def resolve(self, reference):
+        """
+        Find the powder a free-text reference points to: an exact SKU, an
+        exact name, or the "Name (SKU)" form used in labels. Case-insensitive.
+        """
+        reference = (reference or '').strip()
+        if not reference:
+            return None
+        match = re.fullmatch(r'(.+?)\s*\(([^()]+)\)', reference)
+        if match:
+            powder = self.filter(sku__iexact=match.group(2).strip()).first()
+            if powder:
+                return powder
+        return (
+            self.filter(sku__iexact=reference).first()
+            or self.filter(name__iexact=reference).order_by('pk').first()
+        )
+
+    def with_metrics(self, qc_days=30):
+        """
+        Annotate each powder with its latest QC result and date, QC pass rate
+        and inspection count over the last ``qc_days`` days, last movement
+        time and stock value, as correlated subqueries in the same SELECT.
+        """
+        latest_qc = QCReport.objects.filter(powder=OuterRef('pk')).order_by('-date', '-id')
+        recent_qc = (
+            QCReport.objects.filter(powder=OuterRef('pk'), date__gte=timezone.localdate() - timedelta(days=qc_days))
+            .order_by().values('powder')
+        )
+        last_movement = StockMovement.objects.filter(powder=OuterRef('pk')).order_by('-created_at')
+        return self.annotate(
+            latest_qc_result=Subquery(latest_qc.values('result')[:1]),
+            latest_qc_date=Subquery(latest_qc.values('date')[:1]),
+            qc_pass_rate=Subquery(recent_qc.annotate(rate=Avg(Case(
+                When(result='Pass', then=Value(1.0)), default=Value(0.0), output_field=FloatField(),
+            ))).values('rate')),
+            qc_count=Coalesce(Subquery(recent_qc.annotate(n=Count('id')).values('n')), Value(0)),
+            last_movement_at=Subquery(last_movement.values('created_at')[:1]),
+            stock_value=Coalesce('valuation__value', Value(0), output_field=DecimalField(max_digits=16, decimal_places=4)),
+        )
+
+
+    def with_status(self):
+        """Annotate ``stock_status``, the value of ``Powder.status``, so it can be sorted and filtered on."""
+        return self.annotate(stock_status=Case(
+            When(current_stock__lte=F('min_level'), then=Value('Critical')),
+            When(current_stock__lte=F('min_level') * 1.5, then=Value('Low Stock')),
+            default=Value('In Stock'),
+            output_field=models.CharField(),
+        ))
+
+
+PowderManager = models.Manager.from_queryset(PowderQuerySet)
 
 
 class Powder(models.Model):
+    plant = models.ForeignKey('users.Plant', on_delete=models.PROTECT, default=default_plant_id, related_name='powders')
     name = models.CharField(max_length=100)
-    sku = models.CharField(max_length=50, unique=True)
+    sku = models.CharField(max_length=50)
     color = models.CharField(max_length=20, default='#E8771A')
-    current_stock = models.FloatField(default=0)
+    current_stock = models.DecimalField(max_digits=12, decimal_places=3, default=0)
     min_level = models.FloatField(default=0)
     location = models.CharField(max_length=100, blank=True, default='')
     price_per_kg = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PowderManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['plant', 'sku'], name='unique_powder_sku_per_plant'),
+        ]
+        indexes = [
+            models.Index(fields=['plant', '-updated_at'], name='powder_plant_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.sku})"
 
@@ -26,6 +100,240 @@ class Powder(models.Model):
         return 'In Stock'
 
 
+class Location(models.Model):
+    KIND_CHOICES = (
+        ('storeroom', 'Storeroom'),
+        ('booth', 'Booth'),
+        ('other', 'Other'),
+    )
+
+    plant = models.ForeignKey('users.Plant', on_delete=models.PROTECT, default=default_plant_id, related_name='locations')
+    name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='storeroom')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            # Also serves the (plant, name) index behind each plant's location list.
+            models.UniqueConstraint(fields=['plant', 'name'], name='unique_location_name_per_plant'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class LotManager(models.Manager):
+    def resolve(self, code, plant, powder=None):
+        """
+        Return the lot with ``code`` in ``plant``, creating it for ``powder``
+        (a powder of that plant) if it is new and the powder is known.
+        """
+        code = (code or '').strip()
+        if not code:
+            return None
+        lot = self.filter(plant_id=plant, code=code).first()
+        if lot is None and powder is not None and powder.plant_id == plant:
+            lot, _ = self.get_or_create(plant_id=plant, code=code, defaults={'powder': powder})
+        return lot
+
+
+class Lot(models.Model):
+    """
+    A received batch of one powder; ``code`` is the batch ID on QC reports and
+    stickers. Codes are unique per plant, and a lot is in its powder's plant.
+    """
+    plant = models.ForeignKey('users.Plant', on_delete=models.PROTECT, default=default_plant_id, related_name='lots')
+    code = models.CharField(max_length=50)
+    powder = models.ForeignKey(Powder, on_delete=models.CASCADE, related_name='lots')
+    received_on = models.DateField(default=date.today)
+    quantity = models.FloatField(default=0)
+    supplier = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = LotManager()
+
+    class Meta:
+        ordering = ['-received_on', '-id']
+        constraints = [
+            models.UniqueConstraint(fields=['plant', 'code'], name='unique_lot_code_per_plant'),
+        ]
+        indexes = [
+            models.Index(fields=['powder', '-received_on'], name='lot_powder_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.code} ({self.powder.sku})"
+
+    def save(self, *args, **kwargs):
+        self.plant_id = self.powder.plant_id
+        super().save(*args, **kwargs)
+
+
+class StickerPrint(models.Model):
+    plant = models.ForeignKey('users.Plant', on_delete=models.PROTECT, default=default_plant_id, related_name='sticker_prints')
+    lot = models.ForeignKey(Lot, on_delete=models.SET_NULL, null=True, blank=True, related_name='sticker_prints')
+    powder = models.ForeignKey(Powder, on_delete=models.SET_NULL, null=True, blank=True, related_name='sticker_prints')
+    label = models.CharField(max_length=200, blank=True, default='')
+    copies = models.PositiveIntegerField(default=1)
+    printed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    printed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-printed_at']
+
+    def __str__(self):
+        return f"{self.copies} x {self.label or self.lot}"
+
+    def save(self, *args, **kwargs):
+        source = self.lot or self.powder
+        if source is not None:
+            self.plant_id = source.plant_id
+        super().save(*args, **kwargs)
+
+
+class StockLevel(models.Model):
+    """Quantity of one powder held at one location."""
+    powder = models.ForeignKey(Powder, on_delete=models.CASCADE, related_name='stock_levels')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='stock_levels')
+    quantity = models.DecimalField(max_digits=12, decimal_places=3, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Also serves "where is this powder?" lookups (picking lists).
+            models.UniqueConstraint(fields=['powder', 'location'], name='unique_stock_level'),
+        ]
+        indexes = [
+            models.Index(fields=['location', 'powder'], name='stock_location_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.powder.sku} @ {self.location.name}: {self.quantity}"
+
+
+class StockMovement(models.Model):
+    """Ledger entry for every stock change made through ``dashboard.stock``."""
+    KIND_CHOICES = (
+        ('receive', 'Receive'),
+        ('consume', 'Consume'),
+        ('adjust', 'Adjust'),
+        ('transfer', 'Transfer'),
+    )
+
+    powder = models.ForeignKey(Powder, on_delete=models.CASCADE, related_name='movements')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Signed change to the powder's on-hand stock; transfers record the
+    # quantity moved and leave the SKU total unchanged.
+    quantity = models.DecimalField(max_digits=12, decimal_places=3)
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    to_location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    lot = models.ForeignKey(Lot, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+    note = models.CharField(max_length=200, blank=True, default='')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Valuation written by ``dashboard.valuation`` when the movement is posted:
+    # cost per kg, change to the SKU's stock value, and the SKU's running
+    # quantity and value after this movement (used for point-in-time reports).
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    value_change = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    balance_quantity = models.DecimalField(max_digits=12, decimal_places=3, default=0)
+    balance_value = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['powder', '-created_at'], name='movement_powder_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.quantity} {self.powder.sku}"
+
+
+class PowderValuation(models.Model):
+    """Running quantity and value of one powder, updated with every movement."""
+    powder = models.OneToOneField(Powder, on_delete=models.CASCADE, primary_key=True, related_name='valuation')
+    quantity = models.DecimalField(max_digits=12, decimal_places=3, default=0)
+    value = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.powder.sku}: {self.value}"
+
+    @property
+    def average_cost(self):
+        if self.quantity <= 0:
+            return None
+        return self.value / self.quantity
+
+
+class CostLayer(models.Model):
+    """A FIFO cost layer: stock received at one unit cost, consumed oldest first."""
+    powder = models.ForeignKey(Powder, on_delete=models.CASCADE, related_name='cost_layers')
+    movement = models.ForeignKey(StockMovement, on_delete=models.SET_NULL, null=True, blank=True, related_name='cost_layers')
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=4)
+    quantity = models.DecimalField(max_digits=12, decimal_places=3)
+    remaining = models.DecimalField(max_digits=12, decimal_places=3)
+    received_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['received_at', 'id']
+        indexes = [
+            # Only open layers are ever read when consuming stock.
+            models.Index(fields=['powder', 'received_at', 'id'], name='cost_layer_open_idx',
+                         condition=models.Q(remaining__gt=0)),
+        ]
+
+    def __str__(self):
+        return f"{self.powder.sku}: {self.remaining} @ {self.unit_cost}"
+
+
+class CycleCount(models.Model):
+    """A physical stock count of many SKUs, posted as adjustments once approved."""
+    STATUS_CHOICES = (
+        ('open', 'Open'),
+        ('approved', 'Approved'),
+        ('cancelled', 'Cancelled'),
+    )
+
+    # Counts of one location compare against its StockLevel rows; without a
+    # location they compare against each powder's total current_stock.
+    plant = models.ForeignKey('users.Plant', on_delete=models.PROTECT, default=default_plant_id, related_name='cycle_counts')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, blank=True, related_name='cycle_counts')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    note = models.CharField(max_length=200, blank=True, default='')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    approved_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='+')
+    approved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+
+    def __str__(self):
+        return f"Cycle count #{self.pk} ({self.status})"
+
+
+class CycleCountLine(models.Model):
+    count = models.ForeignKey(CycleCount, on_delete=models.CASCADE, related_name='lines')
+    powder = models.ForeignKey(Powder, on_delete=models.PROTECT, related_name='+')
+    counted = models.DecimalField(max_digits=12, decimal_places=3)
+    # Book quantity and the adjustment posted, frozen when the count is approved.
+    book_quantity = models.DecimalField(max_digits=12, decimal_places=3, null=True, blank=True)
+    adjustment = models.DecimalField(max_digits=12, decimal_places=3, null=True, blank=True)
+    adjustment_value = models.DecimalField(max_digits=16, decimal_places=4, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['count', 'powder'], name='unique_cycle_count_powder'),
+        ]
+
+    def __str__(self):
+        return f"#{self.count_id} {self.powder_id}: {self.counted}"
+
+
 class Task(models.Model):
     STATUS_CHOICES = (
         ('todo', 'To Do'),
@@ -33,27 +341,46 @@ class Task(models.Model):
         ('review', 'Review'),
         ('done', 'Done'),
     )
+    OPEN_STATUSES = ('todo', 'in_progress', 'review')
     PRIORITY_CHOICES = (
         ('low', 'Low'),
         ('medium', 'Medium'),
         ('high', 'High'),
     )
 
+    plant = models.ForeignKey('users.Plant', on_delete=models.PROTECT, default=default_plant_id, related_name='tasks')
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True, default='')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='todo')
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='medium')
-    assignee = models.CharField(max_length=100, blank=True, default='')
+    assignee = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_tasks',
+    )
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Kanban columns: one plant and status, newest first, keyset-paginated.
+            models.Index(fields=['plant', 'status', '-created_at', '-id'], name='task_board_idx'),
+            # "My tasks" and per-user workload.
+            models.Index(fields=['assignee', 'status', '-created_at'], name='task_assignee_idx'),
+            # Admin changelist: newest first (keyset pages), by status, title prefix search.
+            models.Index(fields=['-created_at', '-id'], name='task_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='task_status_idx'),
+            models.Index(fields=['title'], name='task_title_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # The webhook outbox row (dashboard.signals) commits with the task.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class QCReport(models.Model):
     RESULT_CHOICES = (
@@ -61,6 +388,7 @@ class QCReport(models.Model):
         ('Fail', 'Fail'),
     )
 
+    plant = models.ForeignKey('users.Plant', on_delete=models.PROTECT, default=default_plant_id, related_name='qc_reports')
     batch_id = models.CharField(max_length=50)
     powder_type = models.CharField(max_length=100, default='')
     inspector = models.CharField(max_length=100, default='')
@@ -70,17 +398,49 @@ class QCReport(models.Model):
     visual = models.CharField(max_length=50, blank=True, default='OK')
     notes = models.TextField(blank=True, default='')
     result = models.CharField(max_length=10, choices=RESULT_CHOICES, default='Pass')
+    # Resolved from batch_id / powder_type on save; the strings are kept as entered.
+    powder = models.ForeignKey(Powder, on_delete=models.SET_NULL, null=True, blank=True, related_name='qc_reports')
+    lot = models.ForeignKey(Lot, on_delete=models.SET_NULL, null=True, blank=True, related_name='qc_reports')
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            # One inspection per batch per day and plant; re-submits are rejected.
+            models.UniqueConstraint(fields=['plant', 'batch_id', 'date'], name='unique_qc_batch_date'),
+        ]
+        indexes = [
+            # "Which QC failures involved powder X", newest first.
+            models.Index(fields=['powder', 'result', '-date'], name='qc_powder_result_idx'),
+            # Latest and recent QC results per powder (Powder.objects.with_metrics()).
+            models.Index(fields=['powder', '-date', '-id'], name='qc_powder_date_idx'),
+            models.Index(fields=['plant', '-created_at'], name='qc_plant_idx'),
+            # Admin changelist: newest first (keyset pages), by result, date drill-down,
+            # batch prefix search. Opclasses only apply on Postgres (for LIKE 'x%').
+            models.Index(fields=['-created_at', '-id'], name='qc_created_idx'),
+            models.Index(fields=['result', '-created_at', '-id'], name='qc_result_idx'),
+            models.Index(fields=['date'], name='qc_date_idx'),
+            models.Index(fields=['batch_id'], name='qc_batch_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return f"QC {self.batch_id} - {self.result}"
 
+    def save(self, *args, **kwargs):
+        if self.powder_id is None and self.powder_type:
+            self.powder = Powder.objects.filter(plant_id=self.plant_id).resolve(self.powder_type)
+        if self.lot_id is None and self.batch_id:
+            self.lot = Lot.objects.resolve(self.batch_id, self.plant_id, self.powder)
+        if self.powder_id is None and self.lot_id is not None and self.lot.plant_id == self.plant_id:
+            self.powder_id = self.lot.powder_id
+        # The webhook outbox row (dashboard.signals) commits with the report.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class GasRecord(models.Model):
+    plant = models.ForeignKey('users.Plant', on_delete=models.PROTECT, default=default_plant_id, related_name='gas_records')
     type = models.CharField(max_length=50, default='Argon')
     capacity = models.FloatField(default=0)
     current_level = models.FloatField(default=0)
@@ -92,6 +452,352 @@ class GasRecord(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['plant', '-created_at'], name='gas_plant_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type} - {self.current_level}/{self.capacity}"
+
+
+class GasReading(models.Model):
+    """One observed level of a gas tank; the history consumption rates are fitted from."""
+    tank = models.ForeignKey(GasRecord, on_delete=models.CASCADE, related_name='readings')
+    level = models.FloatField()
+    recorded_at = models.DateTimeField(default=timezone.now)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        ordering = ['-recorded_at', '-id']
+        indexes = [models.Index(fields=['tank', 'recorded_at'], name='gas_reading_tank_idx')]
+
+    def __str__(self):
+        return f"{self.tank_id} @ {self.recorded_at:%Y-%m-%d %H:%M}: {self.level}"
+
+
+class GasForecast(models.Model):
+    """Precomputed consumption fit and empty-date prediction for one tank."""
+    SOURCE_CHOICES = (
+        ('tank', 'Tank history'),
+        ('type', 'Gas type average'),
+        ('none', 'No consumption data'),
+    )
+
+    tank = models.OneToOneField(GasRecord, on_delete=models.CASCADE, primary_key=True, related_name='forecast')
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='none')
+    readings = models.PositiveIntegerField(default=0)
+    rate_per_day = models.FloatField(default=0)
+    rate_stderr = models.FloatField(null=True, blank=True)
+    level = models.FloatField(default=0)
+    level_at = models.DateTimeField(null=True, blank=True)
+    reorder_at = models.DateTimeField(null=True, blank=True)
+    empty_at = models.DateTimeField(null=True, blank=True)
+    empty_earliest = models.DateTimeField(null=True, blank=True)
+    empty_latest = models.DateTimeField(null=True, blank=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['empty_at']
+
+    def __str__(self):
+        return f"{self.tank_id}: empty {self.empty_at or 'never'}"
+
+
+class Job(models.Model):
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    priority = models.SmallIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    progress = models.FloatField(default=0)
+    progress_message = models.CharField(max_length=200, blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Serves the worker's claim query: queued jobs that are due, highest priority first.
+            models.Index(fields=['status', 'run_after', '-priority'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    def set_progress(self, progress, message=''):
+        """
+        Record progress (0-100) without touching the rest of the row. Also a
+        heartbeat: a running job's ``locked_at`` moves forward, so a long job
+        that reports progress is never taken for stale.
+        """
+        self.progress = max(0, min(100, progress))
+        self.progress_message = message[:200]
+        now = timezone.now()
+        Job.objects.filter(pk=self.pk).update(
+            progress=self.progress, progress_message=self.progress_message, updated_at=now,
+            locked_at=Case(When(status='running', then=Value(now)), default=F('locked_at')),
+        )
+
+
+class ActivityEvent(models.Model):
+    VERB_CHOICES = (
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    username = models.CharField(max_length=150, blank=True, default='')
+    # The plant of the changed row; empty for shared rows (locations, users).
+    plant = models.ForeignKey('users.Plant', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    verb = models.CharField(max_length=10, choices=VERB_CHOICES)
+    resource = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=50, blank=True, default='')
+    object_repr = models.CharField(max_length=200, blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        # Every feed query is "newest first", optionally narrowed by plant,
+        # user or resource, so each index ends in the keyset pagination order.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='activity_feed_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='activity_user_idx'),
+            models.Index(fields=['resource', '-created_at', '-id'], name='activity_resource_idx'),
+            models.Index(fields=['plant', '-created_at', '-id'], name='activity_plant_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.username} {self.verb} {self.resource} {self.object_repr}"
+
+
+class SearchDocument(models.Model):
+    """
+    Denormalized text of a searchable row.
+
+    The full-text index itself lives outside the ORM: an FTS5 table kept in
+    sync by triggers on SQLite, and a generated ``tsvector`` column with a GIN
+    index on Postgres (see migration 0013 and ``dashboard.search``).
+    """
+    doc_type = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    plant = models.ForeignKey('users.Plant', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doc_type', 'object_id'], name='unique_search_document'),
+        ]
+
+    def __str__(self):
+        return f"{self.doc_type}:{self.object_id} {self.title}"
+
+
+class ArchivedRecord(models.Model):
+    """
+    A closed row moved out of its hot table.
+
+    ``payload`` is the zlib-compressed JSON the row's API serializer produced
+    at archive time, so archived rows can be returned in the same shape as
+    live ones.
+    """
+    model_name = models.CharField(max_length=30)
+    original_id = models.BigIntegerField()
+    plant = models.ForeignKey('users.Plant', on_delete=models.PROTECT, default=default_plant_id, related_name='+')
+    record_date = models.DateField()
+    payload = models.BinaryField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model_name', 'original_id'], name='unique_archived_record'),
+        ]
+        indexes = [
+            models.Index(fields=['model_name', '-record_date'], name='archive_date_idx'),
+            models.Index(fields=['model_name', 'plant', '-record_date', '-original_id'], name='archive_plant_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name}:{self.original_id} (archived)"
+
+
+class CacheGeneration(models.Model):
+    """
+    Version counter per model for the API response cache.
+
+    Cached responses embed the generations of the models they were built
+    from; bumping a counter makes every such entry unreachable. Kept in the
+    database so every web and worker process sees the same counters.
+    """
+    model = models.CharField(max_length=100, primary_key=True)
+    generation = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.model}@{self.generation}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    First response to a request sent with an ``Idempotency-Key`` header.
+
+    ``scope`` is the requesting user's id, so keys only collide within one
+    user. A row is ``pending`` while the original request runs and
+    ``completed`` once its response is stored for replay.
+    """
+    STATE_CHOICES = (
+        ('pending', 'Pending'),
+        ('completed', 'Completed'),
+    )
+
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default='pending')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.state})"
+
+
+class ReportArtifact(models.Model):
+    """
+    A generated periodic report file, stored under ``REPORTS_DIR``.
+
+    One row per (kind, period, start, parameters, format). ``data_hash`` is
+    the hash of the figures the file was rendered from, so it is only
+    re-rendered when they change; ``content_hash`` is the hash of the file
+    itself and part of its name.
+    """
+    KIND_CHOICES = (
+        ('inventory', 'Inventory'),
+        ('qc', 'QC pass rate'),
+        ('gas', 'Gas cost'),
+    )
+    PERIOD_CHOICES = (
+        ('week', 'Weekly'),
+        ('month', 'Monthly'),
+    )
+    FORMAT_CHOICES = (
+        ('xlsx', 'Excel'),
+        ('pdf', 'PDF'),
+        ('csv', 'CSV'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    params = models.JSONField(default=dict, blank=True)
+    params_key = models.CharField(max_length=64)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    data_hash = models.CharField(max_length=64)
+    content_hash = models.CharField(max_length=64)
+    file = models.CharField(max_length=255)  # relative to REPORTS_DIR
+    size = models.PositiveIntegerField(default=0)
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-period_start', 'kind', 'format']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'period', 'period_start', 'params_key', 'format'],
+                                    name='unique_report_artifact'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.period} {self.period_start} ({self.format})"
+
+
+def webhook_secret():
+    return secrets.token_urlsafe(32)
+
+
+class WebhookEndpoint(models.Model):
+    """An external system notified of ``EVENT_CHOICES`` (see ``dashboard.webhooks``)."""
+    EVENT_CHOICES = (
+        ('powder.critical', 'Powder went critical'),
+        ('qc.failed', 'QC inspection failed'),
+        ('task.completed', 'Task completed'),
+    )
+
+    name = models.CharField(max_length=100)
+    url = models.URLField(max_length=500)
+    # Deliveries are signed with HMAC-SHA256 of "<timestamp>.<body>" under this key.
+    secret = models.CharField(max_length=64, default=webhook_secret)
+    events = models.JSONField(default=list, blank=True)  # empty: every event
+    plant = models.ForeignKey('users.Plant', on_delete=models.CASCADE, null=True, blank=True,
+                              related_name='webhook_endpoints')  # empty: every plant
+    is_active = models.BooleanField(default=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_success_at = models.DateTimeField(null=True, blank=True)
+    last_failure_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def wants(self, event, plant_id):
+        return (not self.events or event in self.events) and (self.plant_id is None or self.plant_id == plant_id)
+
+
+class WebhookDelivery(models.Model):
+    """
+    Outbox row: one event for one endpoint, written in the transaction of the
+    change that caused it and sent later by the delivery job.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('dead', 'Dead'),  # gave up after WEBHOOK_MAX_ATTEMPTS
+    )
+
+    endpoint = models.ForeignKey(WebhookEndpoint, on_delete=models.CASCADE, related_name='deliveries')
+    event = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # Earliest time of the next attempt; also the lease of a batch being sent.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            # Due deliveries per endpoint, oldest first.
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_due_idx'),
+            models.Index(fields=['endpoint', 'status', 'id'], name='webhook_endpoint_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} -> {self.endpoint_id} ({self.status})"
@@ -0,0 +1,54 @@
+"""
+Keyset (seek) pagination over ``(created_at, id)``.
+
+Unlike offset pagination the cost of fetching a page does not grow with how
+deep the client has scrolled: each page is a range scan that starts right
+after the last row of the previous one.
+"""
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, pk = base64.urlsafe_b64decode(padded).decode().rsplit('|', 1)
+        parsed = parse_datetime(timestamp)
+        if parsed is None:
+            raise ValueError(timestamp)
+        return parsed, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+
+
+def get_limit(request, default=50, maximum=200):
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except (TypeError, ValueError):
+        raise ValidationError({'limit': 'Must be an integer.'})
+    return max(1, min(limit, maximum))
+
+
+def keyset_page(queryset, cursor=None, limit=50, field='created_at'):
+    """
+    Return ``(rows, next_cursor)`` for a newest-first page of ``queryset``.
+
+    ``next_cursor`` is ``None`` on the last page.
+    """
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'pk__lt': pk}))
+    rows = list(queryset.order_by(f'-{field}', '-pk')[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, field), last.pk)
@@ -0,0 +1,293 @@
+"""
+On-demand request profiling.
+
+``ProfilingMiddleware`` profiles a request when an admin sends
+``X-Profile: 1`` or, at random, ``PROFILING_SAMPLE_RATE`` of all requests.
+``PROFILING_MODE`` picks the profiler: ``cprofile`` (deterministic, every
+call) or ``sample`` (a thread records the request thread's stack every
+``PROFILING_SAMPLE_INTERVAL`` seconds, cheap enough for production). SQL
+statements and their timings are captured in both modes.
+
+Each capture is written to ``PROFILING_DIR`` as ``<id>.json`` (request,
+timings, SQL, folded stacks) plus ``<id>.prof`` (pstats) in cProfile mode;
+only the newest ``PROFILING_MAX_FILES`` captures are kept. Summarize them
+with ``manage.py profile_report``.
+
+Folded stacks of sampled captures count samples. cProfile only records
+each function's direct callers, so its folded stacks are reconstructed from
+that graph and weighted in microseconds of own time: a function's time is
+split over its callers in proportion to the time spent in it under each.
+That is exact when every function has one caller and an estimate otherwise.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE'
+# Longest stack rebuilt from cProfile's caller graph.
+MAX_STACK_DEPTH = 64
+# cProfile can't run in two threads at once, and one profiled request at a
+# time keeps the overhead bounded; others run unprofiled meanwhile.
+_busy = threading.Lock()
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', code.co_filename)}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def fold(frame):
+    """Root-first ``a;b;c`` stack string, as used by flamegraph tools."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Counts the folded stacks of one thread, sampled at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[fold(frame)] += 1
+
+
+class QueryTimer:
+    """``connection.execute_wrapper`` hook recording each statement's duration."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({'sql': sql, 'time': round(time.perf_counter() - start, 6), 'many': many})
+
+
+def _is_admin(request):
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except Exception:
+        return False
+    return result is not None and getattr(result[0], 'role', None) == 'admin'
+
+
+def _rotate(directory, keep):
+    captures = sorted(directory.glob('*.json'))
+    for old in captures[:max(len(captures) - keep, 0)]:
+        old.unlink(missing_ok=True)
+        old.with_suffix('.prof').unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = Path(settings.PROFILING_DIR)
+
+    def __call__(self, request):
+        requested = request.META.get(HEADER) == '1' and _is_admin(request)
+        sampled = settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+        if not (requested or sampled) or not _busy.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request, 'header' if requested else 'sample-rate')
+        finally:
+            _busy.release()
+
+    def _profile(self, request, trigger):
+        mode = settings.PROFILING_MODE
+        timer = QueryTimer()
+        profiler = sampler = None
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+        else:
+            sampler = StackSampler(threading.get_ident(), settings.PROFILING_SAMPLE_INTERVAL)
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            if profiler:
+                profiler.enable()
+            else:
+                sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+                else:
+                    sampler.stop()
+        duration = time.perf_counter() - start
+
+        # Sortable by time, which is what rotation relies on.
+        capture_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+        match = getattr(request, 'resolver_match', None)
+        capture = {
+            'id': capture_id,
+            'mode': mode,
+            'trigger': trigger,
+            'method': request.method,
+            'path': request.path,
+            'endpoint': f"{request.method} {match.view_name if match else request.path}",
+            'status': response.status_code,
+            'duration': round(duration, 6),
+            'sql_time': round(sum(q['time'] for q in timer.queries), 6),
+            'queries': timer.queries,
+            'folded': dict(sampler.stacks) if sampler else {},
+        }
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if profiler:
+                profiler.dump_stats(self.directory / f'{capture_id}.prof')
+            (self.directory / f'{capture_id}.json').write_text(json.dumps(capture))
+            _rotate(self.directory, settings.PROFILING_MAX_FILES)
+        except OSError:
+            logger.exception("Could not write profile %s", capture_id)
+        else:
+            response['X-Profile-Id'] = capture_id
+        return response
+
+
+def load_captures(directory, endpoint=None):
+    """Captures in ``directory``, oldest first, optionally only endpoints containing ``endpoint``."""
+    captures = []
+    for path in sorted(Path(directory).glob('*.json')):
+        try:
+            capture = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if endpoint and endpoint not in capture['endpoint']:
+            continue
+        prof = path.with_suffix('.prof')
+        capture['prof'] = str(prof) if prof.exists() else None
+        captures.append(capture)
+    return captures
+
+
+def _label(func):
+    filename, line, name = func
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def _hot_from_stats(stats, top):
+    rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    return [
+        {'function': _label(func), 'calls': nc, 'self': round(tt, 6), 'cumulative': round(ct, 6)}
+        for func, (cc, nc, tt, ct, callers) in rows
+    ]
+
+
+def _folded_from_stats(stats):
+    """Folded stacks (microseconds of own time) rebuilt from pstats' caller graph; see the module docstring."""
+    folded = Counter()
+
+    def climb(path, weight):
+        callers = stats[path[-1]][4] if path[-1] in stats else {}
+        # Per caller: (calls, primitive calls, own time, time in this function under that caller).
+        under = {caller: entry[3] for caller, entry in callers.items() if entry[3] > 0}
+        total = sum(under.values())
+        rest = weight
+        if total > 0 and len(path) < MAX_STACK_DEPTH:
+            for caller, time_under in under.items():
+                if caller in path:
+                    continue  # recursion: the outer call already carries this time
+                share = weight * time_under / total
+                if share >= 1:
+                    climb(path + (caller,), share)
+                    rest -= share
+        if rest >= 1:
+            folded[';'.join(_label(func) for func in reversed(path))] += round(rest)
+
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        climb((func,), tt * 1e6)
+    return folded
+
+
+def _hot_from_samples(folded, top):
+    total = sum(folded.values()) or 1
+    own, inclusive = Counter(), Counter()
+    for stack, count in folded.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    return [
+        {'function': name, 'samples': count, 'self': round(count / total, 4),
+         'cumulative': round(inclusive[name] / total, 4)}
+        for name, count in own.most_common(top)
+    ]
+
+
+def aggregate(captures, top=15):
+    """Per-endpoint summary: timings, slowest SQL, hot functions and merged folded stacks."""
+    by_endpoint = {}
+    for capture in captures:
+        by_endpoint.setdefault(capture['endpoint'], []).append(capture)
+
+    report = []
+    for endpoint, group in by_endpoint.items():
+        sql = {}
+        folded = Counter()
+        for capture in group:
+            folded.update(capture['folded'])
+            for query in capture['queries']:
+                entry = sql.setdefault(query['sql'], {'sql': query['sql'], 'count': 0, 'time': 0.0})
+                entry['count'] += 1
+                entry['time'] += query['time']
+        profs = [c['prof'] for c in group if c['prof']]
+        if profs:
+            stats = pstats.Stats(*profs).stats
+            hot = _hot_from_stats(stats, top)
+            folded = _folded_from_stats(stats)
+        else:
+            hot = _hot_from_samples(folded, top)
+        durations = [c['duration'] for c in group]
+        report.append({
+            'endpoint': endpoint,
+            'captures': len(group),
+            'avg_duration': sum(durations) / len(durations),
+            'max_duration': max(durations),
+            'avg_sql_time': sum(c['sql_time'] for c in group) / len(group),
+            'avg_queries': sum(len(c['queries']) for c in group) / len(group),
+            'slowest_sql': sorted(sql.values(), key=lambda q: q['time'], reverse=True)[:top],
+            'hot_functions': hot,
+            'folded': folded,
+        })
+    return sorted(report, key=lambda r: r['avg_duration'] * r['captures'], reverse=True)
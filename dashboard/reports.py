@@ -0,0 +1,358 @@
+"""
+Periodic reports (inventory, QC pass rate, gas cost) rendered to files.
+
+A report is identified by kind, period (``week`` starting Monday or
+``month``), period start, parameters and format. ``generate()`` first runs
+the report's aggregate queries and hashes the resulting figures; the file
+is only rendered (the slow part) when no artifact exists yet or that hash
+changed, i.e. when the period's data did. Files are written under
+``REPORTS_DIR`` with their content hash in the name and recorded as
+``ReportArtifact`` rows, so a download is a static file that never changes
+under the same name.
+
+``generate_due()`` (the ``reports.generate_due`` job and
+``manage.py generate_reports``) rechecks the last ``REPORTS_LOOKBACK``
+complete weeks and months; older periods are left alone so archiving old
+rows does not rewrite historical reports. XLSX needs ``openpyxl`` and PDF
+``reportlab``; CSV is always available.
+"""
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import Lag
+from django.utils import timezone
+
+from . import jobs, valuation
+from .models import GasReading, GasRecord, QCReport, ReportArtifact, StockMovement
+
+logger = logging.getLogger(__name__)
+
+GENERATE_JOB = 'reports.generate'
+GENERATE_DUE_JOB = 'reports.generate_due'
+# Bump when a builder or renderer changes, to re-render existing reports.
+RENDER_VERSION = 1
+
+
+class ReportError(Exception):
+    """A report that cannot be generated (bad parameters or missing renderer)."""
+
+
+def period_bounds(period, day):
+    """(start, end) dates of the ``period`` containing ``day``; ``end`` is exclusive."""
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if period == 'month':
+        start = day.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    raise ReportError(f"Unknown period '{period}'.")
+
+
+def _moment(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _number(value, places=3):
+    return round(float(value or 0), places)
+
+
+# ── Builders: (start, end, **params) -> figures ──
+
+def build_inventory(start, end):
+    """Opening and closing stock per SKU with the period's receipts, consumption and adjustments."""
+    before_start = _moment(start) - timedelta(microseconds=1)
+    before_end = _moment(end) - timedelta(microseconds=1)
+    opening = {row['id']: row for row in valuation.as_of(before_start)}
+    flows = {
+        row['powder']: row for row in
+        StockMovement.objects.filter(created_at__gte=_moment(start), created_at__lt=_moment(end))
+        .values('powder')
+        .annotate(
+            received=Sum('quantity', filter=Q(kind='receive')),
+            consumed=Sum('quantity', filter=Q(kind='consume')),
+            adjusted=Sum('quantity', filter=Q(kind='adjust')),
+        )
+    }
+    rows = []
+    for row in valuation.as_of(before_end):
+        flow = flows.get(row['id'], {})
+        rows.append([
+            row['sku'], row['name'],
+            _number(opening[row['id']]['valued_quantity']),
+            _number(flow.get('received')),
+            _number(-(flow.get('consumed') or 0)),
+            _number(flow.get('adjusted')),
+            _number(row['valued_quantity']),
+            _number(row['value'], 2),
+        ])
+    return {
+        'title': 'Inventory',
+        'columns': ['SKU', 'Powder', 'Opening kg', 'Received kg', 'Consumed kg', 'Adjusted kg', 'Closing kg',
+                    'Closing value'],
+        'rows': rows,
+        'totals': ['Total', ''] + [round(sum(r[i] for r in rows), 3) for i in range(2, 8)],
+    }
+
+
+def build_qc(start, end, powder=None):
+    """Inspections and pass rate per powder type; ``powder`` limits it to one type."""
+    reports = QCReport.objects.filter(date__gte=start, date__lt=end)
+    if powder:
+        reports = reports.filter(powder_type=powder)
+    groups = (
+        reports.values('powder_type')
+        .annotate(total=Count('id'), passed=Count('id', filter=Q(result='Pass')))
+        .order_by('powder_type')
+    )
+    rows = [
+        [g['powder_type'] or '—', g['total'], g['passed'], g['total'] - g['passed'], round(g['passed'] / g['total'], 4)]
+        for g in groups
+    ]
+    total = sum(r[1] for r in rows)
+    passed = sum(r[2] for r in rows)
+    return {
+        'title': 'QC pass rate',
+        'columns': ['Powder', 'Inspections', 'Passed', 'Failed', 'Pass rate'],
+        'rows': rows,
+        'totals': ['Total', total, passed, total - passed, round(passed / total, 4) if total else None],
+    }
+
+
+def build_gas(start, end, type=None):
+    """Consumption (sum of level drops between readings) and refill cost per gas type."""
+    tanks = GasRecord.objects.all()
+    if type:
+        tanks = tanks.filter(type=type)
+    refills = {
+        row['type']: row for row in
+        tanks.filter(refill_date__gte=start, refill_date__lt=end)
+        .values('type').annotate(refills=Count('id'), cost=Sum('cost'))
+    }
+    tank_counts = dict(tanks.values('type').annotate(n=Count('id')).values_list('type', 'n'))
+
+    consumed = {}
+    readings = (
+        GasReading.objects.filter(tank__in=tanks, recorded_at__lt=_moment(end))
+        .annotate(previous=Window(Lag('level'), partition_by=[F('tank_id')], order_by=[F('recorded_at'), F('id')]))
+        .values_list('tank__type', 'recorded_at', 'level', 'previous')
+    )
+    for gas_type, recorded_at, level, previous in readings:
+        if recorded_at >= _moment(start) and previous is not None and previous > level:
+            consumed[gas_type] = consumed.get(gas_type, 0.0) + previous - level
+
+    rows = [
+        [gas_type, tank_counts.get(gas_type, 0), _number(consumed.get(gas_type)),
+         refills.get(gas_type, {}).get('refills', 0), _number(refills.get(gas_type, {}).get('cost'), 2)]
+        for gas_type in sorted(set(tank_counts) | set(refills))
+    ]
+    return {
+        'title': 'Gas consumption and cost',
+        'columns': ['Gas', 'Tanks', 'Consumed', 'Refills', 'Refill cost'],
+        'rows': rows,
+        'totals': ['Total'] + [round(sum(r[i] for r in rows), 3) for i in range(1, 5)],
+    }
+
+
+BUILDERS = {
+    'inventory': (build_inventory, ()),
+    'qc': (build_qc, ('powder',)),
+    'gas': (build_gas, ('type',)),
+}
+
+
+# ── Renderers: figures -> bytes ──
+
+def _heading(data, period, start, end):
+    return f"{data['title']} — {period}ly report, {start:%d %b %Y} to {end - timedelta(days=1):%d %b %Y}"
+
+
+def render_csv(data, heading):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([heading])
+    writer.writerow(data['columns'])
+    writer.writerows(data['rows'])
+    writer.writerow(data['totals'])
+    return buffer.getvalue().encode('utf-8')
+
+
+def render_xlsx(data, heading):
+    try:
+        from openpyxl import Workbook
+        from openpyxl.styles import Font
+    except ImportError:
+        raise ReportError("XLSX reports need openpyxl (pip install openpyxl).")
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = data['title'][:31]
+    sheet.append([heading])
+    sheet['A1'].font = Font(bold=True, size=13)
+    sheet.append([])
+    sheet.append(data['columns'])
+    for row in data['rows']:
+        sheet.append(row)
+    sheet.append(data['totals'])
+    for cell in sheet[3] + sheet[sheet.max_row]:
+        cell.font = Font(bold=True)
+    for index, column in enumerate(data['columns'], start=1):
+        width = max([len(str(column))] + [len(str(row[index - 1])) for row in data['rows']])
+        sheet.column_dimensions[sheet.cell(row=3, column=index).column_letter].width = min(width + 2, 40)
+    sheet.freeze_panes = 'A4'
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def render_pdf(data, heading):
+    try:
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    except ImportError:
+        raise ReportError("PDF reports need reportlab (pip install reportlab).")
+    buffer = io.BytesIO()
+    document = SimpleDocTemplate(buffer, pagesize=landscape(A4), title=heading, invariant=True)
+    rows = [data['columns']] + data['rows'] + [data['totals']]
+    table = Table([['' if value is None else value for value in row] for row in rows], repeatRows=1)
+    table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E8771A')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.lightgrey),
+        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+    ]))
+    document.build([Paragraph(heading, getSampleStyleSheet()['Title']), Spacer(1, 12), table])
+    return buffer.getvalue()
+
+
+RENDERERS = {'csv': render_csv, 'xlsx': render_xlsx, 'pdf': render_pdf}
+
+
+# ── Artifacts ──
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def clean_params(kind, params):
+    if kind not in BUILDERS:
+        raise ReportError(f"Unknown report '{kind}'.")
+    allowed = BUILDERS[kind][1]
+    unknown = set(params) - set(allowed)
+    if unknown:
+        raise ReportError(f"Unknown parameters for {kind}: {', '.join(sorted(unknown))}.")
+    return {key: str(value) for key, value in params.items() if value not in (None, '')}
+
+
+def path_for(artifact):
+    return Path(settings.REPORTS_DIR) / artifact.file
+
+
+def _write(relative, content):
+    path = Path(settings.REPORTS_DIR) / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + '.tmp')
+    temporary.write_bytes(content)
+    os.replace(temporary, path)
+
+
+def generate(kind, period, day, fmt, params=None, *, force=False):
+    """
+    Render the report for the period containing ``day`` unless an artifact
+    built from the same figures exists. Returns (artifact, rendered).
+    """
+    if fmt not in RENDERERS:
+        raise ReportError(f"Unknown format '{fmt}'.")
+    params = clean_params(kind, params or {})
+    start, end = period_bounds(period, day)
+    data = BUILDERS[kind][0](start, end, **params)
+    data_hash = _digest([RENDER_VERSION, fmt, data])
+    params_key = _digest(params)
+
+    lookup = {'kind': kind, 'period': period, 'period_start': start, 'params_key': params_key, 'format': fmt}
+    existing = ReportArtifact.objects.filter(**lookup).first()
+    if existing and existing.data_hash == data_hash and path_for(existing).exists() and not force:
+        return existing, False
+
+    content = RENDERERS[fmt](data, _heading(data, period, start, end))
+    content_hash = hashlib.sha256(content).hexdigest()
+    suffix = f"-{params_key[:8]}" if params else ''
+    relative = f"{kind}/{kind}-{period}-{start:%Y-%m-%d}{suffix}-{content_hash[:12]}.{fmt}"
+    _write(relative, content)
+
+    artifact, _ = ReportArtifact.objects.update_or_create(**lookup, defaults={
+        'params': params, 'data_hash': data_hash, 'content_hash': content_hash,
+        'file': relative, 'size': len(content), 'generated_at': timezone.now(),
+    })
+    if existing and existing.file != relative:
+        (Path(settings.REPORTS_DIR) / existing.file).unlink(missing_ok=True)
+    return artifact, True
+
+
+def due_periods(period, lookback, today=None):
+    """Start days of the last ``lookback`` complete periods, newest first."""
+    start, _ = period_bounds(period, today or timezone.localdate())
+    days = []
+    for _ in range(lookback):
+        start, _ = period_bounds(period, start - timedelta(days=1))
+        days.append(start)
+    return days
+
+
+def generate_due(kinds=None, periods=None, formats=None, lookback=None, today=None):
+    """
+    Bring the reports of recent complete periods up to date. Returns counts.
+
+    A report that fails (e.g. a missing renderer) is logged and counted; the
+    others are still generated.
+    """
+    counts = {'rendered': 0, 'unchanged': 0, 'failed': 0}
+    lookback = lookback if lookback is not None else settings.REPORTS_LOOKBACK
+    for period in periods or [p for p, _ in ReportArtifact.PERIOD_CHOICES]:
+        for day in due_periods(period, lookback, today):
+            for kind in kinds or list(BUILDERS):
+                for fmt in formats or settings.REPORTS_FORMATS:
+                    try:
+                        _, rendered = generate(kind, period, day, fmt)
+                    except Exception:
+                        logger.exception("Report %s/%s %s (%s) failed", kind, period, day, fmt)
+                        counts['failed'] += 1
+                        continue
+                    counts['rendered' if rendered else 'unchanged'] += 1
+    return counts
+
+
+@jobs.register(GENERATE_JOB)
+def generate_job(job):
+    payload = job.payload
+    artifact, rendered = generate(
+        payload['kind'], payload['period'], date.fromisoformat(payload['day']), payload['format'],
+        payload.get('params'), force=payload.get('force', False),
+    )
+    return {'artifact': artifact.pk, 'rendered': rendered}
+
+
+@jobs.register(GENERATE_DUE_JOB)
+def generate_due_job(job):
+    try:
+        return generate_due()
+    finally:
+        # Even a failed run keeps the schedule going.
+        if settings.REPORTS_SCHEDULE_INTERVAL > 0:
+            schedule()
+
+
+def schedule(delay=None):
+    """Queue the next scheduled ``generate_due`` run (once)."""
+    delay = delay if delay is not None else settings.REPORTS_SCHEDULE_INTERVAL
+    return jobs.enqueue(GENERATE_DUE_JOB, unique=True, delay=delay)
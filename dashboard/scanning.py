@@ -0,0 +1,283 @@
+"""
+Barcode scans.
+
+Stickers carry a Code 128 barcode of the lot code (or the SKU when no lot is
+printed). ``resolve()`` maps a scanned code to its powder and lot through a
+per-process LRU of ``SCAN_CACHE_SIZE`` codes, so a station scanning the same
+labels over and over does not repeat the lot/SKU lookups. Entries only hold
+ids; every batch re-reads the rows it touches in one query and drops entries
+whose row is gone or no longer carries the code, so a rename or delete made by
+another process heals on the next scan instead of waiting for an expiry.
+
+Scanners post their events to ``POST /api/scan/`` as NDJSON, one per line::
+
+    {"code": "L-2024-118", "action": "consume", "quantity": 2.5, "location": 3, "id": "st4-00918"}
+
+``action`` is ``lookup`` (the default), ``consume`` or ``receive``. The
+movements of a batch are applied in order within one transaction, each in its
+own savepoint: a scan that cannot be applied (unknown code, not enough stock)
+is reported on its result line and the rest of the batch still commits.
+"""
+import json
+import threading
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from . import stock
+from .models import Location, Lot, Powder
+
+ACTIONS = ('lookup', 'consume', 'receive')
+
+
+class ScanError(Exception):
+    """A scan event that cannot be applied."""
+
+
+# ── Code cache ──
+
+class _LRU:
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.SCAN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_code(self, code):
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == code]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_codes = _LRU()
+
+
+def stats():
+    lookups = _codes.hits + _codes.misses
+    return {
+        'size': len(_codes), 'max_size': settings.SCAN_CACHE_SIZE, 'hits': _codes.hits, 'misses': _codes.misses,
+        'hit_rate': round(_codes.hits / lookups, 4) if lookups else None,
+    }
+
+
+def clear():
+    _codes.clear()
+
+
+def _lookup(codes, plant):
+    """
+    Resolve uncached ``codes`` in two queries: lot codes, then SKUs. Both
+    are unique per plant and ambiguous across plants without one.
+    Returns {code: (powder_id, lot_id)}.
+    """
+    found, shared = {}, set()
+    lots = Lot.objects.filter(code__in=codes)
+    if plant is not None:
+        lots = lots.filter(plant_id=plant)
+    for code, lot_id, powder_id in lots.values_list('code', 'pk', 'powder_id'):
+        if code in found:
+            shared.add(code)
+        found[code] = (powder_id, lot_id)
+    for code in shared:
+        del found[code]
+
+    rest = [code for code in codes if code not in found and code not in shared]
+    if rest:
+        powders = Powder.objects.filter(sku__in=rest)
+        if plant is not None:
+            powders = powders.filter(plant_id=plant)
+        matches = {}
+        for sku, powder_id in powders.values_list('sku', 'pk'):
+            matches.setdefault(sku, []).append(powder_id)
+        for sku, ids in matches.items():
+            if len(ids) == 1:
+                found[sku] = (ids[0], None)
+    return found
+
+
+def _resolve_ids(codes, plant):
+    """{code: (powder_id, lot_id)} for the known ``codes``, from the cache where possible."""
+    resolved, missing = {}, []
+    for code in codes:
+        entry = _codes.get((plant, code))
+        if entry is None:
+            missing.append(code)
+        else:
+            resolved[code] = entry
+    if missing:
+        for code, entry in _lookup(missing, plant).items():
+            _codes.put((plant, code), entry)
+            resolved[code] = entry
+    return resolved
+
+
+def resolve_many(codes, plant=None):
+    """
+    Resolve scanned ``codes`` within ``plant`` (an id, or None for all).
+    Returns {code: (powder, lot)} for the known ones; the powders and lots are
+    read fresh, in one query each.
+    """
+    codes = {code for code in codes if code}
+    result = {}
+    for _ in range(2):
+        resolved = _resolve_ids(codes, plant)
+        powders = Powder.objects.in_bulk({p for p, _ in resolved.values()})
+        lots = Lot.objects.in_bulk({lot for _, lot in resolved.values() if lot is not None})
+        stale = set()
+        for code, (powder_id, lot_id) in resolved.items():
+            powder, lot = powders.get(powder_id), lots.get(lot_id)
+            if lot_id is None:
+                current = powder is not None and powder.sku == code
+            else:
+                current = powder is not None and lot is not None and lot.code == code and lot.powder_id == powder_id
+            if current:
+                result[code] = (powder, lot)
+            else:
+                stale.add(code)
+                _codes.discard((plant, code))
+        if not stale:
+            break
+        # Entries cached before a rename or delete: look those codes up again.
+        codes = stale
+    return result
+
+
+def resolve(code, plant=None):
+    """The (powder, lot) a scanned ``code`` points to, or None."""
+    code = (code or '').strip()
+    return resolve_many([code], plant).get(code)
+
+
+# ── Batches ──
+
+class NDJSONParser(BaseParser):
+    """Newline-delimited JSON: one object per line, blank lines ignored."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        events = []
+        for number, line in enumerate(stream.read().decode(encoding).splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                events.append(json.loads(line))
+            except ValueError as e:
+                raise ParseError(f'Line {number}: {e}')
+        return events
+
+
+def _quantity(value):
+    try:
+        quantity = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise ScanError('quantity must be a number.')
+    if not quantity.is_finite() or quantity <= 0:
+        raise ScanError('quantity must be positive.')
+    return quantity
+
+
+def parse_events(payload):
+    """Validate a batch: a list of events, or {"events": [...]}. Raises ScanError."""
+    events = payload.get('events') if isinstance(payload, dict) else payload
+    if not isinstance(events, list) or not events:
+        raise ScanError('Send one or more scan events.')
+    if len(events) > settings.SCAN_BATCH_MAX:
+        raise ScanError(f'At most {settings.SCAN_BATCH_MAX} events per batch.')
+    for event in events:
+        if not isinstance(event, dict):
+            raise ScanError('Every event must be an object.')
+    return events
+
+
+def _result(index, event):
+    result = {'index': index, 'status': 'ok'}
+    if 'id' in event:
+        result['id'] = event['id']
+    return result
+
+
+def apply(events, *, plant=None, user=None):
+    """
+    Apply parsed scan ``events`` for ``plant`` (an id, or None for all)
+    and return one result per event, in order. ``lookup`` results carry the
+    stock as of the end of the batch.
+    """
+    codes = [str(e.get('code') or '').strip() for e in events]
+    resolved = resolve_many(codes, plant)
+    locations = Location.objects.in_bulk({e['location'] for e in events if isinstance(e.get('location'), int)})
+
+    results = []
+    with transaction.atomic():
+        for index, (event, code) in enumerate(zip(events, codes)):
+            result = _result(index, event)
+            results.append(result)
+            try:
+                action = event.get('action', 'lookup')
+                if action not in ACTIONS:
+                    raise ScanError(f"action must be one of {', '.join(ACTIONS)}.")
+                if code not in resolved:
+                    raise ScanError(f"Unknown code {code!r}." if code else 'code is required.')
+                powder, lot = resolved[code]
+                result.update(code=code, powder=powder.pk, sku=powder.sku, lot=lot.code if lot else None)
+                if action == 'lookup':
+                    continue
+
+                quantity = _quantity(event.get('quantity'))
+                location = None
+                if event.get('location') is not None:
+                    location = locations.get(event['location'])
+                    if location is None:
+                        raise ScanError('Unknown location.')
+                station = str(event.get('station') or '').strip()
+                movement = stock.move(
+                    powder, quantity if action == 'receive' else -quantity, action,
+                    location=location, lot=lot, user=user,
+                    note=f'Scan at {station}'[:200] if station else 'Scan',
+                )
+                result['movement'] = movement.pk
+            except (ScanError, stock.StockError) as e:
+                result.update(status='error', detail=str(e))
+
+    stocks = dict(Powder.objects.filter(pk__in={r['powder'] for r in results if 'powder' in r})
+                  .values_list('pk', 'current_stock'))
+    for event, result in zip(events, results):
+        if result['status'] == 'ok' and event.get('action', 'lookup') == 'lookup':
+            result['current_stock'] = stocks.get(result['powder'])
+    return results
+
+
+def forget(sender, instance, **kwargs):
+    """Drop this process's cached entries for the code of a saved or deleted powder or lot."""
+    _codes.discard_code(instance.code if sender is Lot else instance.sku)
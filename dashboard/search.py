@@ -0,0 +1,149 @@
+"""
+Full-text search across powders, tasks and QC reports.
+
+Each searchable row is mirrored into ``SearchDocument`` on save/delete (see
+``dashboard.signals``). Queries go straight to the backend's native index:
+FTS5 with bm25 ranking on SQLite, ``tsvector`` + GIN with ``ts_rank`` on
+Postgres.
+"""
+import re
+
+from django.db import connection
+
+from .models import Powder, Task, QCReport, SearchDocument
+
+
+def _powder_document(powder):
+    return f"{powder.name} ({powder.sku})", ' '.join([powder.sku, powder.name, powder.location, powder.color])
+
+
+def _task_document(task):
+    assignee = task.assignee
+    names = [assignee.username, assignee.get_full_name()] if assignee else []
+    return task.title, ' '.join([task.description, *names, task.get_status_display(), task.priority])
+
+
+def _qc_document(report):
+    return (
+        f"QC {report.batch_id} - {report.result}",
+        ' '.join([report.batch_id, report.powder_type, report.inspector, report.visual, report.notes]),
+    )
+
+
+# model -> (doc_type, function returning (title, body))
+SEARCHABLE = {
+    Powder: ('powder', _powder_document),
+    Task: ('task', _task_document),
+    QCReport: ('qcreport', _qc_document),
+}
+DOC_TYPES = [doc_type for doc_type, _ in SEARCHABLE.values()]
+
+
+def build_document(instance):
+    doc_type, builder = SEARCHABLE[type(instance)]
+    title, body = builder(instance)
+    return SearchDocument(doc_type=doc_type, object_id=instance.pk, plant_id=instance.plant_id, title=title[:255],
+                          body=body)
+
+
+def index_instance(instance):
+    doc = build_document(instance)
+    SearchDocument.objects.update_or_create(
+        doc_type=doc.doc_type, object_id=doc.object_id,
+        defaults={'plant_id': doc.plant_id, 'title': doc.title, 'body': doc.body},
+    )
+
+
+def unindex_instance(instance):
+    doc_type, _ = SEARCHABLE[type(instance)]
+    SearchDocument.objects.filter(doc_type=doc_type, object_id=instance.pk).delete()
+
+
+def purge_orphans(model):
+    """Drop documents whose source rows were removed without signals (bulk/raw deletes)."""
+    doc_type, _ = SEARCHABLE[model]
+    return SearchDocument.objects.filter(doc_type=doc_type).exclude(
+        object_id__in=model.objects.values('pk')
+    ).delete()[0]
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:10]
+
+
+def search(query, doc_types=None, limit=20, plant=None):
+    """Return up to ``limit`` ranked hits as dicts (best match first), of ``plant`` only if given."""
+    terms = _terms(query)
+    if not terms:
+        return []
+    doc_types = [t for t in (doc_types or DOC_TYPES) if t in DOC_TYPES]
+    if not doc_types:
+        return []
+
+    if connection.vendor == 'sqlite':
+        rows = _search_sqlite(terms, doc_types, limit, plant)
+    elif connection.vendor == 'postgresql':
+        rows = _search_postgres(terms, doc_types, limit, plant)
+    else:
+        rows = _search_fallback(terms, doc_types, limit, plant)
+
+    return [
+        {'type': doc_type, 'id': object_id, 'title': title, 'snippet': snippet, 'rank': round(float(rank), 4)}
+        for doc_type, object_id, title, snippet, rank in rows
+    ]
+
+
+def _plant_clause(plant):
+    return ('AND d.plant_id = %s', [plant]) if plant is not None else ('', [])
+
+
+def _search_sqlite(terms, doc_types, limit, plant):
+    # Every term must match; the last one as a prefix so partial batch IDs work.
+    match = ' '.join(f'"{t}"' for t in terms[:-1]) + f' "{terms[-1]}"*'
+    placeholders = ', '.join(['%s'] * len(doc_types))
+    in_plant, plant_params = _plant_clause(plant)
+    sql = f"""
+        SELECT d.doc_type, d.object_id, d.title,
+               snippet(dashboard_searchdocument_fts, 1, '', '', '…', 12),
+               -bm25(dashboard_searchdocument_fts, 10.0, 1.0) AS rank
+        FROM dashboard_searchdocument_fts
+        JOIN dashboard_searchdocument d ON d.id = dashboard_searchdocument_fts.rowid
+        WHERE dashboard_searchdocument_fts MATCH %s AND d.doc_type IN ({placeholders}) {in_plant}
+        ORDER BY rank DESC
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, *doc_types, *plant_params, limit])
+        return cursor.fetchall()
+
+
+def _search_postgres(terms, doc_types, limit, plant):
+    tsquery = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+    in_plant, plant_params = _plant_clause(plant)
+    # Rank and limit first so ts_headline only runs on the rows returned.
+    sql = f"""
+        SELECT hit.doc_type, hit.object_id, hit.title,
+               ts_headline('simple', hit.body, to_tsquery('simple', %s),
+                           'StartSel="", StopSel="", MaxWords=20, MinWords=5'),
+               hit.rank
+        FROM (
+            SELECT d.doc_type, d.object_id, d.title, d.body, ts_rank(d.search_vector, q) AS rank
+            FROM dashboard_searchdocument d, to_tsquery('simple', %s) q
+            WHERE d.search_vector @@ q AND d.doc_type = ANY(%s) {in_plant}
+            ORDER BY rank DESC
+            LIMIT %s
+        ) hit
+        ORDER BY hit.rank DESC
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tsquery, tsquery, list(doc_types), *plant_params, limit])
+        return cursor.fetchall()
+
+
+def _search_fallback(terms, doc_types, limit, plant):
+    qs = SearchDocument.objects.filter(doc_type__in=doc_types)
+    if plant is not None:
+        qs = qs.filter(plant_id=plant)
+    for term in terms:
+        qs = qs.filter(body__icontains=term) | qs.filter(title__icontains=term)
+    return [(d.doc_type, d.object_id, d.title, d.body[:120], 0) for d in qs[:limit]]
@@ -1,23 +1,78 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Powder, Task, QCReport, GasRecord
+from django.db.models import Q
+
+from users.models import Plant
+from users.permissions import plant_scope, write_plant
+
+from .models import (
+    Powder, Task, QCReport, GasRecord, Job, ActivityEvent, Location, StockLevel, StockMovement,
+    Lot, StickerPrint, GasReading, GasForecast, CycleCount, ReportArtifact, WebhookEndpoint, WebhookDelivery
+)
 
 User = get_user_model()
 
 
+class CurrentPlantDefault:
+    """The plant new rows of the request belong to (``users.permissions.write_plant``)."""
+    requires_context = True
+
+    def __call__(self, serializer_field):
+        return write_plant(serializer_field.context['request'])
+
+
+class PlantSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Plant
+        fields = ('id', 'code', 'name')
+
+
 class UserSerializer(serializers.ModelSerializer):
+    plant = serializers.SlugRelatedField(slug_field='code', read_only=True)
+
     class Meta:
         model = User
-        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'role')
+        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'role', 'plant')
         read_only_fields = ('id',)
 
 
+def stamp_claims(token, user):
+    """Add the role and plant claims that token-only endpoints (viewer snapshots) read."""
+    token['role'] = user.role
+    token['plant'] = user.plant.code if user.plant_id else None
+    return token
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return stamp_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refreshed tokens pick up role and plant changes made since login."""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        user = get_user_model().objects.select_related('plant').get(pk=access[jwt_settings.USER_ID_CLAIM])
+        data['access'] = str(stamp_claims(access, user))
+        if 'refresh' in data:
+            data['refresh'] = str(stamp_claims(RefreshToken(data['refresh']), user))
+        return data
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=6)
+    plant = serializers.SlugRelatedField(slug_field='code', queryset=Plant.objects.all(), required=False)
 
     class Meta:
         model = User
-        fields = ('username', 'email', 'password', 'first_name', 'last_name', 'role')
+        fields = ('username', 'email', 'password', 'first_name', 'last_name', 'role', 'plant')
         extra_kwargs = {
             'role': {'required': False},
             'first_name': {'required': False},
@@ -34,20 +89,61 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 class PowderSerializer(serializers.ModelSerializer):
     status = serializers.ReadOnlyField()
+    current_stock = serializers.DecimalField(max_digits=12, decimal_places=3, coerce_to_string=False, required=False)
+    # From Powder.objects.with_metrics(); left out of responses for unannotated instances.
+    latest_qc_result = serializers.CharField(read_only=True)
+    latest_qc_date = serializers.DateField(read_only=True)
+    qc_pass_rate = serializers.FloatField(read_only=True)
+    qc_count = serializers.IntegerField(read_only=True)
+    last_movement_at = serializers.DateTimeField(read_only=True)
+    stock_value = serializers.DecimalField(max_digits=16, decimal_places=2, coerce_to_string=False, read_only=True)
+    # Set by the view; the default lets the (plant, sku) uniqueness validator run.
+    plant = serializers.PrimaryKeyRelatedField(read_only=True, default=CurrentPlantDefault())
 
     class Meta:
         model = Powder
         fields = '__all__'
 
+    def update(self, instance, validated_data):
+        # Only the edited columns are written: current_stock moves with F()
+        # updates (dashboard.stock), which a full-row save would overwrite.
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+
+class AssigneeField(serializers.SlugRelatedField):
+    """An active user, by username: an admin or a user of the task's plant."""
+
+    def __init__(self, **kwargs):
+        super().__init__(slug_field='username', queryset=User.objects.filter(is_active=True), **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        task = self.parent.instance
+        if isinstance(task, Task):
+            plant = task.plant_id
+        elif 'request' in self.context:
+            plant = write_plant(self.context['request'])
+        else:
+            return queryset
+        return queryset.filter(Q(plant_id=plant) | Q(role='admin'))
+
 
 class TaskSerializer(serializers.ModelSerializer):
+    # Addressed by username, as typed on the board.
+    assignee = AssigneeField(required=False, allow_null=True)
+
     class Meta:
         model = Task
         fields = '__all__'
-        read_only_fields = ('created_by',)
+        read_only_fields = ('plant', 'created_by')
 
 
 class QCReportSerializer(serializers.ModelSerializer):
+    plant = serializers.PrimaryKeyRelatedField(read_only=True, default=CurrentPlantDefault())
+
     class Meta:
         model = QCReport
         fields = '__all__'
@@ -58,4 +154,252 @@ class GasRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = GasRecord
         fields = '__all__'
-        read_only_fields = ('created_by',)
\ No newline at end of file
+        read_only_fields = ('plant', 'created_by')
+
+class GasReadingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GasReading
+        fields = ('id', 'tank', 'level', 'recorded_at', 'created_by')
+        read_only_fields = ('tank', 'created_by')
+        extra_kwargs = {'recorded_at': {'required': False}}
+
+    def validate_level(self, value):
+        if value < 0:
+            raise serializers.ValidationError('Must not be negative.')
+        return value
+
+class GasForecastSerializer(serializers.ModelSerializer):
+    type = serializers.CharField(source='tank.type', read_only=True)
+    capacity = serializers.FloatField(source='tank.capacity', read_only=True)
+
+    class Meta:
+        model = GasForecast
+        fields = (
+            'tank', 'type', 'capacity', 'source', 'readings', 'rate_per_day', 'rate_stderr', 'level', 'level_at',
+            'reorder_at', 'empty_at', 'empty_earliest', 'empty_latest', 'computed_at',
+        )
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = (
+            'id', 'name', 'status', 'progress', 'progress_message', 'attempts', 'max_attempts',
+            'result', 'error', 'run_after', 'created_at', 'updated_at', 'finished_at',
+        )
+        read_only_fields = fields
+
+
+class ActivityEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ActivityEvent
+        fields = ('id', 'user', 'username', 'verb', 'resource', 'object_id', 'object_repr', 'created_at')
+        read_only_fields = fields
+
+
+class LocationSerializer(serializers.ModelSerializer):
+    plant = serializers.PrimaryKeyRelatedField(read_only=True, default=CurrentPlantDefault())
+
+    class Meta:
+        model = Location
+        fields = '__all__'
+
+
+class StockLevelSerializer(serializers.ModelSerializer):
+    sku = serializers.CharField(source='powder.sku', read_only=True)
+    location_name = serializers.CharField(source='location.name', read_only=True)
+    quantity = serializers.DecimalField(max_digits=12, decimal_places=3, coerce_to_string=False, read_only=True)
+
+    class Meta:
+        model = StockLevel
+        fields = ('id', 'powder', 'sku', 'location', 'location_name', 'quantity', 'updated_at')
+        read_only_fields = fields
+
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    quantity = serializers.DecimalField(max_digits=12, decimal_places=3, coerce_to_string=False, read_only=True)
+    class Meta:
+        model = StockMovement
+        fields = '__all__'
+        read_only_fields = [f.name for f in StockMovement._meta.fields]
+
+
+class LotCodeField(serializers.SlugRelatedField):
+    """
+    A lot given by its code. Codes are unique per plant, so the lookup is
+    limited to the request's plant; across plants a shared code is refused.
+    """
+    default_error_messages = {
+        'ambiguous': 'Lot "{value}" exists in several plants; choose a plant.',
+    }
+
+    def __init__(self, **kwargs):
+        super().__init__(slug_field='code', queryset=Lot.objects.all(), **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is not None and plant_scope(request) is not None:
+            queryset = queryset.filter(plant_id=plant_scope(request))
+        return queryset
+
+    def to_internal_value(self, data):
+        try:
+            return super().to_internal_value(data)
+        except Lot.MultipleObjectsReturned:
+            self.fail('ambiguous', value=data)
+
+
+class StockMoveSerializer(serializers.Serializer):
+    powder = serializers.PrimaryKeyRelatedField(queryset=Powder.objects.all())
+    kind = serializers.ChoiceField(choices=['receive', 'consume', 'adjust'])
+    quantity = serializers.DecimalField(max_digits=12, decimal_places=3)
+    # Purchase cost per kg of received stock; defaults to the current average cost.
+    unit_cost = serializers.DecimalField(max_digits=12, decimal_places=4, min_value=0, required=False, allow_null=True)
+    location = serializers.PrimaryKeyRelatedField(queryset=Location.objects.all(), required=False, allow_null=True)
+    lot = LotCodeField(required=False, allow_null=True)
+    note = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        # Receipts and consumption are given as positive amounts; the sign
+        # comes from the kind. Adjustments are signed.
+        if attrs.get('lot') and attrs['lot'].powder_id != attrs['powder'].pk:
+            raise serializers.ValidationError({'lot': 'Lot belongs to a different powder.'})
+        if attrs.get('location') and attrs['location'].plant_id != attrs['powder'].plant_id:
+            raise serializers.ValidationError({'location': 'Location belongs to another plant.'})
+        if attrs['kind'] in ('receive', 'consume'):
+            if attrs['quantity'] <= 0:
+                raise serializers.ValidationError({'quantity': 'Must be positive.'})
+            if attrs['kind'] == 'consume':
+                attrs['quantity'] = -attrs['quantity']
+        return attrs
+
+
+class StockTransferSerializer(serializers.Serializer):
+    powder = serializers.PrimaryKeyRelatedField(queryset=Powder.objects.all())
+    from_location = serializers.PrimaryKeyRelatedField(queryset=Location.objects.all())
+    to_location = serializers.PrimaryKeyRelatedField(queryset=Location.objects.all())
+    lot = LotCodeField(required=False, allow_null=True)
+    quantity = serializers.DecimalField(max_digits=12, decimal_places=3, min_value=0)
+    note = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        if attrs.get('lot') and attrs['lot'].powder_id != attrs['powder'].pk:
+            raise serializers.ValidationError({'lot': 'Lot belongs to a different powder.'})
+        for field in ('from_location', 'to_location'):
+            if attrs[field].plant_id != attrs['powder'].plant_id:
+                raise serializers.ValidationError({field: 'Location belongs to another plant.'})
+        return attrs
+
+
+class CycleCountEntrySerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=50, required=False)
+    powder = serializers.IntegerField(required=False)
+    counted = serializers.DecimalField(max_digits=12, decimal_places=3, min_value=0)
+
+    def validate(self, attrs):
+        if not attrs.get('sku') and not attrs.get('powder'):
+            raise serializers.ValidationError('Give a sku or a powder id.')
+        return attrs
+
+
+class CycleCountSerializer(serializers.ModelSerializer):
+    lines = CycleCountEntrySerializer(many=True, write_only=True)
+    line_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = CycleCount
+        fields = ('id', 'plant', 'location', 'status', 'note', 'lines', 'line_count', 'created_by', 'created_at',
+                  'approved_by', 'approved_at')
+        read_only_fields = ('plant', 'status', 'created_by', 'created_at', 'approved_by', 'approved_at')
+
+    def validate_location(self, value):
+        if value is not None and value.plant_id != write_plant(self.context['request']):
+            raise serializers.ValidationError('Location belongs to another plant.')
+        return value
+
+    def validate_lines(self, value):
+        if not value:
+            raise serializers.ValidationError('At least one line is required.')
+        if len(value) > settings.CYCLE_COUNT_MAX_LINES:
+            raise serializers.ValidationError(f'At most {settings.CYCLE_COUNT_MAX_LINES} lines per count.')
+        return value
+
+
+class ReportArtifactSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReportArtifact
+        fields = ('id', 'kind', 'period', 'period_start', 'params', 'format', 'content_hash', 'size', 'generated_at')
+
+
+class ReportRequestSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=ReportArtifact.KIND_CHOICES)
+    period = serializers.ChoiceField(choices=ReportArtifact.PERIOD_CHOICES)
+    date = serializers.DateField()
+    format = serializers.ChoiceField(choices=ReportArtifact.FORMAT_CHOICES)
+    params = serializers.DictField(child=serializers.CharField(allow_blank=True), required=False, default=dict)
+    force = serializers.BooleanField(required=False, default=False)
+
+
+class LotSerializer(serializers.ModelSerializer):
+    sku = serializers.CharField(source='powder.sku', read_only=True)
+
+    class Meta:
+        model = Lot
+        fields = ('id', 'code', 'plant', 'powder', 'sku', 'received_on', 'quantity', 'supplier', 'created_at')
+        read_only_fields = ('plant',)
+        # The plant comes from the powder; uniqueness is checked in validate().
+        validators = []
+
+    def validate(self, attrs):
+        code = attrs.get('code', getattr(self.instance, 'code', None))
+        powder = attrs.get('powder', getattr(self.instance, 'powder', None))
+        clash = Lot.objects.filter(plant_id=powder.plant_id, code=code)
+        if self.instance is not None:
+            clash = clash.exclude(pk=self.instance.pk)
+        if clash.exists():
+            raise serializers.ValidationError({'code': 'A lot with this code already exists in the plant.'})
+        return attrs
+
+
+class StickerPrintSerializer(serializers.ModelSerializer):
+    lot = LotCodeField(required=False, allow_null=True)
+
+    class Meta:
+        model = StickerPrint
+        fields = '__all__'
+        read_only_fields = ('plant', 'printed_by', 'printed_at')
+
+    def validate(self, attrs):
+        lot, powder = attrs.get('lot'), attrs.get('powder')
+        if lot and powder and lot.powder_id != powder.pk:
+            raise serializers.ValidationError({'lot': 'Lot belongs to a different powder.'})
+        if lot and not powder:
+            attrs['powder'] = lot.powder
+        return attrs
+
+
+class WebhookEndpointSerializer(serializers.ModelSerializer):
+    plant = serializers.SlugRelatedField(slug_field='code', queryset=Plant.objects.all(), required=False, allow_null=True)
+
+    class Meta:
+        model = WebhookEndpoint
+        fields = ('id', 'name', 'url', 'secret', 'events', 'plant', 'is_active', 'created_by', 'created_at',
+                  'last_success_at', 'last_failure_at')
+        read_only_fields = ('secret', 'created_by', 'created_at', 'last_success_at', 'last_failure_at')
+
+    def validate_events(self, value):
+        known = dict(WebhookEndpoint.EVENT_CHOICES)
+        if not isinstance(value, list) or not all(isinstance(e, str) for e in value):
+            raise serializers.ValidationError('Expected a list of event names.')
+        unknown = [e for e in value if e not in known]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown events: {', '.join(unknown)}.")
+        return value
+
+
+class WebhookDeliverySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WebhookDelivery
+        fields = ('id', 'endpoint', 'event', 'payload', 'status', 'attempts', 'next_attempt_at', 'last_error',
+                  'created_at', 'delivered_at')
+        read_only_fields = fields
@@ -1,16 +1,73 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from django.contrib.auth.models import User
-from .models import UserProfile
-
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        UserProfile.objects.create(user=instance)
-
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    try:
-        instance.userprofile.save()
-    except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=instance)
\ No newline at end of file
+
+from . import cache, gas, scanning, search, webhooks
+from .models import Powder, Task, QCReport, GasRecord, GasReading, Lot
+
+
+@receiver(post_save, sender=Powder)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=QCReport)
+def index_search_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_instance(instance)
+
+
+@receiver(post_delete, sender=Powder)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=QCReport)
+def remove_search_document(sender, instance, **kwargs):
+    search.unindex_instance(instance)
+
+
+@receiver(post_save, sender=GasRecord)
+def record_gas_reading(sender, instance, raw=False, **kwargs):
+    """Keep every level a tank is saved with as a reading for the forecasts."""
+    if raw:
+        return
+    latest = instance.readings.order_by('-recorded_at', '-id').values_list('level', flat=True).first()
+    if latest != instance.current_level:
+        GasReading.objects.create(tank=instance, level=instance.current_level)
+        gas.schedule_refresh()
+
+
+# Task status and QC result as loaded, so saves can tell a transition from a re-save.
+@receiver(post_init, sender=Task)
+def remember_task_status(sender, instance, **kwargs):
+    instance._saved_status = instance.__dict__.get('status')
+
+
+@receiver(post_init, sender=QCReport)
+def remember_qc_result(sender, instance, **kwargs):
+    instance._saved_result = instance.__dict__.get('result')
+
+
+@receiver(post_save, sender=Task)
+def emit_task_completed(sender, instance, created, raw=False, **kwargs):
+    if not raw and instance.status == 'done' and (created or instance._saved_status != 'done'):
+        webhooks.task_completed(instance)
+    instance._saved_status = instance.status
+
+
+@receiver(post_save, sender=QCReport)
+def emit_qc_failed(sender, instance, created, raw=False, **kwargs):
+    if not raw and instance.result == 'Fail' and (created or instance._saved_result != 'Fail'):
+        webhooks.qc_failed(instance)
+    instance._saved_result = instance.result
+
+
+# A new lot can take over a code cached as a SKU; renames are caught on use.
+for _model in (Powder, Lot):
+    post_save.connect(scanning.forget, sender=_model, dispatch_uid=f'scan-save-{_model._meta.label_lower}')
+    post_delete.connect(scanning.forget, sender=_model, dispatch_uid=f'scan-delete-{_model._meta.label_lower}')
+
+
+def invalidate_cached_responses(sender, **kwargs):
+    cache.bump(sender)
+
+
+# Connected per model rather than for every sender: a catch-all post_delete
+# receiver would stop Django from fast-deleting untracked tables.
+for _model in cache.TRACKED_MODELS:
+    post_save.connect(invalidate_cached_responses, sender=_model, dispatch_uid=f'cache-save-{_model._meta.label_lower}')
+    post_delete.connect(invalidate_cached_responses, sender=_model, dispatch_uid=f'cache-delete-{_model._meta.label_lower}')
@@ -0,0 +1,159 @@
+"""
+Pre-built JSON snapshots for viewers.
+
+Viewers only read, and mostly the same few pages. ``publish()`` renders each
+resource in ``RESOURCES`` through its API view as a viewer of every plant and
+writes the bytes, plus gzip and brotli copies, to
+``SNAPSHOT_DIR/<plant code>/<name>.json``. ``GET /api/snapshots/<name>/``
+serves those files without touching the database: the token is checked from
+its ``role``/``plant`` claims alone, and the ETag comes from the file's stat,
+so an unchanged page costs a 304.
+
+Writes bump the response-cache generations of their models (see
+``dashboard.cache``); every bump of a model a snapshot is built from queues a
+``snapshots.publish`` job ``SNAPSHOT_DELAY`` seconds out, so a burst of
+writes shares one run. The run only re-renders resources whose generations
+moved since they were last written, and leaves a file alone (keeping its
+ETag) when the new bytes are the same.
+"""
+import gzip
+import io
+import json
+import os
+import re
+from pathlib import Path
+
+import brotli
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import resolve
+
+from users.models import Plant
+
+from . import cache, jobs
+from .models import GasRecord, Powder, PowderValuation, QCReport, StockMovement, Task
+
+PUBLISH_JOB = 'snapshots.publish'
+
+# name -> (API path, models the response is built from)
+RESOURCES = {
+    'summary': ('/api/dashboard-summary/', (Powder, Task, QCReport, GasRecord)),
+    'powders': ('/api/powders/', (Powder, QCReport, StockMovement, PowderValuation)),
+    'tasks-board': ('/api/tasks/board/', (Task,)),
+    'qc-reports': ('/api/qc-reports/', (QCReport,)),
+    'gas-records': ('/api/gas-records/', (GasRecord,)),
+}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+_MANIFEST = 'manifest.json'
+_TRACKED = {model for _, models in RESOURCES.values() for model in models}
+
+
+class SnapshotError(Exception):
+    """A resource could not be rendered."""
+
+
+def _root():
+    return Path(settings.SNAPSHOT_DIR)
+
+
+def path_for(plant_code, name):
+    """Where the snapshot ``name`` of a plant lives, or None for a name or code that cannot be one."""
+    if name not in RESOURCES or not re.fullmatch(r'[-\w]+', plant_code or '', re.ASCII):
+        return None
+    return _root() / plant_code / f'{name}.json'
+
+
+# ── Publishing ──
+
+def schedule(models):
+    """Queue a publish run if any of ``models`` feeds a snapshot; writes within ``SNAPSHOT_DELAY`` share it."""
+    if settings.SNAPSHOTS_ENABLED and _TRACKED.intersection(models):
+        jobs.enqueue(PUBLISH_JOB, unique=True, delay=settings.SNAPSHOT_DELAY)
+
+
+def _render(path, plant):
+    """The body ``GET path`` returns to a viewer of ``plant``."""
+    request = WSGIRequest({
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'wsgi.input': io.BytesIO(),
+    })
+    # DRF authenticates requests carrying this as the given user.
+    request._force_auth_user = get_user_model()(username='snapshots', role='viewer', plant=plant)
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+    response.render()
+    if response.status_code != 200:
+        raise SnapshotError(f"GET {path} for plant {plant.code} returned {response.status_code}.")
+    return response.content
+
+
+def _replace(path, content):
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(content)
+    os.replace(tmp, path)
+
+
+def _write(plant_code, name, content):
+    """Store ``content``; returns False if the file already holds it."""
+    path = path_for(plant_code, name)
+    if path.exists() and path.read_bytes() == content:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _replace(path.with_name(path.name + '.br'), brotli.compress(content))
+    _replace(path.with_name(path.name + '.gz'), gzip.compress(content, mtime=0))
+    # Last, since its stat is the ETag of all three.
+    _replace(path, content)
+    return True
+
+
+def _built():
+    try:
+        return json.loads((_root() / _MANIFEST).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def publish(force=False):
+    """Re-render the resources whose models changed since they were written. Returns counts."""
+    built = _built()
+    plants = list(Plant.objects.order_by('code'))
+    rendered = written = 0
+    for name, (path, models) in RESOURCES.items():
+        # Read before rendering: a write racing the render moves them again.
+        state = {'generations': [list(g) for g in cache.generations(models)], 'plants': [p.code for p in plants]}
+        if not force and built.get(name) == state:
+            continue
+        for plant in plants:
+            rendered += 1
+            written += _write(plant.code, name, _render(path, plant))
+        built[name] = state
+        _root().mkdir(parents=True, exist_ok=True)
+        _replace(_root() / _MANIFEST, json.dumps(built).encode())
+    return {'rendered': rendered, 'written': written}
+
+
+@jobs.register(PUBLISH_JOB)
+def publish_job(job):
+    return publish()
+
+
+# ── Serving ──
+
+def etag(path):
+    stat = path.stat()
+    return f'W/"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def variant(path, accept_encoding):
+    """The stored encoding of ``path`` to send for ``accept_encoding``: (path, encoding or None)."""
+    accepted = set()
+    for token in accept_encoding.split(','):
+        coding, _, params = token.partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip())
+    for encoding, suffix in ENCODINGS:
+        candidate = path.with_name(path.name + suffix)
+        if encoding in accepted and candidate.exists():
+            return candidate, encoding
+    return path, None
@@ -0,0 +1,54 @@
+"""
+Static files storage for serving the Vite build through WhiteNoise.
+"""
+import json
+from pathlib import Path
+
+from django.conf import settings
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+def vite_manifest_files(dist_dir):
+    """Every output file listed in Vite's build manifest (``.vite/manifest.json``)."""
+    manifest = Path(dist_dir) / '.vite' / 'manifest.json'
+    if not manifest.exists():
+        return set()
+    files = set()
+    for chunk in json.loads(manifest.read_text()).values():
+        files.add(chunk['file'])
+        files.update(chunk.get('css', []))
+        files.update(chunk.get('assets', []))
+    return files
+
+
+class ViteManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    WhiteNoise's compressed manifest storage that leaves Vite's output alone.
+
+    Files Vite has already content-hashed keep their names and contents, so
+    the references baked into ``index.html`` and the JS chunks stay valid and
+    a name always means the same bytes; everything else (admin, DRF) gets
+    Django's hashed copy as before. All of it is gzip- and brotli-compressed
+    during ``collectstatic``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._vite_files = None
+
+    @property
+    def vite_files(self):
+        if self._vite_files is None:
+            self._vite_files = vite_manifest_files(settings.FRONTEND_DIST_DIR)
+        return self._vite_files
+
+    def hashed_name(self, name, content=None, filename=None):
+        if name in self.vite_files:
+            return name
+        return super().hashed_name(name, content, filename)
+
+    def url_converter(self, name, hashed_files, template=None):
+        if name in self.vite_files:
+            # Leave url() references in Vite's CSS as Vite wrote them.
+            return lambda matchobj: matchobj.group(0)
+        return super().url_converter(name, hashed_files, template)
@@ -0,0 +1,135 @@
+"""
+Stock movements across locations.
+
+All changes to on-hand quantities go through these functions so that the
+per-location ``StockLevel`` rows, ``Powder.current_stock`` and the
+``StockMovement`` ledger stay consistent. Quantities are updated with
+``F()`` expressions in the database, never read-modify-written in Python.
+Each movement is valued by ``dashboard.valuation`` in the same transaction.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+
+from . import cache, valuation, webhooks
+from .models import Powder, Location, StockLevel, StockMovement
+
+
+class StockError(Exception):
+    """A movement that cannot be applied (e.g. not enough stock at the source)."""
+
+
+def _check_plant(powder, *locations):
+    for location in locations:
+        if location is not None and location.plant_id != powder.plant_id:
+            raise StockError(f"{location.name} is not in {powder.sku}'s plant.")
+
+
+def _ensure_level(powder, location):
+    StockLevel.objects.get_or_create(powder=powder, location=location)
+
+
+def move(powder, quantity, kind, *, location=None, lot=None, user=None, note='', unit_cost=None):
+    """
+    Apply a signed stock change to ``powder`` (and ``location``, if given).
+
+    Consuming more than a location holds raises ``StockError``; without a
+    location only the SKU total changes. ``unit_cost`` is the purchase cost
+    per kg of received stock.
+    """
+    if kind == 'transfer':
+        raise StockError("Use transfer() to move stock between locations.")
+    quantity = valuation.to_quantity(quantity)
+    _check_plant(powder, location)
+    with transaction.atomic():
+        if location is not None:
+            _ensure_level(powder, location)
+            levels = StockLevel.objects.filter(powder=powder, location=location)
+            if quantity < 0:
+                levels = levels.filter(quantity__gte=-quantity)
+            if not levels.update(quantity=F('quantity') + quantity):
+                raise StockError(f"Not enough {powder.sku} at {location.name}.")
+        Powder.objects.filter(pk=powder.pk).update(current_stock=F('current_stock') + quantity)
+        cache.bump(Powder, StockLevel)
+        return record(powder, quantity, kind, location=location, lot=lot, user=user, note=note, unit_cost=unit_cost)
+
+
+def record(powder, quantity, kind, *, location=None, lot=None, user=None, note='', unit_cost=None):
+    """
+    Write and value the ledger entry for a change already applied to
+    ``current_stock`` (``move()`` does both; direct edits of a powder's
+    stock only need this).
+    """
+    with transaction.atomic():
+        movement = StockMovement.objects.create(
+            powder=powder, kind=kind, quantity=valuation.to_quantity(quantity), unit_cost=unit_cost,
+            location=location, lot=lot, created_by=_user(user), note=note,
+        )
+        webhooks.powder_critical(powder, movement.quantity)
+        return valuation.apply(movement)
+
+
+def transfer(powder, source, destination, quantity, *, lot=None, user=None, note=''):
+    """
+    Move ``quantity`` of ``powder`` from ``source`` to ``destination``.
+
+    Both rows change in a single UPDATE; it only touches the source row if
+    that row still holds enough stock, so a short source updates one row
+    instead of two and the transaction is rolled back.
+    """
+    quantity = valuation.to_quantity(quantity)
+    if quantity <= 0:
+        raise StockError("Transfer quantity must be positive.")
+    if source.pk == destination.pk:
+        raise StockError("Source and destination must differ.")
+    _check_plant(powder, source, destination)
+
+    with transaction.atomic():
+        _ensure_level(powder, destination)
+        updated = (
+            StockLevel.objects
+            .filter(powder=powder, location__in=[source, destination])
+            .filter(~Q(location=source) | Q(quantity__gte=quantity))
+            .update(quantity=F('quantity') + Case(
+                When(location=destination, then=Value(quantity)),
+                default=Value(-quantity),
+            ))
+        )
+        if updated != 2:
+            raise StockError(f"Not enough {powder.sku} at {source.name}.")
+        cache.bump(StockLevel)
+        movement = StockMovement.objects.create(
+            powder=powder, kind='transfer', quantity=quantity,
+            location=source, to_location=destination, lot=lot, created_by=_user(user), note=note,
+        )
+        return valuation.apply(movement)
+
+
+def totals_by_sku(plant=None):
+    """On-hand total and the part of it assigned to locations, per powder (of ``plant``, an id)."""
+    powders = Powder.objects.all() if plant is None else Powder.objects.filter(plant_id=plant)
+    return (
+        powders.order_by('sku')
+        .annotate(allocated=Sum('stock_levels__quantity'), locations=Count('stock_levels'))
+        .values('id', 'sku', 'name', 'current_stock', 'allocated', 'locations')
+    )
+
+
+def totals_by_location(plant=None):
+    locations = Location.objects.all() if plant is None else Location.objects.filter(plant_id=plant)
+    return (
+        locations.order_by('name')
+        .annotate(total=Sum('stock_levels__quantity'), skus=Count('stock_levels', filter=Q(stock_levels__quantity__gt=0)))
+        .values('id', 'name', 'kind', 'total', 'skus')
+    )
+
+
+def picking_list(powder):
+    """Locations holding ``powder``, fullest first (an index range on (powder, location))."""
+    return (
+        StockLevel.objects.filter(powder=powder, quantity__gt=0)
+        .select_related('location').order_by('-quantity')
+    )
+
+
+def _user(user):
+    return user if user is not None and user.is_authenticated else None
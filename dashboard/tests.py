@@ -1,3 +1,1227 @@
-from django.test import TestCase
+import cProfile
+import hashlib
+import hmac
+import gzip
+import io
+import json
+import pstats
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import Plant, default_plant_id
+
+from . import (
+    activity, archive, cache, counting, dedupe, gas, jobs, profiling, reports, scanning, snapshots, stock, valuation,
+    webhooks,
+)
+from .models import (
+    ActivityEvent, ArchivedRecord, GasForecast, GasReading, GasRecord, IdempotencyRecord, Job, Location, Lot, Powder,
+    QCReport, ReportArtifact, StickerPrint, StockMovement, Task, WebhookDelivery, WebhookEndpoint,
+)
+from .admin import QCReportAdmin, TaskAdmin
+from .staticfiles import ViteManifestStaticFilesStorage
+from .views import PowderViewSet, spa_index
+
+
+@jobs.register('tests.fail')
+def _failing_job(job):
+    raise RuntimeError('boom')
+
+
+@override_settings(JOBS_MAX_ATTEMPTS=2, JOBS_RETRY_BACKOFF=60)
+class JobQueueTests(TestCase):
+    def test_claims_due_jobs_by_priority_once(self):
+        low = jobs.enqueue('tests.noop')
+        high = jobs.enqueue('tests.noop', priority=5)
+        jobs.enqueue('tests.noop', priority=9, delay=3600)  # not due yet
+
+        first = jobs.claim_next('worker-a')
+        self.assertEqual((first.pk, first.status, first.attempts, first.locked_by), (high.pk, 'running', 1, 'worker-a'))
+        self.assertEqual(jobs.claim_next('worker-b').pk, low.pk)
+        self.assertIsNone(jobs.claim_next('worker-c'))
+
+    def test_unique_enqueue_returns_the_queued_job(self):
+        job = jobs.enqueue('tests.noop', {'day': '2024-01-01'}, unique=True)
+        self.assertEqual(jobs.enqueue('tests.noop', {'day': '2024-01-01'}, unique=True).pk, job.pk)
+        self.assertNotEqual(jobs.enqueue('tests.noop', {'day': '2024-01-02'}, unique=True).pk, job.pk)
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        jobs.enqueue('tests.fail')
+        with self.assertLogs('dashboard.jobs', 'ERROR'):
+            job = jobs.run_job(jobs.claim_next('worker'))
+        self.assertEqual(job.status, 'queued')
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=40))
+        self.assertIsNone(jobs.claim_next('worker'))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('dashboard.jobs', 'ERROR'):
+            job = jobs.run_job(jobs.claim_next('worker'))
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIn('RuntimeError: boom', job.error)
+
+    def test_stale_running_jobs_are_requeued(self):
+        jobs.enqueue('tests.noop')
+        job = jobs.claim_next('worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(timeout=60), 1)
+        self.assertEqual(jobs.claim_next('other').pk, job.pk)
+
+    def test_heartbeats_keep_long_jobs_from_being_requeued(self):
+        jobs.enqueue('tests.noop')
+        job = jobs.claim_next('worker')
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Job.objects.filter(pk=job.pk).update(locked_at=an_hour_ago)
+        job.set_progress(50, 'halfway')
+        self.assertEqual(jobs.requeue_stale(timeout=60), 0)
+
+        Job.objects.filter(pk=job.pk).update(locked_at=an_hour_ago)
+        self.assertEqual(jobs.heartbeat(job), 1)
+        self.assertEqual(jobs.requeue_stale(timeout=60), 0)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'running')
+
+    def test_stale_jobs_out_of_attempts_are_failed(self):
+        jobs.enqueue('tests.noop')
+        job = jobs.claim_next('worker')
+        Job.objects.filter(pk=job.pk).update(attempts=2, locked_at=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('dashboard.jobs', 'WARNING'):
+            self.assertEqual(jobs.requeue_stale(timeout=60), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_at), ('failed', None))
+        self.assertIn('no heartbeat', job.error)
+        self.assertIsNone(jobs.claim_next('other'))
+
+
+class DedupeTests(TestCase):
+    def test_double_submitted_tanks_are_deleted_and_their_readings_kept(self):
+        start = timezone.now() - timedelta(hours=1)
+        tanks = [GasRecord.objects.create(type='Argon', capacity=50, current_level=20) for _ in range(4)]
+        GasRecord.objects.create(type='Argon', capacity=50, current_level=30)
+        # Three copies seconds apart, then an identical tank set up minutes later.
+        for tank, offset in zip(tanks, (0, 5, 40, 600)):
+            GasRecord.objects.filter(pk=tank.pk).update(created_at=start + timedelta(seconds=offset))
+        gas.refresh()
+
+        summary = dedupe.report(dedupe.RULES['gasrecord'])
+        self.assertEqual((summary['groups'], summary['surplus_rows'], summary['examples'][0]['copies']), (1, 2, 3))
+        self.assertEqual(dedupe.delete_duplicates(dedupe.RULES['gasrecord'], batch_size=1), 2)
+        self.assertEqual(sorted(GasRecord.objects.filter(current_level=20).values_list('pk', flat=True)),
+                         [tanks[0].pk, tanks[3].pk])
+        self.assertEqual(tanks[0].readings.count(), 3)
+        self.assertEqual(tanks[3].readings.count(), 1)
+        self.assertEqual(GasForecast.objects.count(), 3)
+
+    def test_same_batch_in_two_plants_is_not_a_duplicate(self):
+        other = Plant.objects.create(code='east', name='East')
+        QCReport.objects.create(batch_id='B-1', powder_type='RED')
+        QCReport.objects.create(batch_id='B-1', powder_type='RED', plant=other)
+        self.assertEqual(dedupe.delete_duplicates(dedupe.RULES['qcreport']), 0)
+        self.assertEqual(QCReport.objects.count(), 2)
+
+
+@override_settings(GAS_MIN_READINGS=3, GAS_REFILL_THRESHOLD=0.05, GAS_REORDER_FRACTION=0.15, GAS_FORECAST_Z=1.64,
+                   GAS_REFILL_WINDOW_DAYS=7, GAS_BATCH_BY_TYPE=False)
+class GasTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def tank(self, levels, type='Argon', capacity=100, plant=None):
+        """A tank with one reading per day, the last one now."""
+        tank = GasRecord.objects.create(type=type, capacity=capacity, current_level=levels[-1],
+                                        **({'plant': plant} if plant else {}))
+        tank.readings.all().delete()
+        for days_ago, level in enumerate(reversed(levels)):
+            GasReading.objects.create(tank=tank, level=level, recorded_at=self.now - timedelta(days=days_ago))
+        return tank
+
+    def forecasts(self):
+        return {forecast.tank_id: forecast for forecast in gas.compute(self.now)}
+
+    def test_rate_is_fitted_by_least_squares(self):
+        tank = self.tank([100, 90, 80, 70, 60])
+        forecast = self.forecasts()[tank.pk]
+        self.assertEqual((forecast.source, forecast.readings), ('tank', 5))
+        self.assertAlmostEqual(forecast.rate_per_day, 10)
+        self.assertAlmostEqual(forecast.rate_stderr, 0)
+        self.assertAlmostEqual((forecast.empty_at - self.now).total_seconds() / 86400, 6)
+        self.assertAlmostEqual((forecast.reorder_at - self.now).total_seconds() / 86400, 4.5)
+
+    def test_short_histories_borrow_their_types_rate(self):
+        self.tank([100, 90, 80, 70, 60])
+        short = self.tank([200, 190], capacity=200)
+        lone = self.tank([40], type='CO2')
+        forecasts = self.forecasts()
+        self.assertEqual(forecasts[short.pk].source, 'type')
+        self.assertAlmostEqual(forecasts[short.pk].rate_per_day, 20)  # 10% of capacity a day, like the Argon tank
+        self.assertEqual((forecasts[lone.pk].source, forecasts[lone.pk].rate_per_day), ('none', 0.0))
+        self.assertIsNone(forecasts[lone.pk].empty_at)
+
+    def test_tanks_that_are_not_draining_never_run_empty(self):
+        tank = self.tank([50, 51, 52, 52])
+        forecast = self.forecasts()[tank.pk]
+        self.assertEqual(forecast.source, 'tank')
+        self.assertLess(forecast.rate_per_day, 0)
+        self.assertEqual((forecast.empty_at, forecast.reorder_at), (None, None))
+
+    def test_a_refill_restarts_the_fit(self):
+        tank = self.tank([100, 80, 60, 40, 95, 90, 85])
+        forecast = self.forecasts()[tank.pk]
+        self.assertEqual(forecast.readings, 3)
+        self.assertAlmostEqual(forecast.rate_per_day, 5)
+
+    def plan(self, reorder_days, **tank):
+        tank = GasRecord.objects.create(capacity=100, current_level=50, cost=200, **tank)
+        GasForecast.objects.create(tank=tank, source='tank', rate_per_day=1, level=50, level_at=self.now,
+                                   reorder_at=self.now + timedelta(days=reorder_days))
+        return tank.pk
+
+    def test_refills_are_batched_into_the_fewest_trips(self):
+        first, second, third = self.plan(10), self.plan(12, type='CO2'), self.plan(20)
+        self.plan(90)  # beyond the horizon
+        result = gas.schedule(self.now, horizon_days=60)
+        self.assertEqual([sorted(stop['tank'] for stop in trip['tanks']) for trip in result['trips']],
+                         [[first, second], [third]])
+        self.assertEqual(result['trips'][0]['date'], self.now + timedelta(days=10))
+        self.assertEqual(result['trips_saved'], 1)
+        with self.settings(GAS_BATCH_BY_TYPE=True):
+            self.assertEqual(len(gas.schedule(self.now, horizon_days=60)['trips']), 3)
+
+    def test_trips_never_serve_two_plants(self):
+        east = Plant.objects.create(code='east', name='East')
+        west = self.plan(10)
+        other = self.plan(11, plant=east)
+        result = gas.schedule(self.now, horizon_days=60)
+        self.assertEqual([(trip['plant'], [stop['tank'] for stop in trip['tanks']]) for trip in result['trips']],
+                         [(default_plant_id(), [west]), (east.pk, [other])])
+        self.assertEqual([stop['tank'] for trip in gas.schedule(self.now, 60, plant=east.pk)['trips']
+                          for stop in trip['tanks']], [other])
+
+
+class ArchiveTests(TestCase):
+    def test_only_empty_tanks_are_archived(self):
+        live = GasRecord.objects.create(type='Argon', capacity=50, current_level=20)
+        empty = GasRecord.objects.create(type='CO2', capacity=50, current_level=0)
+        GasRecord.objects.update(updated_at=timezone.now() - timedelta(days=400))
+
+        self.assertEqual(archive.archive(archive.POLICIES['gasrecord'], archive.cutoff_for(12)), 1)
+        self.assertEqual(list(GasRecord.objects.values_list('pk', flat=True)), [live.pk])
+        row = archive.archived_row(GasRecord, empty.pk)
+        self.assertEqual(row['type'], 'CO2')
+        self.assertEqual([r['level'] for r in row['readings']], [0])
+
+    def test_archive_reads_are_filtered_by_plant_in_the_database(self):
+        east = Plant.objects.create(code='east', name='East')
+        ours = Task.objects.create(title='Ours', status='done')
+        theirs = Task.objects.create(title='Theirs', status='done', plant=east)
+        Task.objects.update(updated_at=timezone.now() - timedelta(days=400))
+        archive.archive(archive.POLICIES['task'], archive.cutoff_for(12))
+
+        self.assertEqual(ArchivedRecord.objects.get(original_id=theirs.pk).plant, east)
+        self.assertEqual([row['title'] for row in archive.archived_rows(Task, plant=east.pk)], ['Theirs'])
+        self.assertEqual(len(archive.archived_rows(Task)), 2)
+        self.assertIsNone(archive.archived_row(Task, ours.pk, plant=east.pk))
+        self.assertEqual(archive.archived_row(Task, theirs.pk, plant=east.pk)['title'], 'Theirs')
+
+
+@override_settings(REPORTS_FORMATS=['csv'], REPORTS_LOOKBACK=1, REPORTS_SCHEDULE_INTERVAL=3600)
+class ReportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(REPORTS_DIR=directory.name))
+        self.day = timezone.localdate() - timedelta(days=7)
+        QCReport.objects.create(batch_id='B-1', powder_type='RED', result='Pass', date=self.day)
+
+    def test_unchanged_figures_are_not_rendered_again(self):
+        artifact, rendered = reports.generate('qc', 'week', self.day, 'csv')
+        self.assertTrue(rendered)
+        self.assertEqual(reports.generate('qc', 'week', self.day, 'csv'), (artifact, False))
+
+        QCReport.objects.create(batch_id='B-2', powder_type='RED', result='Fail', date=self.day)
+        changed, rendered = reports.generate('qc', 'week', self.day, 'csv')
+        self.assertTrue(rendered)
+        self.assertEqual(changed.pk, artifact.pk)
+        self.assertNotEqual(changed.file, artifact.file)
+        self.assertFalse(reports.path_for(artifact).exists())
+        self.assertEqual(ReportArtifact.objects.count(), 1)
+
+    @override_settings(REPORTS_FORMATS=['docx', 'csv'])
+    def test_failed_reports_are_skipped_and_the_next_run_is_scheduled(self):
+        jobs.enqueue(reports.GENERATE_DUE_JOB)
+        with self.assertLogs('dashboard.reports', 'ERROR'):
+            job = jobs.run_job(jobs.claim_next('worker'))
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.result, {'rendered': 6, 'unchanged': 0, 'failed': 6})  # 3 kinds x (week, month)
+        next_run = Job.objects.get(name=reports.GENERATE_DUE_JOB, status='queued')
+        self.assertGreater(next_run.run_after, timezone.now() + timedelta(minutes=50))
+
+        Job.objects.filter(pk=next_run.pk).update(run_after=timezone.now())
+        with mock.patch.object(reports, 'generate_due', side_effect=RuntimeError('boom')), \
+                self.assertLogs('dashboard.jobs', 'ERROR'):
+            jobs.run_job(jobs.claim_next('worker'))
+        scheduled = Job.objects.filter(name=reports.GENERATE_DUE_JOB, status='queued')
+        self.assertEqual(scheduled.count(), 2)  # the failed run's retry and the next scheduled run
+        self.assertGreater(scheduled.latest('run_after').run_after, timezone.now() + timedelta(minutes=50))
+
+
+class PowderEditTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('op', password='x', role='operator'))
+        self.powder = Powder.objects.create(name='Red', sku='RED')
+        stock.move(self.powder, 10, 'receive')
+
+    def edit(self, data):
+        """PATCH the powder while another request receives 5 kg after the form's row was read."""
+        get_object = PowderViewSet.get_object
+
+        def read_then_receive(view):
+            powder = get_object(view)
+            stock.move(self.powder, 5, 'receive')
+            return powder
+
+        with mock.patch.object(PowderViewSet, 'get_object', read_then_receive):
+            response = self.client.patch(f'/api/powders/{self.powder.pk}/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.powder.refresh_from_db()
+        return response
+
+    def test_edits_keep_concurrent_stock_movements(self):
+        response = self.edit({'name': 'Signal red'})
+        self.assertEqual((self.powder.name, self.powder.current_stock), ('Signal red', Decimal('15')))
+        self.assertEqual(response.data['current_stock'], Decimal('15'))
+        self.assertFalse(StockMovement.objects.filter(kind='adjust').exists())
+
+    def test_typed_in_stock_is_adjusted_from_the_current_stock(self):
+        response = self.edit({'current_stock': 12})
+        self.assertEqual((self.powder.current_stock, response.data['current_stock']), (Decimal('12'), Decimal('12')))
+        adjustment = StockMovement.objects.get(kind='adjust')
+        self.assertEqual((adjustment.quantity, adjustment.note), (Decimal('-3'), 'Edited on powder'))
+
+
+class TraceabilityTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('op', password='x', role='operator'))
+        self.powder = Powder.objects.create(name='Red', sku='RED')
+
+    def test_deleting_a_powder_keeps_its_qc_reports(self):
+        report = QCReport.objects.create(batch_id='L-1', powder_type='RED')
+        self.assertEqual(report.lot.powder, self.powder)
+        self.assertEqual(self.client.delete(f'/api/powders/{self.powder.pk}/').status_code, 204)
+        report.refresh_from_db()
+        self.assertEqual((report.powder, report.lot, report.batch_id), (None, None, 'L-1'))
+
+    def test_deleting_a_counted_powder_is_refused(self):
+        counting.create([{'sku': 'RED', 'counted': 5}], plant=self.powder.plant_id)
+        response = self.client.delete(f'/api/powders/{self.powder.pk}/')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('cycle count lines', response.data['detail'])
+
+    def test_transfer_rejects_a_lot_of_another_powder(self):
+        blue = Powder.objects.create(name='Blue', sku='BLUE')
+        Lot.objects.create(code='L-BLUE', powder=blue)
+        a, b = Location.objects.create(name='A'), Location.objects.create(name='B')
+        stock.move(self.powder, 5, 'receive', location=a)
+        response = self.client.post('/api/stock/transfer/', {
+            'powder': self.powder.pk, 'from_location': a.pk, 'to_location': b.pk, 'lot': 'L-BLUE', 'quantity': 1,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('lot', response.data)
+
+    def test_qc_reports_never_link_a_lot_of_another_plant(self):
+        east = Plant.objects.create(code='east', name='East')
+        ours = QCReport.objects.create(batch_id='L-1', powder_type='RED')
+        theirs = QCReport.objects.create(batch_id='L-1', powder_type='RED', plant=east)
+        self.assertEqual(ours.lot.plant_id, self.powder.plant_id)
+        self.assertEqual((theirs.lot, theirs.powder), (None, None))
+
+        blue = Powder.objects.create(name='Blue', sku='BLUE', plant=east)
+        theirs = QCReport.objects.create(batch_id='L-2', powder_type='BLUE', plant=east)
+        self.assertEqual((theirs.lot.plant, theirs.lot.powder), (east, blue))
+
+    def test_lot_codes_are_unique_per_plant(self):
+        east = Plant.objects.create(code='east', name='East')
+        east_lot = Lot.objects.create(code='L-1', powder=Powder.objects.create(name='Red', sku='RED', plant=east))
+        response = self.client.post('/api/lots/', {'code': 'L-1', 'powder': self.powder.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/lots/', {'code': 'L-1', 'powder': self.powder.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('code', response.data)
+
+        response = self.client.post('/api/stock/move/', {
+            'powder': self.powder.pk, 'kind': 'receive', 'quantity': 1, 'lot': 'L-1',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.data['lot'], east_lot.pk)
+
+
+class ValuationTests(TestCase):
+    def setUp(self):
+        self.powder = Powder.objects.create(name='Red', sku='RED', price_per_kg=4)
+
+    def receive_and_consume(self):
+        stock.move(self.powder, 10, 'receive', unit_cost=5)
+        stock.move(self.powder, 10, 'receive', unit_cost=7)
+        return stock.move(self.powder, -15, 'consume')
+
+    def valued(self, rows):
+        row = valuation.summarize(rows)['items'][0]
+        return row['quantity'], row['value']
+
+    @override_settings(INVENTORY_VALUATION_METHOD='average')
+    def test_weighted_average(self):
+        issue = self.receive_and_consume()
+        self.assertEqual((issue.unit_cost, issue.value_change), (Decimal('6'), Decimal('-90')))
+        self.assertEqual(self.valued(valuation.current()), (Decimal('5'), Decimal('30')))
+
+    @override_settings(INVENTORY_VALUATION_METHOD='fifo')
+    def test_fifo_consumes_oldest_layers_first(self):
+        issue = self.receive_and_consume()
+        self.assertEqual(issue.value_change, Decimal('-85'))  # 10 @ 5 + 5 @ 7
+        self.assertEqual(self.valued(valuation.current()), (Decimal('5'), Decimal('35')))
+        self.assertEqual(list(self.powder.cost_layers.values_list('remaining', flat=True)), [0, 5])
+
+    @override_settings(INVENTORY_VALUATION_METHOD='fifo')
+    def test_as_of_reads_the_balance_at_that_moment(self):
+        stock.move(self.powder, 10, 'receive', unit_cost=5)
+        moment = timezone.now()
+        StockMovement.objects.update(created_at=moment - timedelta(seconds=1))
+        stock.move(self.powder, 10, 'receive', unit_cost=7)
+        self.assertEqual(self.valued(valuation.as_of(moment)), (Decimal('10'), Decimal('50')))
+        self.assertEqual(self.valued(valuation.as_of(moment - timedelta(days=1))), (Decimal('0'), Decimal('0')))
+
+    @override_settings(INVENTORY_VALUATION_METHOD='fifo')
+    def test_rebuild_books_stock_from_before_the_ledger_first(self):
+        self.receive_and_consume()
+        Powder.objects.filter(pk=self.powder.pk).update(current_stock=F('current_stock') + 2)
+        self.assertEqual(valuation.rebuild(self.powder), 4)
+        # 2 @ 4 (list price) opening, then 10 @ 5 and 10 @ 7; 15 consumed oldest first.
+        self.assertEqual(self.valued(valuation.current()), (Decimal('7'), Decimal('49')))
+
+
+@override_settings(INVENTORY_VALUATION_METHOD='average')
+class CycleCountTests(TestCase):
+    def setUp(self):
+        self.red = Powder.objects.create(name='Red', sku='RED', price_per_kg=4, min_level=5)
+        self.blue = Powder.objects.create(name='Blue', sku='BLUE', price_per_kg=10)
+        stock.move(self.red, 10, 'receive')
+        stock.move(self.blue, 3, 'receive')
+        self.plant = self.red.plant_id
+
+    def test_create_sums_bins_of_one_sku(self):
+        count = counting.create([
+            {'sku': 'RED', 'counted': Decimal('4.5')},
+            {'sku': 'RED', 'counted': Decimal('2')},
+            {'powder': self.blue.pk, 'counted': Decimal('3')},
+        ], plant=self.plant)
+        self.assertEqual(
+            dict(count.lines.values_list('powder__sku', 'counted')), {'RED': Decimal('6.5'), 'BLUE': Decimal('3')},
+        )
+
+    def test_create_rejects_unknown_skus_and_other_plants_powders(self):
+        east = Plant.objects.create(code='east', name='East')
+        green = Powder.objects.create(name='Green', sku='GREEN', plant=east)
+        with self.assertRaisesMessage(counting.CountError, 'GREEN, NOPE'):
+            counting.create([{'sku': 'NOPE', 'counted': 1}, {'sku': 'GREEN', 'counted': 1}], plant=self.plant)
+        with self.assertRaisesMessage(counting.CountError, str(green.pk)):
+            counting.create([{'powder': green.pk, 'counted': 1}], plant=self.plant)
+        self.assertFalse(counting.CycleCount.objects.exists())
+
+    def test_report_values_variances_at_the_list_price(self):
+        count = counting.create([{'sku': 'RED', 'counted': 7}, {'sku': 'BLUE', 'counted': 3}], plant=self.plant)
+        report = counting.report(count)
+        self.assertEqual(
+            [(row['sku'], row['expected'], row['variance'], row['variance_value']) for row in report['lines']],
+            [('RED', Decimal('10'), Decimal('-3'), Decimal('-12')), ('BLUE', Decimal('3'), Decimal('0'), Decimal('0'))],
+        )
+        self.assertEqual(report['summary']['with_variance'], 1)
+        self.assertEqual(report['summary']['accuracy'], 0.5)
+        self.assertEqual(report['summary']['net_value'], Decimal('-12'))
+
+    def test_approve_posts_the_variances_once(self):
+        WebhookEndpoint.objects.create(name='ERP', url='http://127.0.0.1:9/hook', events=['powder.critical'])
+        count = counting.create([{'sku': 'RED', 'counted': 4}, {'sku': 'BLUE', 'counted': 5}], plant=self.plant)
+        count = counting.approve(count)
+
+        self.red.refresh_from_db()
+        self.blue.refresh_from_db()
+        self.assertEqual((self.red.current_stock, self.blue.current_stock), (Decimal('4'), Decimal('5')))
+        adjustments = StockMovement.objects.filter(kind='adjust').order_by('powder__sku')
+        self.assertEqual(
+            [(m.powder.sku, m.quantity, m.value_change, m.balance_quantity) for m in adjustments],
+            [('BLUE', Decimal('2'), Decimal('20'), Decimal('5')), ('RED', Decimal('-6'), Decimal('-24'), Decimal('4'))],
+        )
+        self.assertEqual(list(WebhookDelivery.objects.values_list('event', flat=True)), ['powder.critical'])
+        self.assertEqual(counting.report(count)['summary']['net_value'], Decimal('-4'))
+
+        with self.assertRaisesMessage(counting.CountError, 'Count is approved.'):
+            counting.approve(count)
+        self.assertEqual(StockMovement.objects.filter(kind='adjust').count(), 2)
+
+    def test_location_counts_compare_against_that_location(self):
+        a, b = Location.objects.create(name='A'), Location.objects.create(name='B')
+        stock.move(self.red, 6, 'receive', location=a)
+        stock.move(self.red, 2, 'receive', location=b)
+        count = counting.create([{'sku': 'RED', 'counted': 5}], plant=self.plant, location=a)
+        self.assertEqual(counting.report(count)['lines'][0]['variance'], Decimal('-1'))
+
+        counting.approve(count)
+        self.red.refresh_from_db()
+        self.assertEqual(self.red.current_stock, Decimal('17'))
+        self.assertEqual(dict(self.red.stock_levels.values_list('location__name', 'quantity')),
+                         {'A': Decimal('5'), 'B': Decimal('2')})
+        self.assertEqual(StockMovement.objects.get(kind='adjust').location, a)
+
+
+@override_settings(IDEMPOTENCY_WAIT=0, IDEMPOTENCY_LOCK_TIMEOUT=60)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('op', password='x', role='operator')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_task(self, title, key='key-1'):
+        return self.client.post('/api/tasks/', {'title': title}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_is_replayed_without_a_second_write(self):
+        first = self.create_task('Recoat rack 4')
+        again = self.create_task('Recoat rack 4')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((again.status_code, again.data, again['Idempotent-Replayed']), (201, first.data, 'true'))
+        self.assertEqual(Task.objects.count(), 1)
+        # Keys are per user.
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user('op2', password='x', role='operator'))
+        self.assertEqual(other.post('/api/tasks/', {'title': 'Recoat rack 4'}, format='json',
+                                    HTTP_IDEMPOTENCY_KEY='key-1').status_code, 201)
+
+    def test_reused_key_with_another_body_conflicts(self):
+        self.create_task('Recoat rack 4')
+        self.assertEqual(self.create_task('Recoat rack 5').status_code, 422)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_failed_request_releases_the_key(self):
+        self.assertEqual(self.create_task('').status_code, 400)
+        self.assertEqual(self.create_task('Recoat rack 4').status_code, 201)
+
+    def test_in_flight_key_conflicts_until_abandoned(self):
+        self.create_task('Recoat rack 4')
+        # As if the first request were still running.
+        IdempotencyRecord.objects.update(state='pending', status_code=None, response_body=None)
+        self.assertEqual(self.create_task('Recoat rack 4').status_code, 409)
+        IdempotencyRecord.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.create_task('Recoat rack 4').status_code, 201)
+        self.assertEqual(IdempotencyRecord.objects.get().state, 'completed')
+
+
+class ResponseCacheTests(TestCase):
+    def generation(self):
+        return dict(cache.generations([Powder]))['dashboard.powder']
+
+    def test_generations_are_bumped_once_when_the_writes_commit(self):
+        before = self.generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for i in range(3):
+                    Powder.objects.create(name=f'Powder {i}', sku=f'P-{i}')
+                self.assertEqual(self.generation(), before)
+        self.assertEqual(self.generation(), before + 1)
+
+    def test_rolled_back_writes_bump_nothing(self):
+        before = self.generation()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Powder.objects.create(name='Red', sku='RED')
+                raise RuntimeError
+        self.assertEqual((callbacks, self.generation()), ([], before))
+
+
+class PlantIsolationTests(TestCase):
+    def setUp(self):
+        caches['responses'].clear()
+        User = get_user_model()
+        self.west = Plant.objects.get(pk=default_plant_id())
+        self.east = Plant.objects.create(code='east', name='East')
+        self.red = Powder.objects.create(name='Coat Red', sku='RED', price_per_kg=4)
+        self.blue = Powder.objects.create(name='Coat Blue', sku='BLUE', price_per_kg=6, plant=self.east)
+        stock.move(self.red, 10, 'receive', unit_cost=4)
+        stock.move(self.blue, 5, 'receive', unit_cost=6)
+        self.users = {
+            'west': User.objects.create_user('west-op', password='x', role='operator'),
+            'east': User.objects.create_user('east-op', password='x', role='operator', plant=self.east),
+            'viewer': User.objects.create_user('east-viewer', password='x', role='viewer', plant=self.east),
+            'admin': User.objects.create_user('boss', password='x', role='admin'),
+        }
+        self.client = APIClient()
+
+    def as_user(self, name):
+        self.client.force_authenticate(self.users[name])
+        return self.client
+
+    def skus(self, response):
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['sku'] for row in response.data)
+
+    def test_rows_of_another_plant_cannot_be_listed_or_retrieved(self):
+        for name in ('east', 'viewer'):
+            client = self.as_user(name)
+            self.assertEqual(self.skus(client.get('/api/powders/')), ['BLUE'])
+            self.assertEqual(client.get(f'/api/powders/{self.red.pk}/').status_code, 404)
+            self.assertEqual(client.get('/api/powders/', HTTP_X_PLANT=self.west.code).status_code, 403)
+
+    def test_list_cache_is_kept_per_plant(self):
+        self.assertEqual(self.skus(self.as_user('west').get('/api/powders/')), ['RED'])
+        self.assertEqual(self.skus(self.as_user('east').get('/api/powders/')), ['BLUE'])
+        response = self.as_user('west').get('/api/powders/')
+        self.assertEqual((response['X-Cache'], self.skus(response)), ('HIT', ['RED']))
+
+    def test_admins_pick_a_plant_or_all(self):
+        client = self.as_user('admin')
+        self.assertEqual(self.skus(client.get('/api/powders/', HTTP_X_PLANT='east')), ['BLUE'])
+        self.assertEqual(self.skus(client.get('/api/powders/?plant=east')), ['BLUE'])
+        self.assertEqual(self.skus(client.get('/api/powders/', HTTP_X_PLANT='all')), ['BLUE', 'RED'])
+        self.assertEqual(client.get('/api/powders/', HTTP_X_PLANT='nowhere').status_code, 404)
+
+    def test_search_is_limited_to_the_plant(self):
+        hits = self.as_user('east').get('/api/search/?q=coat').data['results']
+        self.assertEqual([(hit['type'], hit['id']) for hit in hits], [('powder', self.blue.pk)])
+        hits = self.as_user('admin').get('/api/search/?q=coat', HTTP_X_PLANT='all').data['results']
+        self.assertEqual(len(hits), 2)
+
+    def test_valuation_is_limited_to_the_plant(self):
+        client = self.as_user('east')
+        for url in ('/api/valuation/', f'/api/valuation/?as_of={timezone.localdate() + timedelta(days=1)}'):
+            response = client.get(url)
+            self.assertEqual([item['sku'] for item in response.data['items']], ['BLUE'])
+            self.assertEqual(response.data['total'], Decimal('30'))
+
+    def test_activity_and_sticker_prints_are_limited_to_the_plant(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.as_user('west').post('/api/powders/', {'name': 'Green', 'sku': 'GREEN'}, format='json')
+        activity.flush()
+        self.as_user('east').post('/api/sticker-prints/', {'label': 'Blue', 'powder': self.blue.pk}, format='json')
+        StickerPrint.objects.create(powder=self.red, label='Red')
+
+        client = self.as_user('east')
+        self.assertEqual(client.get('/api/activity/').data['results'], [])
+        self.assertEqual([p['label'] for p in client.get('/api/sticker-prints/').data], ['Blue'])
+        response = client.post('/api/sticker-prints/', {'label': 'Red', 'powder': self.red.pk}, format='json')
+        self.assertEqual(response.status_code, 403)
+        events = self.as_user('admin').get('/api/activity/', HTTP_X_PLANT='all').data['results']
+        self.assertEqual([e['resource'] for e in events], ['powder'])
+
+    def test_locations_belong_to_one_plant(self):
+        west_room = Location.objects.create(name='Storeroom')
+        client = self.as_user('east')
+        response = client.post('/api/locations/', {'name': 'Storeroom'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        east_room = Location.objects.get(pk=response.data['id'])
+        self.assertEqual(east_room.plant, self.east)
+        self.assertEqual(client.post('/api/locations/', {'name': 'Storeroom'}, format='json').status_code, 400)
+        self.assertEqual([row['id'] for row in client.get('/api/locations/').data], [east_room.pk])
+        self.assertEqual(client.patch(f'/api/locations/{west_room.pk}/', {'name': 'Mine'}, format='json').status_code,
+                         404)
+
+        response = client.post('/api/stock/move/', {
+            'powder': self.blue.pk, 'kind': 'receive', 'quantity': 1, 'location': west_room.pk,
+        }, format='json')
+        self.assertIn('location', response.data)
+        stock.move(self.blue, 2, 'receive', location=east_room)
+        response = client.post('/api/stock/transfer/', {
+            'powder': self.blue.pk, 'from_location': east_room.pk, 'to_location': west_room.pk, 'quantity': 1,
+        }, format='json')
+        self.assertIn('to_location', response.data)
+        response = client.post('/api/cycle-counts/', {
+            'location': west_room.pk, 'lines': [{'sku': 'BLUE', 'counted': 1}],
+        }, format='json')
+        self.assertIn('location', response.data)
+        with self.assertRaises(stock.StockError):
+            stock.move(self.blue, 1, 'receive', location=west_room)
+
+    def test_tasks_are_assigned_within_the_plant(self):
+        client = self.as_user('east')
+        for assignee, expected in (('west-op', 400), ('east-viewer', 201), ('boss', 201)):
+            response = client.post('/api/tasks/', {'title': 'Recoat', 'assignee': assignee}, format='json')
+            self.assertEqual(response.status_code, expected, assignee)
+
+        task = Task.objects.create(title='Sweep booth')
+        client = self.as_user('admin')
+        response = client.patch(f'/api/tasks/{task.pk}/', {'assignee': 'east-op'}, format='json', HTTP_X_PLANT='all')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('assignee', response.data)
+
+    def test_reports_are_for_admins(self):
+        self.assertEqual(self.as_user('east').get('/api/reports/').status_code, 403)
+        self.assertEqual(self.as_user('admin').get('/api/reports/').status_code, 200)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class PowderListMetricsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('viewer', password='x'))
+
+    def add_powders(self, count, start=0):
+        today = timezone.localdate()
+        for i in range(start, start + count):
+            powder = Powder.objects.create(name=f'Powder {i}', sku=f'P-{i}', price_per_kg=10)
+            stock.move(powder, 20, 'receive')
+            QCReport.objects.create(batch_id=f'B-{i}-old', powder=powder, result='Pass', date=today - timedelta(days=40))
+            QCReport.objects.create(batch_id=f'B-{i}-a', powder=powder, result='Pass', date=today - timedelta(days=5))
+            QCReport.objects.create(batch_id=f'B-{i}-b', powder=powder, result='Fail', date=today - timedelta(days=1))
+
+    def list_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/powders/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_metrics_are_annotated(self):
+        self.add_powders(1)
+        response, _ = self.list_query_count()
+        row = response.data[0]
+        self.assertEqual(row['latest_qc_result'], 'Fail')
+        self.assertEqual(row['latest_qc_date'], str(timezone.localdate() - timedelta(days=1)))
+        self.assertEqual(row['qc_count'], 2)
+        self.assertEqual(row['qc_pass_rate'], 0.5)
+        self.assertIsNotNone(row['last_movement_at'])
+        self.assertEqual(row['stock_value'], 200)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_powders(2)
+        _, few = self.list_query_count()
+        self.add_powders(25, start=2)
+        response, many = self.list_query_count()
+        self.assertEqual(len(response.data), 27)
+        self.assertEqual(few, many)
+        self.assertEqual(many, 1)
+
+    def test_powder_without_history(self):
+        Powder.objects.create(name='New', sku='NEW')
+        response, _ = self.list_query_count()
+        row = response.data[0]
+        self.assertIsNone(row['latest_qc_result'])
+        self.assertIsNone(row['qc_pass_rate'])
+        self.assertEqual(row['qc_count'], 0)
+        self.assertIsNone(row['last_movement_at'])
+        self.assertEqual(row['stock_value'], 0)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('op', password='x', role='operator'))
+        self.moment = timezone.now() - timedelta(hours=1)
+
+    def add_tasks(self, status, count):
+        """``count`` tasks, in threes sharing one created_at, so pages split ties."""
+        tasks = [Task.objects.create(title=f'{status} {i}', status=status) for i in range(count)]
+        for i, task in enumerate(tasks):
+            Task.objects.filter(pk=task.pk).update(created_at=self.moment - timedelta(minutes=i // 3))
+        return list(Task.objects.filter(status=status).order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def walk_column(self, column, cursor):
+        seen = []
+        while cursor:
+            response = self.client.get(f'/api/tasks/board/{column}/', {'cursor': cursor, 'limit': 2})
+            self.assertEqual(response.status_code, 200)
+            seen += [task['id'] for task in response.data['tasks']]
+            cursor = response.data['next']
+        return seen
+
+    def test_board_columns_page_through_every_task_once(self):
+        todo = self.add_tasks('todo', 8)
+        doing = self.add_tasks('in_progress', 5)
+        done = self.add_tasks('done', 2)
+
+        columns = {c['status']: c for c in self.client.get('/api/tasks/board/', {'limit': 2}).data['columns']}
+        self.assertEqual((columns['todo']['count'], columns['in_progress']['count']), (8, 5))
+        self.assertEqual([t['id'] for t in columns['done']['tasks']], done)
+        self.assertIsNone(columns['done']['next'])
+        self.assertEqual(columns['review'], {**columns['review'], 'count': 0, 'tasks': [], 'next': None})
+
+        # Each column continues from its own cursor, independently of the others.
+        for column, expected in (('in_progress', doing), ('todo', todo)):
+            first = [t['id'] for t in columns[column]['tasks']]
+            self.assertEqual(first + self.walk_column(column, columns[column]['next']), expected)
+
+    def test_unknown_board_column_is_not_found(self):
+        self.assertEqual(self.client.get('/api/tasks/board/archived/').status_code, 404)
+
+    def walk_feed(self, **params):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get('/api/activity/', {**params, 'limit': 2, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            seen += [event['object_id'] for event in response.data['results']]
+            cursor = response.data['next']
+            if cursor is None:
+                return seen
+
+    def test_activity_feed_pages_through_ties_within_the_plant(self):
+        east = Plant.objects.create(code='east', name='East')
+        west = Plant.objects.get(pk=default_plant_id())
+        for i in range(7):
+            ActivityEvent.objects.create(verb='created', resource='task', object_id=f'w{i}', plant=west,
+                                         created_at=self.moment - timedelta(minutes=i // 3))
+        ActivityEvent.objects.create(verb='created', resource='task', object_id='e0', plant=east, created_at=self.moment)
+        ActivityEvent.objects.create(verb='created', resource='location', object_id='shared', created_at=self.moment)
+
+        newest_first = ActivityEvent.objects.order_by('-created_at', '-id').values_list('object_id', flat=True)
+        self.assertEqual(self.walk_feed(), list(newest_first.filter(plant=west)))
+        self.client.force_authenticate(get_user_model().objects.create_user('boss', password='x', role='admin'))
+        self.assertEqual(self.walk_feed(plant='all'), list(newest_first))
+        self.assertEqual(self.walk_feed(plant='east'), ['e0'])
+
+    def test_activity_feed_rejects_an_invalid_cursor(self):
+        response = self.client.get('/api/activity/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TaskAssignmentTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.east = Plant.objects.create(code='east', name='East')
+        self.ann = User.objects.create_user('ann', password='x', role='operator')
+        self.ben = User.objects.create_user('ben', password='x', role='operator')
+        self.cat = User.objects.create_user('cat', password='x', role='operator', plant=self.east)
+        self.client = APIClient()
+        self.client.force_authenticate(self.ann)
+
+    def add(self, title, assignee=None, status='todo', priority='medium', plant=None):
+        return Task.objects.create(title=title, assignee=assignee, status=status, priority=priority,
+                                   **({'plant': plant} if plant else {})).pk
+
+    def test_mine_lists_the_users_own_tasks(self):
+        todo, doing = self.add('Todo', self.ann), self.add('Doing', self.ann, status='in_progress')
+        done = self.add('Done', self.ann, status='done')
+        self.add('Theirs', self.ben)
+        self.add('Unassigned')
+
+        self.assertEqual(sorted(t['id'] for t in self.client.get('/api/tasks/mine/').data['results']), [todo, doing])
+        self.assertEqual([t['id'] for t in self.client.get('/api/tasks/mine/', {'status': 'done'}).data['results']],
+                         [done])
+        self.assertEqual(self.client.get('/api/tasks/mine/', {'status': 'later'}).status_code, 400)
+
+    def test_workload_counts_open_tasks_per_user_in_the_plant(self):
+        self.add('A1', self.ann, priority='high')
+        self.add('A2', self.ann)
+        self.add('A3', self.ann, status='done')
+        self.add('B1', self.ben, priority='low')
+        self.add('Nobody')
+        self.add('C1', self.cat, plant=self.east)
+        self.add('C2', self.ann, plant=self.east)
+
+        rows = self.client.get('/api/tasks/workload/').data['results']
+        self.assertEqual([(r['username'], r['total'], r['high'], r['medium'], r['low']) for r in rows], [
+            ('ann', 2, 1, 1, 0), (None, 1, 0, 1, 0), ('ben', 1, 0, 0, 1),
+        ])
+
+
+class AssigneeMigrationTests(TransactionTestCase):
+    """0029 turns the free-text Task.assignee into a user foreign key."""
+    before = [('dashboard', '0028_plants')]
+    after = [('dashboard', '0029_task_assignee_user')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_names_are_resolved_to_users(self):
+        self.addCleanup(call_command, 'migrate', verbosity=0)
+        apps = self.migrate(self.before)
+        User, Task = apps.get_model(settings.AUTH_USER_MODEL), apps.get_model('dashboard', 'Task')
+        jane = User.objects.create(username='jdoe', first_name='Jane', last_name='Doe', email='jane@example.com')
+        sam = User.objects.create(username='sam', first_name='Samuel')
+        User.objects.create(username='sam2', first_name='Sam')  # "sam" is still the username
+        User.objects.create(username='alex1', first_name='Alex')
+        User.objects.create(username='alex2', first_name='Alex')
+        names = ['JDoe', ' jane doe ', 'Jane@Example.com', 'Jane', 'Sam ', 'alex', 'Nobody', '']
+        tasks = {name: Task.objects.create(title=name or 'Unassigned', assignee=name, description='Notes').pk
+                 for name in names}
+
+        Task = self.migrate(self.after).get_model('dashboard', 'Task')
+        linked = dict(Task.objects.values_list('pk', 'assignee_id'))
+        self.assertEqual([linked[tasks[name]] for name in names],
+                         [jane.pk, jane.pk, jane.pk, jane.pk, sam.pk, None, None, None])
+        # Names several users share, or nobody has, are kept in the description.
+        self.assertEqual(Task.objects.get(pk=tasks['alex']).description, 'Notes\n\nAssignee: alex')
+        self.assertEqual(Task.objects.get(pk=tasks['Nobody']).description, 'Notes\n\nAssignee: Nobody')
+        self.assertEqual(Task.objects.get(pk=tasks['']).description, 'Notes')
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0, BATCH_MAX_REQUESTS=3)
+class BatchTests(TestCase):
+    def setUp(self):
+        self.east = Plant.objects.create(code='east', name='East')
+        Powder.objects.create(name='Red', sku='RED')
+        Powder.objects.create(name='Blue', sku='BLUE', plant=self.east)
+        User = get_user_model()
+        self.admin = User.objects.create_user('boss', password='x', role='admin')
+        self.viewer = User.objects.create_user('viewer', password='x', role='viewer')
+        self.client = APIClient()
+
+    def batch(self, user, *requests, **headers):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/batch/', {'requests': list(requests)}, format='json', **headers)
+
+    def test_failing_sub_requests_do_not_fail_the_batch(self):
+        with mock.patch.object(stock, 'totals_by_sku', side_effect=RuntimeError('boom')), \
+                self.assertLogs('dashboard.batch', 'ERROR'):
+            response = self.batch(
+                self.admin,
+                {'path': '/api/stock/totals/'},
+                {'path': '/api/nowhere/'},
+                {'path': '/api/powders/', 'method': 'POST', 'body': {}},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['responses']], [500, 404, 400])
+        self.assertEqual(self.batch(self.admin, {'path': '/api/stock/totals/'}).data['responses'][0]['status'], 200)
+
+    def test_sub_requests_run_as_the_caller_in_the_callers_plant(self):
+        def skus(result):
+            return sorted(row['sku'] for row in result['body'])
+
+        response = self.batch(self.viewer, {'path': '/api/stock/totals/'}, {'path': '/api/metrics/'},
+                              {'path': '/api/stock/totals/', 'headers': {'X-Plant': 'east'}})
+        totals, metrics, other_plant = response.data['responses']
+        self.assertEqual(skus(totals), ['RED'])
+        self.assertEqual((metrics['status'], other_plant['status']), (403, 403))
+
+        response = self.batch(self.admin, {'path': '/api/stock/totals/'},
+                              {'path': '/api/stock/totals/', 'headers': {'X-Plant': 'all'}}, HTTP_X_PLANT='east')
+        self.assertEqual([skus(result) for result in response.data['responses']], [['BLUE'], ['BLUE', 'RED']])
+
+    def test_invalid_batches_are_rejected(self):
+        for requests in (
+            [],
+            [{'path': '/api/powders/'}] * 4,
+            [{'path': '/api/powders/', 'method': 'TRACE'}],
+            [{'path': '/api/batch/', 'method': 'POST', 'body': {'requests': []}}],
+            [{'path': '/api/batch/?nested=1'}],
+            [{'path': '/admin/'}],
+        ):
+            with self.subTest(requests=requests):
+                response = self.batch(self.admin, *requests)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('detail', response.data)
+        self.assertEqual(self.client.get('/api/batch/').status_code, 405)
+
+
+# The admin's own static files are not collected in tests, so no manifest.
+@override_settings(ADMIN_COUNT_LIMIT=1000, STORAGES={
+    **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class AdminChangeListTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('root', password='x', role='admin'))
+        moment = timezone.now() - timedelta(hours=1)
+        for i in range(7):
+            Task.objects.create(title=f'Task {i}', status='todo' if i % 2 else 'done')
+            QCReport.objects.create(batch_id=f'B-{i}', result='Fail' if i % 3 else 'Pass', date=timezone.localdate())
+        # Ties on created_at straddle the page boundaries.
+        for model in (Task, QCReport):
+            for i, pk in enumerate(model.objects.order_by('pk').values_list('pk', flat=True)):
+                model.objects.filter(pk=pk).update(created_at=moment - timedelta(minutes=i // 2))
+
+    def walk(self, url, params=None):
+        """Ids of every row, following the Next page links."""
+        seen, pages = [], 0
+        response = self.client.get(url, params or {})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            changelist = response.context['cl']
+            self.assertTrue(changelist.keyset)
+            seen += [row.pk for row in changelist.result_list]
+            pages += 1
+            if changelist.next_page_url is None:
+                return seen, pages
+            self.assertContains(response, 'Next page')
+            response = self.client.get(url + changelist.next_page_url)
+
+    def newest_first(self, model, **filters):
+        return list(model.objects.filter(**filters).order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+    def test_changelists_page_by_cursor(self):
+        for admin_class, model, url in ((TaskAdmin, Task, '/admin/dashboard/task/'),
+                                        (QCReportAdmin, QCReport, '/admin/dashboard/qcreport/')):
+            with self.subTest(model=model.__name__), mock.patch.object(admin_class, 'list_per_page', 3):
+                self.assertEqual(self.walk(url), (self.newest_first(model), 3))
+
+    def test_filters_carry_over_to_the_next_pages(self):
+        with mock.patch.object(TaskAdmin, 'list_per_page', 2):
+            self.assertEqual(self.walk('/admin/dashboard/task/', {'status__exact': 'done'}),
+                             (self.newest_first(Task, status='done'), 2))
+        with mock.patch.object(QCReportAdmin, 'list_per_page', 2):
+            self.assertEqual(self.walk('/admin/dashboard/qcreport/', {'result__exact': 'Fail'}),
+                             (self.newest_first(QCReport, result='Fail'), 2))
+
+    def test_sorting_by_a_column_uses_numbered_pages(self):
+        with mock.patch.object(TaskAdmin, 'list_per_page', 3):
+            response = self.client.get('/admin/dashboard/task/', {'o': '1', 'p': '2'})
+        self.assertFalse(response.context['cl'].keyset)
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+
+    def test_an_invalid_cursor_is_rejected(self):
+        response = self.client.get('/admin/dashboard/task/', {'cursor': 'nope'})
+        self.assertRedirects(response, '/admin/dashboard/task/?e=1', fetch_redirect_response=False)
+
+
+class _Receiver(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((dict(self.headers), body))
+        self.send_response(self.server.status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(WEBHOOK_BATCH_SIZE=2, WEBHOOK_MAX_ATTEMPTS=3, WEBHOOK_RETRY_BACKOFF=60)
+class WebhookTests(TestCase):
+    """Delivery against a local HTTP server standing in for the receiving system."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Receiver)
+        self.server.received = []
+        self.server.status = 200
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.endpoint = WebhookEndpoint.objects.create(
+            name='ERP', url=f'http://127.0.0.1:{self.server.server_port}/hook', events=['qc.failed', 'powder.critical'],
+        )
+
+    def fail_qc(self, count):
+        for i in range(count):
+            QCReport.objects.create(batch_id=f'B-{i}', result='Fail', date=timezone.localdate())
+
+    def test_events_are_written_to_the_outbox(self):
+        powder = Powder.objects.create(name='Red', sku='RED', current_stock=10, min_level=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            QCReport.objects.create(batch_id='OK', result='Pass', date=timezone.localdate())
+            self.fail_qc(1)
+            stock.move(powder, -4, 'consume')  # 6: still above the minimum
+            stock.move(powder, -2, 'consume')  # 4: critical
+            stock.move(powder, -1, 'consume')  # already critical
+            Task.objects.create(title='Not subscribed', status='done')
+        self.assertEqual(
+            list(WebhookDelivery.objects.order_by('id').values_list('event', flat=True)),
+            ['qc.failed', 'powder.critical'],
+        )
+        self.assertEqual(Job.objects.filter(name=webhooks.DELIVER_JOB, status='queued').count(), 1)
+
+    def test_batches_are_signed_and_delivered(self):
+        self.fail_qc(3)
+        self.assertEqual(webhooks.deliver(), {'sent': 3, 'failed': 0})
+
+        self.assertEqual(len(self.server.received), 2)  # batches of 2 and 1
+        headers, body = self.server.received[0]
+        expected = hmac.new(self.endpoint.secret.encode(), f"{headers['X-Webhook-Timestamp']}.".encode() + body,
+                            hashlib.sha256).hexdigest()
+        self.assertEqual(headers['X-Webhook-Signature'], f'sha256={expected}')
+        events = json.loads(body)['deliveries']
+        self.assertEqual([e['data']['batch_id'] for e in events], ['B-0', 'B-1'])
+        self.assertEqual(WebhookDelivery.objects.filter(status='delivered').count(), 3)
+
+    def test_failures_back_off_then_dead_letter(self):
+        self.server.status = 500
+        self.fail_qc(1)
+        self.assertEqual(webhooks.deliver(), {'sent': 0, 'failed': 1})
+        delivery = WebhookDelivery.objects.get()
+        self.assertEqual((delivery.status, delivery.attempts, delivery.last_error), ('pending', 1, 'HTTP 500'))
+        self.assertGreater(delivery.next_attempt_at, timezone.now() + timedelta(seconds=40))
+        # Not due yet: nothing is sent, and the next run is queued for the retry.
+        self.assertEqual(webhooks.deliver(), {'sent': 0, 'failed': 0})
+        self.assertEqual(len(self.server.received), 1)
+        self.assertTrue(Job.objects.filter(name=webhooks.DELIVER_JOB, status='queued').exists())
+
+        for _ in range(2):
+            webhooks.deliver(now=timezone.now() + timedelta(days=1))
+        delivery.refresh_from_db()
+        self.assertEqual((delivery.status, delivery.attempts), ('dead', 3))
+
+        self.server.status = 200
+        self.assertEqual(webhooks.redeliver(self.endpoint), 1)
+        self.assertEqual(webhooks.deliver(), {'sent': 1, 'failed': 0})
+
+
+class ScanTests(TestCase):
+    def setUp(self):
+        scanning.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('station', password='x'))
+        self.powder = Powder.objects.create(name='Red', sku='RED')
+        self.lot = Lot.objects.create(code='L-1', powder=self.powder)
+        self.bay = Location.objects.create(name='Bay 1')
+        stock.move(self.powder, 10, 'receive', location=self.bay)
+
+    def post(self, *events, key='batch-1'):
+        body = '\n'.join(json.dumps(e) for e in events) + '\n'
+        return self.client.post('/api/scan/', body, content_type='application/x-ndjson', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_lookup_resolves_lot_and_sku(self):
+        response = self.client.get('/api/scan/L-1/')
+        self.assertEqual((response.data['sku'], response.data['lot']), ('RED', 'L-1'))
+        self.assertEqual(self.client.get('/api/scan/RED/').data['lot'], None)
+        self.assertEqual(self.client.get('/api/scan/BLUE/').status_code, 404)
+
+    def test_batch_applies_each_scan_and_reports_failures(self):
+        events = (
+            {'code': 'L-1', 'action': 'consume', 'quantity': 4, 'location': self.bay.pk, 'id': 'a'},
+            {'code': 'L-1', 'action': 'consume', 'quantity': 40, 'location': self.bay.pk, 'id': 'b'},
+            {'code': 'NOPE', 'action': 'receive', 'quantity': 1, 'id': 'c'},
+            {'code': 'RED', 'action': 'receive', 'quantity': 2.5, 'id': 'd'},
+            {'code': 'RED', 'id': 'e'},
+        )
+        response = self.post(*events)
+        self.assertEqual((response.data['applied'], response.data['failed']), (3, 2))
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['ok', 'error', 'error', 'ok', 'ok'])
+        self.assertEqual(results[1]['detail'], 'Not enough RED at Bay 1.')
+        self.assertEqual(results[4]['current_stock'], 8.5)
+        self.assertEqual(StockMovement.objects.filter(lot=self.lot, kind='consume').count(), 1)
+
+        # A resent batch is replayed, not applied again.
+        self.assertEqual(self.post(*events)['Idempotent-Replayed'], 'true')
+        self.powder.refresh_from_db()
+        self.assertEqual(self.powder.current_stock, 8.5)
+
+    def test_cached_code_follows_a_renamed_sku(self):
+        self.assertIsNotNone(scanning.resolve('RED'))
+        Powder.objects.filter(pk=self.powder.pk).update(sku='RED-2')
+        self.assertIsNone(scanning.resolve('RED'))
+        self.assertEqual(scanning.resolve('RED-2')[0].pk, self.powder.pk)
+
+
+@override_settings(SNAPSHOTS_ENABLED=True, RESPONSE_CACHE_TIMEOUT=0)
+class SnapshotTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(SNAPSHOT_DIR=directory.name))
+        get_user_model().objects.create_user('viewer', password='pw', role='viewer')
+        self.client = APIClient()
+        token = self.client.post('/api/token/', {'username': 'viewer', 'password': 'pw'}, format='json').data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_publish_only_rebuilds_changed_resources(self):
+        with self.captureOnCommitCallbacks(execute=True):  # cache generations are bumped on commit
+            Powder.objects.create(name='Red', sku='RED')
+        self.assertTrue(Job.objects.filter(name=snapshots.PUBLISH_JOB, status='queued').exists())
+        self.assertEqual(snapshots.publish(), {'rendered': 5, 'written': 5})
+        self.assertEqual(snapshots.publish(), {'rendered': 0, 'written': 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(title='Recoat rack 4')
+        self.assertEqual(snapshots.publish(), {'rendered': 2, 'written': 2})  # summary and tasks board
+
+    def test_served_without_queries_and_revalidated(self):
+        Powder.objects.create(name='Red', sku='RED')
+        snapshots.publish()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/snapshots/powders/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.client.get('/api/powders/').content)
+
+        again = self.client.get('/api/snapshots/powders/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.client.get('/api/snapshots/powders/', HTTP_X_PLANT='north').status_code, 403)
+
+
+def _profiled_leaf():
+    return sum(i * i for i in range(20000))
+
+
+def _profiled_outer():
+    return _profiled_leaf() + _profiled_leaf()
+
+
+class ProfilingTests(TestCase):
+    def test_cprofile_captures_get_folded_stacks(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = Path(directory.name)
+        profiler = cProfile.Profile()
+        profiler.runcall(_profiled_outer)
+        profiler.dump_stats(root / 'capture.prof')
+        (root / 'capture.json').write_text(json.dumps({
+            'id': 'capture', 'mode': 'cprofile', 'endpoint': 'GET powder-list', 'duration': 0.1, 'sql_time': 0,
+            'queries': [], 'folded': {},
+        }))
+
+        folded = profiling.aggregate(profiling.load_captures(root))[0]['folded']
+        leaf = [stack for stack in folded if stack.endswith('(_profiled_leaf)')]
+        self.assertEqual(len(leaf), 1)
+        self.assertRegex(leaf[0], r'\(_profiled_outer\);tests\.py:\d+\(_profiled_leaf\)$')
+        own = sum(tt for (_, _, tt, _, _) in pstats.Stats(str(root / 'capture.prof')).stats.values())
+        self.assertAlmostEqual(sum(folded.values()) / 1e6, own, delta=0.001)
+
+        call_command('profile_report', dir=str(root), folded_dir=str(root / 'folded'), stdout=io.StringIO())
+        self.assertIn('(_profiled_leaf)', (root / 'folded' / 'GET_powder-list.folded').read_text())
+
+
+class FrontendServingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.dist, self.static_root = self.root / 'dist', self.root / 'staticfiles'
+        for relative, content in (
+            ('index.html', '<script src="/static/assets/index-AbC12_-x.js"></script>'),
+            ('assets/index-AbC12_-x.js', 'console.log(1)'),
+            ('logo.png', 'png'),
+            ('.vite/manifest.json', json.dumps({'index.html': {'file': 'assets/index-AbC12_-x.js'}})),
+        ):
+            for base in (self.dist, self.static_root):
+                path = base / relative
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(content)
+        self.enterContext(override_settings(FRONTEND_DIST_DIR=self.dist, STATIC_ROOT=self.static_root))
+
+    def test_vite_output_keeps_its_name_and_the_rest_is_hashed(self):
+        storage = ViteManifestStaticFilesStorage(location=self.root / 'collected')
+        storage.save('logo.png', ContentFile(b'png'))
+        self.assertEqual(storage.hashed_name('assets/index-AbC12_-x.js'), 'assets/index-AbC12_-x.js')
+        self.assertRegex(storage.hashed_name('logo.png'), r'^logo\.[0-9a-f]{12}\.png$')
+
+    def test_hashed_assets_are_immutable(self):
+        client = Client()  # WhiteNoise scans STATIC_ROOT when the middleware loads
+        response = client.get('/static/assets/index-AbC12_-x.js')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        response = client.get('/static/logo.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    @override_settings(FRONTEND_INDEX_MAX_AGE=30)
+    def test_index_is_short_lived_and_revalidated(self):
+        response = spa_index(RequestFactory().get('/tasks'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), (self.static_root / 'index.html').read_bytes())
+        self.assertIn('max-age=30', response['Cache-Control'])
+        self.assertIn('must-revalidate', response['Cache-Control'])
+        again = spa_index(RequestFactory().get('/tasks', HTTP_IF_NONE_MATCH=response['ETag']))
+        self.assertEqual(again.status_code, 304)
@@ -8,6 +8,14 @@ router.register('powders', views.PowderViewSet)
 router.register('tasks', views.TaskViewSet)
 router.register('qc-reports', views.QCReportViewSet)
 router.register('gas-records', views.GasRecordViewSet)
+router.register('jobs', views.JobViewSet, basename='job')
+router.register('locations', views.LocationViewSet)
+router.register('stock-levels', views.StockLevelViewSet, basename='stocklevel')
+router.register('lots', views.LotViewSet)
+router.register('sticker-prints', views.StickerPrintViewSet)
+router.register('cycle-counts', views.CycleCountViewSet, basename='cyclecount')
+router.register('reports', views.ReportArtifactViewSet, basename='report')
+router.register('webhooks', views.WebhookEndpointViewSet)
 
 urlpatterns = [
     # REST API (CRUD)
@@ -19,6 +27,42 @@ urlpatterns = [
     path('api/register/', views.register, name='register'),
     path('api/me/', views.me, name='me'),
 
+    # Plants
+    path('api/plants/', views.plant_list, name='plant_list'),
+    path('api/plants/rollup/', views.plant_rollup, name='plant_rollup'),
+
     # Dashboard KPIs
     path('api/dashboard-summary/', views.dashboard_summary, name='dashboard_summary'),
+
+    # Activity feed
+    path('api/activity/', views.activity_feed, name='activity_feed'),
+
+    # Stock movements
+    path('api/stock/move/', views.stock_move, name='stock_move'),
+    path('api/stock/transfer/', views.stock_transfer, name='stock_transfer'),
+    path('api/stock/totals/', views.stock_totals, name='stock_totals'),
+    path('api/stock/picking/', views.picking_list, name='picking_list'),
+
+    # Barcode scans
+    path('api/scan/', views.scan_batch, name='scan_batch'),
+    path('api/scan/<path:code>/', views.scan_lookup, name='scan_lookup'),
+
+    # Inventory valuation
+    path('api/valuation/', views.valuation_view, name='valuation'),
+
+    # Gas forecasts
+    path('api/gas/forecast/', views.gas_forecast, name='gas_forecast'),
+    path('api/gas/schedule/', views.gas_schedule, name='gas_schedule'),
+
+    # Full-text search
+    path('api/search/', views.search_view, name='search'),
+
+    # Batch requests
+    path('api/batch/', views.batch_view, name='batch'),
+
+    # Viewer snapshots
+    path('api/snapshots/<str:name>/', views.snapshot, name='snapshot'),
+
+    # Monitoring
+    path('api/metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file
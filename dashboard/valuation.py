@@ -0,0 +1,239 @@
+"""
+Inventory valuation.
+
+Every movement posted through ``dashboard.stock`` is valued as it happens:
+``apply()`` updates the powder's ``PowderValuation`` (running quantity and
+value) and, for FIFO, its open ``CostLayer`` rows, then stamps the movement
+with its cost and the resulting balances. Current valuation is a read of
+``PowderValuation``; valuation at a past date is the balance on each
+powder's last movement before that date, so nothing is replayed per request.
+
+The method is ``INVENTORY_VALUATION_METHOD``: ``average`` (weighted-average
+cost) or ``fifo``. Switching methods requires ``manage.py rebuild_valuation``.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Powder, PowderValuation, CostLayer, StockMovement
+
+METHODS = ('average', 'fifo')
+QUANTITY = Decimal('0.001')
+MONEY = Decimal('0.0001')
+# Stamped on a movement when it is valued.
+MOVEMENT_FIELDS = ['unit_cost', 'value_change', 'balance_quantity', 'balance_value']
+
+
+def method():
+    return settings.INVENTORY_VALUATION_METHOD
+
+
+def to_quantity(value):
+    """Coerce a quantity (int, float, str or Decimal) to a 3-place Decimal."""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(QUANTITY)
+
+
+def _money(value):
+    return value.quantize(MONEY)
+
+
+def _consume_layers(powder_id, quantity, fallback_cost):
+    """Take ``quantity`` from the oldest open layers; return the cost of what was taken."""
+    cost = Decimal(0)
+    left = quantity
+    layers = (
+        CostLayer.objects.select_for_update()
+        .filter(powder_id=powder_id, remaining__gt=0)
+        .order_by('received_at', 'id')
+    )
+    for layer in layers.iterator(chunk_size=50):
+        taken = min(layer.remaining, left)
+        layer.remaining -= taken
+        layer.save(update_fields=['remaining'])
+        cost += taken * layer.unit_cost
+        left -= taken
+        if left <= 0:
+            break
+    # Issuing more than the layers hold (negative stock): value the rest at
+    # the fallback cost rather than for free.
+    if left > 0:
+        cost += left * fallback_cost
+    return cost
+
+
+def _value(movement, state, price):
+    """
+    Value ``movement`` against ``state`` (its powder's locked
+    ``PowderValuation``) and advance the state; both are changed in memory
+    only. Returns the FIFO ``CostLayer`` the movement opens, if any.
+    """
+    quantity = to_quantity(movement.quantity)
+    current_cost = state.average_cost if state.average_cost is not None else Decimal(price or 0)
+    layer = None
+
+    if movement.kind == 'transfer' or quantity == 0:
+        change = Decimal(0)
+    elif quantity > 0:
+        unit_cost = Decimal(movement.unit_cost) if movement.unit_cost is not None else current_cost
+        movement.unit_cost = unit_cost.quantize(MONEY)
+        change = quantity * movement.unit_cost
+        if method() == 'fifo':
+            layer = CostLayer(
+                powder_id=movement.powder_id, movement=movement, unit_cost=movement.unit_cost,
+                quantity=quantity, remaining=quantity, received_at=movement.created_at,
+            )
+    elif method() == 'fifo':
+        change = -_consume_layers(movement.powder_id, -quantity, current_cost)
+        movement.unit_cost = (change / quantity).quantize(MONEY)
+    else:
+        movement.unit_cost = current_cost.quantize(MONEY)
+        change = quantity * movement.unit_cost
+
+    if movement.kind != 'transfer':
+        state.quantity += quantity
+        state.value += _money(change)
+    if state.quantity <= 0:
+        # Nothing left on hand: drop rounding residue so it can't skew later costs.
+        state.value = Decimal(0)
+
+    movement.value_change = _money(change)
+    movement.balance_quantity = state.quantity
+    movement.balance_value = state.value
+    return layer
+
+
+def apply(movement):
+    """
+    Value ``movement`` and update the running state of its powder.
+
+    Must run inside the transaction that posts the movement. Inbound stock
+    is valued at ``movement.unit_cost`` (the purchase cost) when given, else
+    at the current average cost, else at the powder's list price.
+    """
+    with transaction.atomic():
+        state, _ = PowderValuation.objects.select_for_update().get_or_create(powder_id=movement.powder_id)
+        price = Powder.objects.filter(pk=movement.powder_id).values_list('price_per_kg', flat=True).first()
+        layer = _value(movement, state, price)
+        if layer is not None:
+            layer.save()
+        state.save()
+        movement.save(update_fields=MOVEMENT_FIELDS)
+    return movement
+
+
+def apply_many(movements):
+    """
+    ``apply()`` for saved movements of distinct powders, with the states,
+    prices, new layers and stamped movements each read or written in one
+    query (FIFO issues still consume their layers powder by powder).
+    """
+    movements = list(movements)
+    if not movements:
+        return movements
+    ids = [movement.powder_id for movement in movements]
+    if len(set(ids)) != len(ids):
+        raise ValueError("apply_many() takes at most one movement per powder.")
+    with transaction.atomic():
+        PowderValuation.objects.bulk_create([PowderValuation(powder_id=pk) for pk in ids], ignore_conflicts=True)
+        states = PowderValuation.objects.select_for_update().in_bulk(ids)
+        prices = dict(Powder.objects.filter(pk__in=ids).values_list('pk', 'price_per_kg'))
+        layers = [_value(movement, states[movement.powder_id], prices.get(movement.powder_id)) for movement in movements]
+        CostLayer.objects.bulk_create([layer for layer in layers if layer is not None])
+        now = timezone.now()
+        for state in states.values():
+            state.updated_at = now
+        PowderValuation.objects.bulk_update(states.values(), ['quantity', 'value', 'updated_at'])
+        StockMovement.objects.bulk_update(movements, MOVEMENT_FIELDS)
+    return movements
+
+
+def current(powders=None):
+    """Per-powder valuation rows for the running state, ordered by SKU."""
+    qs = powders if powders is not None else Powder.objects.all()
+    zero = Value(Decimal(0), output_field=DecimalField(max_digits=16, decimal_places=4))
+    return (
+        qs.order_by('sku')
+        .annotate(
+            valued_quantity=Coalesce('valuation__quantity', zero),
+            value=Coalesce('valuation__value', zero),
+        )
+        .values('id', 'sku', 'name', 'valued_quantity', 'value')
+    )
+
+
+def as_of(moment, powders=None):
+    """
+    Per-powder valuation at ``moment``: the balances stamped on each powder's
+    last movement at or before it (one indexed lookup per powder).
+    """
+    qs = powders if powders is not None else Powder.objects.all()
+    last = (
+        StockMovement.objects.filter(powder=OuterRef('pk'), created_at__lte=moment)
+        .order_by('-created_at', '-id')
+    )
+    zero = Value(Decimal(0), output_field=DecimalField(max_digits=16, decimal_places=4))
+    return (
+        qs.order_by('sku')
+        .annotate(
+            valued_quantity=Coalesce(Subquery(last.values('balance_quantity')[:1]), zero),
+            value=Coalesce(Subquery(last.values('balance_value')[:1]), zero),
+        )
+        .values('id', 'sku', 'name', 'valued_quantity', 'value')
+    )
+
+
+def summarize(rows):
+    """Turn valuation rows into the API payload: items with average cost, plus the total."""
+    items = []
+    total = Decimal(0)
+    for row in rows:
+        quantity, value = row['valued_quantity'], row['value']
+        total += value
+        items.append({
+            'powder': row['id'],
+            'sku': row['sku'],
+            'name': row['name'],
+            'quantity': quantity,
+            'value': _money(value),
+            'average_cost': _money(value / quantity) if quantity > 0 else None,
+        })
+    return {'method': method(), 'total': _money(total), 'items': items}
+
+
+def rebuild(powder):
+    """
+    Recompute ``powder``'s valuation from its movement ledger.
+
+    Stock that predates the ledger (``current_stock`` not explained by
+    movements) is booked first as an opening adjustment at the list price.
+    Returns the number of movements replayed.
+    """
+    with transaction.atomic():
+        powder = Powder.objects.select_for_update().get(pk=powder.pk)
+        PowderValuation.objects.filter(powder=powder).delete()
+        CostLayer.objects.filter(powder=powder).delete()
+
+        movements = list(powder.movements.order_by('created_at', 'id'))
+        booked = sum((m.quantity for m in movements if m.kind != 'transfer'), Decimal(0))
+        opening = to_quantity(powder.current_stock) - booked
+        if opening != 0:
+            first = movements[0].created_at if movements else None
+            opening_movement = StockMovement(
+                powder=powder, kind='adjust', quantity=opening, unit_cost=powder.price_per_kg,
+                note='Opening balance',
+            )
+            if first is not None:
+                opening_movement.created_at = first - timedelta(seconds=1)
+            opening_movement.save()
+            movements.insert(0, opening_movement)
+
+        for movement in movements:
+            apply(movement)
+    return len(movements)
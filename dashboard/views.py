@@ -1,54 +1,596 @@
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, authentication_classes, parser_classes, permission_classes
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from django.db.models import Sum
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from django.db.models import Avg, Case, Count, F, FloatField, ProtectedError, Q, Sum, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.conf import settings
+from django.db import connection, transaction
 from django.contrib.auth import get_user_model
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import condition, require_GET
+
+from users.models import Plant
+from users.permissions import (
+    ALL_PLANTS, PLANT_HEADER, HasPlantAccess, IsAdmin, IsOperatorOrAdmin, plant_of, plant_scope, scope_to_plant, write_plant
+)
 
-from .models import Powder, Task, QCReport, GasRecord
+from . import (
+    activity, archive, batch, cache, counting, gas, idempotency, jobs, reports, scanning, search, snapshots,
+    stock, valuation, webhooks
+)
+from .models import (
+    Powder, Task, QCReport, GasRecord, Job, ActivityEvent, Location, StockLevel, StockMovement,
+    Lot, StickerPrint, PowderValuation, GasForecast, CycleCount, ReportArtifact, WebhookEndpoint
+)
+from .pagination import encode_cursor, get_limit, keyset_page
 from .serializers import (
     PowderSerializer, TaskSerializer, QCReportSerializer,
-    GasRecordSerializer, RegisterSerializer, UserSerializer
+    GasRecordSerializer, RegisterSerializer, UserSerializer, JobSerializer,
+    ActivityEventSerializer, LocationSerializer, StockLevelSerializer, StockMovementSerializer,
+    StockMoveSerializer, StockTransferSerializer, LotSerializer, StickerPrintSerializer,
+    GasReadingSerializer, GasForecastSerializer, CycleCountSerializer, ReportArtifactSerializer,
+    ReportRequestSerializer, PlantSerializer, WebhookEndpointSerializer, WebhookDeliverySerializer
 )
 
 User = get_user_model()
 
 
+# ═══════════════════════════════════════
+#  ViewSet Mixins
+# ═══════════════════════════════════════
+
+class CreatedByMixin:
+    """Stamp new rows with the requesting user."""
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+
+class ActivityLogMixin:
+    """Append every create/update/destroy to the server-side activity feed."""
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        activity.record(self.request.user, 'created', serializer.instance)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        activity.record(self.request.user, 'updated', serializer.instance)
+
+    def perform_destroy(self, instance):
+        pk = instance.pk
+        super().perform_destroy(instance)
+        instance.pk = pk
+        activity.record(self.request.user, 'deleted', instance)
+
+
+class PlantScopedMixin:
+    """
+    Limit the viewset to the request's plant (``users.permissions.plant_scope``)
+    and create rows in it.
+
+    ``plant_field`` is the lookup path from the model to its plant.
+    ``plant_related`` maps writable relations to the path from the related
+    object to its plant; creates and updates pointing outside the request's
+    plant are refused.
+    """
+    plant_field = 'plant'
+    plant_related = {}
+
+    def get_permissions(self):
+        return [*super().get_permissions(), HasPlantAccess()]
+
+    def get_queryset(self):
+        return scope_to_plant(super().get_queryset(), self.request, self.plant_field)
+
+    def check_plant_related(self, serializer):
+        scope = plant_scope(self.request)
+        if scope is None:
+            return
+        for name, path in self.plant_related.items():
+            obj = serializer.validated_data.get(name)
+            if obj is not None and plant_of(obj, path) != scope:
+                raise PermissionDenied(f"The {name} belongs to another plant.")
+
+    def perform_create(self, serializer):
+        self.check_plant_related(serializer)
+        if self.plant_field == 'plant':
+            serializer.validated_data['plant_id'] = write_plant(self.request)
+        super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        self.check_plant_related(serializer)
+        super().perform_update(serializer)
+
+
+class IdempotentCreateMixin:
+    """Honour the ``Idempotency-Key`` header on create (see ``dashboard.idempotency``)."""
+
+    def create(self, request, *args, **kwargs):
+        return idempotency.handle(request, lambda: super(IdempotentCreateMixin, self).create(request, *args, **kwargs))
+
+
+class CachedListMixin:
+    """
+    Serve ``list`` through the role-aware response cache (``dashboard.cache``).
+
+    ``cache_models`` are the models the list is built from; it defaults to
+    the queryset's model.
+    """
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        models = self.cache_models or (self.get_queryset().model,)
+        return cache.cached(request, models, lambda: super(CachedListMixin, self).list(request, *args, **kwargs))
+
+
+class ArchiveAwareMixin:
+    """
+    Serve archived rows alongside live ones when ``?include_archived=1``.
+
+    Archived rows are read-only and flagged ``archived: true``. The archive
+    can be narrowed with ``archived_from``/``archived_to`` (ISO dates) and is
+    capped at ``ARCHIVE_LIST_LIMIT`` rows per request.
+    """
+
+    def include_archived(self):
+        return self.request.query_params.get('include_archived') in ('1', 'true')
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if self.include_archived():
+            params = request.query_params
+            response.data = list(response.data) + archive.archived_rows(
+                self.queryset.model,
+                date_from=parse_date(params.get('archived_from', '')),
+                date_to=parse_date(params.get('archived_to', '')),
+                limit=settings.ARCHIVE_LIST_LIMIT,
+                plant=plant_scope(request),
+            )
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            row = (
+                archive.archived_row(self.queryset.model, kwargs.get('pk'), plant=plant_scope(request))
+                if self.include_archived() else None
+            )
+            if row is None:
+                raise
+            return Response(row)
+
+
 # ═══════════════════════════════════════
 #  ViewSets — Full CRUD via REST Router
 # ═══════════════════════════════════════
 
-class PowderViewSet(viewsets.ModelViewSet):
-    queryset = Powder.objects.all().order_by('-updated_at')
+class PowderViewSet(IdempotentCreateMixin, CachedListMixin, PlantScopedMixin, ActivityLogMixin, viewsets.ModelViewSet):
+    """
+    Powders with their latest QC result, 30-day QC pass rate, last movement
+    and stock value, annotated in the list query itself (one query per page).
+    """
+    queryset = Powder.objects.order_by('-updated_at')
     serializer_class = PowderSerializer
     permission_classes = [IsAuthenticated]
+    cache_models = (Powder, QCReport, StockMovement, PowderValuation)
+
+    def get_queryset(self):
+        # Re-annotated per request so the 30-day window follows the date.
+        return scope_to_plant(Powder.objects.with_metrics().order_by('-updated_at'), self.request)
+
+    # Stock typed into the powder form is booked as a movement so the
+    # valuation and ledger follow it.
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        powder = serializer.instance
+        if powder.current_stock:
+            stock.record(powder, powder.current_stock, 'receive', user=self.request.user,
+                         note='Initial stock', unit_cost=powder.price_per_kg)
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError as e:
+            names = sorted({str(obj._meta.verbose_name_plural) for obj in e.protected_objects})
+            return Response({'detail': f"The powder is still referenced by {', '.join(names)}."},
+                            status=status.HTTP_409_CONFLICT)
+
+    def perform_update(self, serializer):
+        # A typed-in stock is the difference from the stock at the time of
+        # the save, moved like any other adjustment, so a movement posted
+        # since the form was loaded is not overwritten.
+        counted = serializer.validated_data.pop('current_stock', None)
+        powder = serializer.instance
+        with transaction.atomic():
+            super().perform_update(serializer)
+            if counted is not None:
+                current = Powder.objects.select_for_update().values_list('current_stock', flat=True).get(pk=powder.pk)
+                delta = valuation.to_quantity(counted) - valuation.to_quantity(current)
+                if delta:
+                    stock.move(powder, delta, 'adjust', user=self.request.user, note='Edited on powder')
+        powder.refresh_from_db(fields=['current_stock'])
 
 
-class TaskViewSet(viewsets.ModelViewSet):
-    queryset = Task.objects.all()
+class TaskViewSet(IdempotentCreateMixin, CachedListMixin, ArchiveAwareMixin, PlantScopedMixin, ActivityLogMixin,
+                  CreatedByMixin, viewsets.ModelViewSet):
+    queryset = Task.objects.select_related('assignee')
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
 
-    def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+    @action(detail=False, methods=['get'])
+    def mine(self, request):
+        """
+        Tasks assigned to the requesting user, newest first, keyset-paginated
+        with ``?cursor=``. Open tasks unless ``?status=`` names a column.
+        """
+        tasks = self.get_queryset().filter(assignee=request.user)
+        column = request.query_params.get('status')
+        if column:
+            if column not in dict(Task.STATUS_CHOICES):
+                return Response({'status': f"Unknown status '{column}'."}, status=status.HTTP_400_BAD_REQUEST)
+            tasks = tasks.filter(status=column)
+        else:
+            tasks = tasks.filter(status__in=Task.OPEN_STATUSES)
+        rows, next_cursor = keyset_page(tasks, request.query_params.get('cursor'), get_limit(request))
+        return Response({
+            'results': self.get_serializer(rows, many=True).data,
+            'next': next_cursor,
+        })
+
+    @action(detail=False, methods=['get'])
+    def workload(self, request):
+        """Open tasks per assignee and priority, in one grouped query; ``assignee: null`` is unassigned."""
+        priorities = {key: Count('id', filter=Q(priority=key)) for key, _ in Task.PRIORITY_CHOICES}
+        rows = (
+            self.get_queryset().filter(status__in=Task.OPEN_STATUSES)
+            .values('assignee', username=F('assignee__username'))
+            .annotate(total=Count('id'), **priorities)
+            .order_by('-total', 'username')
+        )
+        return Response({'results': list(rows)})
+
+    @action(detail=False, methods=['get'])
+    def board(self, request):
+        """
+        Kanban board: per-status counts plus the newest ``?limit=`` tasks of
+        each column, in two queries regardless of how many tasks exist.
+        """
+        limit = get_limit(request, default=20, maximum=100)
+        tasks = self.get_queryset()
+
+        counts = dict(tasks.order_by().values_list('status').annotate(n=Count('id')))
+        ranked = tasks.annotate(
+            column_rank=Window(
+                RowNumber(),
+                partition_by=F('status'),
+                order_by=[F('created_at').desc(), F('id').desc()],
+            )
+        ).filter(column_rank__lte=limit).order_by('status', '-created_at', '-id')
 
+        by_status = {}
+        for task in ranked:
+            by_status.setdefault(task.status, []).append(task)
 
-class QCReportViewSet(viewsets.ModelViewSet):
+        columns = []
+        for key, label in Task.STATUS_CHOICES:
+            rows = by_status.get(key, [])
+            has_more = counts.get(key, 0) > len(rows)
+            columns.append({
+                'status': key,
+                'title': label,
+                'count': counts.get(key, 0),
+                'tasks': self.get_serializer(rows, many=True).data,
+                'next': encode_cursor(rows[-1].created_at, rows[-1].pk) if has_more else None,
+            })
+        return Response({'columns': columns})
+
+    @action(detail=False, methods=['get'], url_path=r'board/(?P<column>[a-z_]+)')
+    def board_column(self, request, column=None):
+        """Next page of one Kanban column, continuing from ``?cursor=``."""
+        if column not in dict(Task.STATUS_CHOICES):
+            return Response({'detail': f"Unknown column '{column}'."}, status=status.HTTP_404_NOT_FOUND)
+        rows, next_cursor = keyset_page(
+            self.get_queryset().filter(status=column),
+            request.query_params.get('cursor'),
+            get_limit(request, default=20, maximum=100),
+        )
+        return Response({
+            'status': column,
+            'tasks': self.get_serializer(rows, many=True).data,
+            'next': next_cursor,
+        })
+
+
+class QCReportViewSet(IdempotentCreateMixin, CachedListMixin, ArchiveAwareMixin, PlantScopedMixin, ActivityLogMixin,
+                      CreatedByMixin, viewsets.ModelViewSet):
+    """QC reports, filterable by ``?powder=<id>``, ``?lot=<code>`` and ``?result=Pass|Fail``."""
     queryset = QCReport.objects.all()
     serializer_class = QCReportSerializer
     permission_classes = [IsAuthenticated]
+    plant_related = {'powder': 'plant', 'lot': 'plant'}
 
-    def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+    def get_queryset(self):
+        qs = super().get_queryset()
+        params = self.request.query_params
+        if params.get('powder'):
+            qs = qs.filter(powder_id=params['powder'])
+        if params.get('lot'):
+            qs = qs.filter(lot__code=params['lot'])
+        if params.get('result'):
+            qs = qs.filter(result=params['result'])
+        return qs
 
 
-class GasRecordViewSet(viewsets.ModelViewSet):
+class GasRecordViewSet(IdempotentCreateMixin, CachedListMixin, ArchiveAwareMixin, PlantScopedMixin, ActivityLogMixin,
+                       CreatedByMixin, viewsets.ModelViewSet):
     queryset = GasRecord.objects.all()
     serializer_class = GasRecordSerializer
     permission_classes = [IsAuthenticated]
 
+    @action(detail=True, methods=['get', 'post'])
+    def readings(self, request, pk=None):
+        """Level history of a tank (newest first, ``?limit=``); POST logs a new reading."""
+        tank = self.get_object()
+        if request.method == 'GET':
+            rows = tank.readings.all()[:get_limit(request, default=100, maximum=1000)]
+            return Response(GasReadingSerializer(rows, many=True).data)
+
+        serializer = GasReadingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        reading = gas.record_reading(
+            tank, serializer.validated_data['level'], user=request.user,
+            recorded_at=serializer.validated_data.get('recorded_at'),
+        )
+        return Response(GasReadingSerializer(reading).data, status=status.HTTP_201_CREATED)
+
+
+class LocationViewSet(IdempotentCreateMixin, CachedListMixin, PlantScopedMixin, ActivityLogMixin, viewsets.ModelViewSet):
+    queryset = Location.objects.all()
+    serializer_class = LocationSerializer
+    permission_classes = [IsAuthenticated]
+
+
+class StockLevelViewSet(CachedListMixin, PlantScopedMixin, viewsets.ReadOnlyModelViewSet):
+    """Per-location quantities, filterable by ``?powder=`` and ``?location=``."""
+    queryset = StockLevel.objects.select_related('powder', 'location').order_by('location__name', 'powder__sku')
+    serializer_class = StockLevelSerializer
+    permission_classes = [IsAuthenticated]
+    cache_models = (StockLevel, Powder, Location)
+    plant_field = 'powder__plant'
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        for param in ('powder', 'location'):
+            if self.request.query_params.get(param):
+                qs = qs.filter(**{f'{param}_id': self.request.query_params[param]})
+        return qs
+
+
+class LotViewSet(IdempotentCreateMixin, CachedListMixin, PlantScopedMixin, ActivityLogMixin, viewsets.ModelViewSet):
+    """Lots, addressed by their code. ``?powder=<id>`` lists one powder's lots."""
+    queryset = Lot.objects.select_related('powder')
+    serializer_class = LotSerializer
+    permission_classes = [IsAuthenticated]
+    cache_models = (Lot, Powder)
+    plant_related = {'powder': 'plant'}
+    lookup_field = 'code'
+    lookup_value_regex = '[^/]+'
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.request.query_params.get('powder'):
+            qs = qs.filter(powder_id=self.request.query_params['powder'])
+        return qs
+
+    def get_object(self):
+        # Codes are unique per plant; across every plant one may be shared.
+        try:
+            return super().get_object()
+        except Lot.MultipleObjectsReturned:
+            raise ValidationError({'detail': 'This lot code exists in several plants; choose a plant.'})
+
+    @action(detail=True, methods=['get'])
+    def trace(self, request, code=None):
+        """
+        Full genealogy of a lot: receipt and consumption movements, QC
+        results and sticker prints. One indexed query per section.
+        """
+        lot = self.get_object()
+        movements = StockMovement.objects.filter(lot=lot).order_by('created_at')
+        return Response({
+            'lot': LotSerializer(lot).data,
+            'powder': PowderSerializer(lot.powder).data,
+            'receipts': StockMovementSerializer([m for m in movements if m.kind == 'receive'], many=True).data,
+            'movements': StockMovementSerializer([m for m in movements if m.kind != 'receive'], many=True).data,
+            'qc_reports': QCReportSerializer(lot.qc_reports.order_by('date'), many=True).data,
+            'sticker_prints': StickerPrintSerializer(lot.sticker_prints.all(), many=True).data,
+        })
+
+
+class StickerPrintViewSet(IdempotentCreateMixin, CachedListMixin, PlantScopedMixin, viewsets.ModelViewSet):
+    """Record of printed sticker sheets, so lots can be traced to their labels."""
+    queryset = StickerPrint.objects.all()
+    serializer_class = StickerPrintSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'head', 'options']
+    plant_related = {'powder': 'plant', 'lot': 'plant'}
+
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        serializer.validated_data['printed_by'] = self.request.user
+        super().perform_create(serializer)
+
+
+class CycleCountViewSet(PlantScopedMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Physical stock counts (see ``dashboard.counting``). POST uploads the
+    counted quantities of many SKUs and returns the variance report;
+    ``approve`` posts the adjustments. ``?status=`` filters the list.
+    """
+    serializer_class = CycleCountSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_permissions(self):
+        if self.action == 'approve':
+            return [IsAdmin(), HasPlantAccess()]
+        if self.action in ('create', 'cancel'):
+            return [IsOperatorOrAdmin(), HasPlantAccess()]
+        return super().get_permissions()
+
+    def get_queryset(self):
+        qs = scope_to_plant(CycleCount.objects.annotate(line_count=Count('lines')), self.request)
+        if self.request.query_params.get('status'):
+            qs = qs.filter(status=self.request.query_params['status'])
+        return qs
+
+    def _detail(self, count):
+        count = self.get_queryset().get(pk=count.pk)
+        return {**self.get_serializer(count).data, 'report': counting.report(count)}
+
+    def create(self, request, *args, **kwargs):
+        return idempotency.handle(request, lambda: self._create(request))
+
+    def _create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            count = counting.create(
+                data['lines'], plant=write_plant(request), location=data.get('location'), user=request.user,
+                note=data.get('note', ''),
+            )
+        except counting.CountError as e:
+            return Response({'lines': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        activity.record(request.user, 'created', count)
+        return Response(self._detail(count), status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self._detail(self.get_object()))
+
+    @action(detail=True, methods=['post'])
+    def approve(self, request, pk=None):
+        """Post every variance as a stock adjustment, atomically."""
+        try:
+            count = counting.approve(self.get_object(), user=request.user)
+        except counting.CountError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_409_CONFLICT)
+        activity.record(request.user, 'updated', count)
+        return Response(self._detail(count))
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        try:
+            count = counting.cancel(self.get_object())
+        except counting.CountError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_409_CONFLICT)
+        activity.record(request.user, 'updated', count)
+        return Response(self._detail(count))
+
+
+def _report_etag(request, pk=None):
+    return ReportArtifact.objects.filter(pk=pk).values_list('content_hash', flat=True).first()
+
+
+class ReportArtifactViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Generated periodic reports (see ``dashboard.reports``), filterable by
+    ``?kind=``, ``?period=`` and ``?format=``. Reports cover every plant, so
+    they are for admins only.
+    """
+    serializer_class = ReportArtifactSerializer
+    permission_classes = [IsAdmin]
+
+    def get_queryset(self):
+        qs = ReportArtifact.objects.all()
+        for param in ('kind', 'period', 'format'):
+            if self.request.query_params.get(param):
+                qs = qs.filter(**{param: self.request.query_params[param]})
+        return qs
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """The report file. Its name carries the content hash, so the ETag never goes stale."""
+        return self._download(request, pk=pk)
+
+    @method_decorator(condition(etag_func=_report_etag))
+    def _download(self, request, pk=None):
+        artifact = self.get_object()
+        path = reports.path_for(artifact)
+        if not path.exists():
+            raise Http404('Report file is missing; regenerate it.')
+        response = FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
+        patch_cache_control(response, private=True, max_age=settings.REPORTS_DOWNLOAD_MAX_AGE)
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdmin])
+    def generate(self, request):
+        """Queue the report for the period containing ``date``; poll the returned job."""
+        serializer = ReportRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            params = reports.clean_params(data['kind'], data['params'])
+        except reports.ReportError as e:
+            return Response({'params': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        job = jobs.enqueue(reports.GENERATE_JOB, {
+            'kind': data['kind'], 'period': data['period'], 'day': data['date'].isoformat(),
+            'format': data['format'], 'params': params, 'force': data['force'],
+        }, user=request.user, unique=True)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class WebhookEndpointViewSet(ActivityLogMixin, CreatedByMixin, viewsets.ModelViewSet):
+    """
+    Webhook subscriptions (admins only; see ``dashboard.webhooks``). The
+    signing secret is generated on create.
+    """
+    queryset = WebhookEndpoint.objects.select_related('plant')
+    serializer_class = WebhookEndpointSerializer
+    permission_classes = [IsAdmin]
+
+    @action(detail=True, methods=['get'])
+    def deliveries(self, request, pk=None):
+        """Newest deliveries of the endpoint, ``?status=pending|delivered|dead``, keyset-paginated."""
+        qs = self.get_object().deliveries.all()
+        if request.query_params.get('status'):
+            qs = qs.filter(status=request.query_params['status'])
+        rows, next_cursor = keyset_page(qs, request.query_params.get('cursor'), get_limit(request))
+        return Response({'results': WebhookDeliverySerializer(rows, many=True).data, 'next': next_cursor})
+
+    @action(detail=True, methods=['post'])
+    def redeliver(self, request, pk=None):
+        """Requeue dead-lettered deliveries: all of them, or the ids in ``{"deliveries": [...]}``."""
+        ids = request.data.get('deliveries')
+        if ids is not None and not (isinstance(ids, list) and all(isinstance(i, int) for i in ids)):
+            return Response({'deliveries': 'Expected a list of ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'requeued': webhooks.redeliver(self.get_object(), ids)})
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status and progress of background jobs. Non-admins only see their own."""
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        qs = Job.objects.all()
+        if self.request.user.role != 'admin':
+            qs = qs.filter(created_by=self.request.user)
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            qs = qs.filter(status=status_filter)
+        return qs
 
 
 # ═══════════════════════════════════════
@@ -78,13 +620,14 @@ def register(request):
 
 
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+@cache.cache_response(Powder, Task, QCReport, GasRecord)
 def dashboard_summary(request):
     """Return KPI summary data for the dashboard."""
-    powders = Powder.objects.all()
-    tasks = Task.objects.all()
-    qc_reports = QCReport.objects.all()
-    gas_records = GasRecord.objects.all()
+    powders = scope_to_plant(Powder.objects.all(), request)
+    tasks = scope_to_plant(Task.objects.all(), request)
+    qc_reports = scope_to_plant(QCReport.objects.all(), request)
+    gas_records = scope_to_plant(GasRecord.objects.all(), request)
 
     total_stock = powders.aggregate(total=Sum('current_stock'))['total'] or 0
     total_tasks = tasks.count()
@@ -105,4 +648,398 @@ def dashboard_summary(request):
         'totalInspections': total_qc,
         'totalGas': round(total_gas, 1),
         'totalTanks': gas_records.count(),
-    })
\ No newline at end of file
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+def activity_feed(request):
+    """
+    Newest-first activity feed of the request's plant, keyset-paginated with
+    ``?cursor=``. Changes to rows of no plant are only in the every-plant
+    feed.
+
+    Optional filters: ``user`` (id), ``resource`` (e.g. ``powder``),
+    ``since`` and ``until`` (ISO 8601 datetimes).
+    """
+    qs = scope_to_plant(ActivityEvent.objects.all(), request)
+    params = request.query_params
+    if params.get('user'):
+        qs = qs.filter(user_id=params['user'])
+    if params.get('resource'):
+        qs = qs.filter(resource=params['resource'])
+    for param, lookup in (('since', 'created_at__gte'), ('until', 'created_at__lt')):
+        if params.get(param):
+            value = parse_datetime(params[param])
+            if value is None:
+                return Response({param: 'Invalid datetime.'}, status=status.HTTP_400_BAD_REQUEST)
+            qs = qs.filter(**{lookup: value})
+
+    rows, next_cursor = keyset_page(qs, params.get('cursor'), get_limit(request))
+    return Response({
+        'results': ActivityEventSerializer(rows, many=True).data,
+        'next': next_cursor,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+def search_view(request):
+    """
+    Ranked full-text search across the powders, tasks and QC reports of the
+    request's plant.
+
+    ``?q=`` is required; ``?type=powder,task`` narrows the document types.
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'q': 'This parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    doc_types = [t for t in request.query_params.get('type', '').split(',') if t] or None
+    results = search.search(query, doc_types, limit=get_limit(request, default=20, maximum=100),
+                            plant=plant_scope(request))
+    return Response({'query': query, 'results': results})
+
+
+# ═══════════════════════════════════════
+#  Plants
+# ═══════════════════════════════════════
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def plant_list(request):
+    """Plants the user can pick with ``X-Plant``: every plant for admins, else their own."""
+    plants = Plant.objects.all()
+    if request.user.role != 'admin':
+        plants = plants.filter(pk=request.user.plant_id)
+    return Response(PlantSerializer(plants, many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+@cache.cache_response(Powder, Task, QCReport, GasRecord, PowderValuation)
+def plant_rollup(request):
+    """
+    Cross-plant KPIs for admins: stock, open tasks, 30-day QC pass rate and
+    gas per plant, one grouped query per table on the plant-leading indexes.
+    """
+    since = timezone.localdate() - timedelta(days=30)
+    sections = {
+        'powders': Powder.objects.values('plant').annotate(
+            skus=Count('id'), stock=Sum('current_stock'), value=Sum('valuation__value'),
+        ),
+        'tasks': Task.objects.values('plant').annotate(total=Count('id'), open=Count('id', filter=~Q(status='done'))),
+        'qc': QCReport.objects.filter(date__gte=since).values('plant').annotate(
+            inspections=Count('id'),
+            pass_rate=Avg(Case(When(result='Pass', then=Value(1.0)), default=Value(0.0), output_field=FloatField())),
+        ),
+        'gas': GasRecord.objects.values('plant').annotate(
+            tanks=Count('id'), level=Sum('current_level'), cost=Sum('cost'),
+        ),
+    }
+    by_plant = {
+        plant['id']: {**plant, **{section: {} for section in sections}}
+        for plant in PlantSerializer(Plant.objects.all(), many=True).data
+    }
+    for section, rows in sections.items():
+        for row in rows.order_by():
+            by_plant[row.pop('plant')][section] = row
+
+    def total(section, field):
+        return sum(plant[section].get(field) or 0 for plant in by_plant.values())
+
+    return Response({
+        'plants': list(by_plant.values()),
+        'totals': {
+            'skus': total('powders', 'skus'),
+            'stock': total('powders', 'stock'),
+            'value': total('powders', 'value'),
+            'open_tasks': total('tasks', 'open'),
+            'inspections': total('qc', 'inspections'),
+            'tanks': total('gas', 'tanks'),
+            'gas_cost': total('gas', 'cost'),
+        },
+    })
+
+
+# ═══════════════════════════════════════
+#  Stock Movements
+# ═══════════════════════════════════════
+
+def _check_plant(request, powder):
+    scope = plant_scope(request)
+    if scope is not None and powder.plant_id != scope:
+        raise PermissionDenied('The powder belongs to another plant.')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+@idempotency.idempotent
+def stock_move(request):
+    """Receive, consume or adjust stock, optionally at a specific location."""
+    serializer = StockMoveSerializer(data=request.data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    _check_plant(request, data['powder'])
+    try:
+        movement = stock.move(
+            data['powder'], data['quantity'], data['kind'],
+            location=data.get('location'), lot=data.get('lot'), user=request.user, note=data['note'],
+            unit_cost=data.get('unit_cost'),
+        )
+    except stock.StockError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(StockMovementSerializer(movement).data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+@idempotency.idempotent
+def stock_transfer(request):
+    """Atomically move stock of one powder between two locations."""
+    serializer = StockTransferSerializer(data=request.data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    _check_plant(request, data['powder'])
+    try:
+        movement = stock.transfer(
+            data['powder'], data['from_location'], data['to_location'], data['quantity'],
+            lot=data.get('lot'), user=request.user, note=data['note'],
+        )
+    except stock.StockError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(StockMovementSerializer(movement).data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+@cache.cache_response(Powder, StockLevel, Location)
+def stock_totals(request):
+    """Stock totals grouped ``?by=sku`` (default) or ``?by=location``."""
+    if request.query_params.get('by', 'sku') == 'location':
+        return Response(list(stock.totals_by_location(plant_scope(request))))
+    return Response(list(stock.totals_by_sku(plant_scope(request))))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+@cache.cache_response(Powder, StockLevel, Location)
+def picking_list(request):
+    """Where to pick a powder from: ``?sku=`` or ``?powder=<id>``."""
+    params = request.query_params
+    powders = scope_to_plant(Powder.objects.all(), request)
+    if params.get('sku'):
+        powder = powders.filter(sku=params['sku']).first()
+    elif params.get('powder'):
+        powder = powders.filter(pk=params['powder']).first()
+    else:
+        return Response({'detail': 'Pass ?sku= or ?powder=.'}, status=status.HTTP_400_BAD_REQUEST)
+    if powder is None:
+        return Response({'detail': 'Powder not found.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'powder': powder.pk,
+        'sku': powder.sku,
+        'locations': StockLevelSerializer(stock.picking_list(powder), many=True).data,
+    })
+
+
+# ═══════════════════════════════════════
+#  Barcode Scans
+# ═══════════════════════════════════════
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+def scan_lookup(request, code):
+    """The powder and lot a scanned sticker code points to, with current stock."""
+    match = scanning.resolve(code, plant_scope(request))
+    if match is None:
+        return Response({'detail': 'Unknown code.'}, status=status.HTTP_404_NOT_FOUND)
+    powder, lot = match
+    return Response({
+        'code': code, 'powder': powder.pk, 'sku': powder.sku, 'name': powder.name,
+        'lot': lot.code if lot else None, 'current_stock': powder.current_stock, 'plant': powder.plant_id,
+    })
+
+
+@api_view(['POST'])
+@parser_classes([scanning.NDJSONParser, JSONParser])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+@idempotency.idempotent
+def scan_batch(request):
+    """
+    Apply a batch of scan events, sent as NDJSON (``application/x-ndjson``)
+    or as JSON ``{"events": [...]}``. See ``dashboard.scanning``.
+    """
+    try:
+        events = scanning.parse_events(request.data)
+    except scanning.ScanError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    results = scanning.apply(events, plant=plant_scope(request), user=request.user)
+    failed = sum(1 for r in results if r['status'] == 'error')
+    return Response({'applied': len(results) - failed, 'failed': failed, 'results': results})
+
+
+# ═══════════════════════════════════════
+#  Inventory Valuation
+# ═══════════════════════════════════════
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+@cache.cache_response(Powder, PowderValuation, StockMovement)
+def valuation_view(request):
+    """
+    Value of stock on hand in the request's plant, total and per SKU.
+
+    ``?as_of=`` (ISO date or datetime) values stock at that moment instead;
+    a bare date means the end of that day.
+    """
+    powders = scope_to_plant(Powder.objects.all(), request)
+    raw = request.query_params.get('as_of', '')
+    if not raw:
+        return Response({'as_of': None, **valuation.summarize(valuation.current(powders))})
+
+    try:
+        day = parse_date(raw)
+        moment = datetime.combine(day, time.max) if day else parse_datetime(raw)
+    except ValueError:
+        moment = None
+    if moment is None:
+        return Response({'as_of': 'Invalid date.'}, status=status.HTTP_400_BAD_REQUEST)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return Response({'as_of': moment, **valuation.summarize(valuation.as_of(moment, powders))})
+
+
+# ═══════════════════════════════════════
+#  Gas Forecasts
+# ═══════════════════════════════════════
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+@cache.cache_response(GasForecast, GasRecord)
+def gas_forecast(request):
+    """Fitted consumption rate and predicted empty date of every tank, soonest first."""
+    forecasts = GasForecast.objects.select_related('tank').order_by(F('empty_at').asc(nulls_last=True), 'tank_id')
+    return Response(GasForecastSerializer(scope_to_plant(forecasts, request, 'tank__plant'), many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, HasPlantAccess])
+@cache.cache_response(GasForecast, GasRecord)
+def gas_schedule(request):
+    """Refill trips batching tanks that can share a delivery, over ``?days=`` ahead."""
+    try:
+        days = int(request.query_params.get('days', settings.GAS_SCHEDULE_HORIZON_DAYS))
+    except ValueError:
+        return Response({'days': 'Must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(gas.schedule(horizon_days=min(max(days, 1), 366), plant=plant_scope(request)))
+
+
+# ═══════════════════════════════════════
+#  Batch Requests
+# ═══════════════════════════════════════
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_view(request):
+    """Run several API requests in one round trip (see ``dashboard.batch``)."""
+    try:
+        items = batch.parse(request.data)
+    except batch.BatchError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'responses': batch.execute(request, items)})
+
+
+# ═══════════════════════════════════════
+#  Viewer Snapshots
+# ═══════════════════════════════════════
+
+@api_view(['GET'])
+@authentication_classes([JWTStatelessUserAuthentication])
+@permission_classes([IsAuthenticated])
+def snapshot(request, name):
+    """
+    The published snapshot ``name`` for the token's plant (admins may pick
+    one with ``X-Plant``), served from disk without a database query. 404
+    until the worker has published it; clients then fall back to the API.
+    The token's role and plant are trusted until it expires (see
+    ``SNAPSHOTS_ENABLED`` in settings).
+    """
+    claims = request.auth
+    plant = claims.get('plant')
+    requested = request.headers.get(PLANT_HEADER, '').strip()
+    if requested and requested != plant:
+        if claims.get('role') != 'admin':
+            raise PermissionDenied('You do not have access to this plant.')
+        plant = None if requested == ALL_PLANTS else requested
+    path = snapshots.path_for(plant, name)
+    if path is None or not path.exists():
+        raise Http404('Snapshot not published.')
+
+    etag = snapshots.etag(path)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        served, encoding = snapshots.variant(path, request.headers.get('Accept-Encoding', ''))
+        response = HttpResponse(served.read_bytes(), content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Accept-Encoding', 'Authorization', PLANT_HEADER))
+    return response
+
+
+# ═══════════════════════════════════════
+#  Monitoring
+# ═══════════════════════════════════════
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def metrics(request):
+    """Operational counters for this process (admins only)."""
+    return Response({'response_cache': cache.stats(), 'scan_cache': scanning.stats(), 'database': _database_stats()})
+
+
+def _database_stats():
+    stats = {'vendor': connection.vendor, 'pooled': False, 'conn_max_age': connection.settings_dict['CONN_MAX_AGE']}
+    pool = getattr(connection, 'pool', None)  # psycopg pool (Django 5.1+), else None
+    if pool is not None:
+        # pool_size/pool_available are connections held/idle; requests_num counts
+        # checkouts, requests_waiting/requests_wait_ms measure waiting for one.
+        stats.update(pooled=True, pool=pool.get_stats())
+    return stats
+
+
+# ═══════════════════════════════════════
+#  Frontend (SERVE_FRONTEND)
+# ═══════════════════════════════════════
+
+def _index_file():
+    for directory in (settings.STATIC_ROOT, settings.FRONTEND_DIST_DIR):
+        path = Path(directory) / 'index.html'
+        if path.exists():
+            return path
+    return None
+
+
+def _index_etag(request, *args, **kwargs):
+    path = _index_file()
+    if path is None:
+        return None
+    stat = path.stat()
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+@require_GET
+@condition(etag_func=_index_etag)
+def spa_index(request, *args, **kwargs):
+    """
+    The React app's ``index.html`` for any client-side route. It is short
+    lived and revalidated by ETag; the hashed assets it points to are
+    served by WhiteNoise with far-future immutable caching.
+    """
+    path = _index_file()
+    if path is None:
+        raise Http404('Frontend build not found; run the Vite build and collectstatic.')
+    response = FileResponse(path.open('rb'), content_type='text/html; charset=utf-8')
+    patch_cache_control(response, max_age=settings.FRONTEND_INDEX_MAX_AGE, must_revalidate=True, public=True)
+    return response
@@ -0,0 +1,234 @@
+"""
+Outbound webhooks.
+
+``emit()`` writes one ``WebhookDelivery`` per subscribed endpoint into the
+outbox, inside the transaction of the change that raised the event, so an
+event is stored if and only if the change commits. Nothing is sent from the
+request: a ``webhooks.deliver`` job is queued once the transaction commits,
+after ``WEBHOOK_BATCH_DELAY`` seconds so a burst of events shares it.
+
+The job POSTs due deliveries to each endpoint in batches of up to
+``WEBHOOK_BATCH_SIZE``::
+
+    {"deliveries": [{"id": 17, "event": "qc.failed", "created_at": "...", "data": {...}}]}
+
+signed with ``X-Webhook-Signature: sha256=<hex>``, the HMAC-SHA256 of
+``"<X-Webhook-Timestamp>.<body>"`` under the endpoint's secret. Receivers
+should deduplicate by delivery id: delivery is at least once. A batch that
+fails is retried with exponential backoff (``WEBHOOK_RETRY_BACKOFF`` doubled
+per attempt, capped at ``WEBHOOK_MAX_BACKOFF``); after
+``WEBHOOK_MAX_ATTEMPTS`` its deliveries are dead-lettered (status ``dead``)
+until an admin redelivers them.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+import urllib.error
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from . import jobs
+from .models import Job, WebhookDelivery, WebhookEndpoint
+
+logger = logging.getLogger(__name__)
+
+DELIVER_JOB = 'webhooks.deliver'
+
+
+# ── Events ──
+
+def emit(event, data, *, plant=None):
+    """
+    Queue ``event`` with ``data`` (a JSON-serializable dict) for every active
+    endpoint subscribed to it and to ``plant`` (an id). Returns the number of
+    deliveries written.
+    """
+    endpoints = [e for e in WebhookEndpoint.objects.filter(is_active=True) if e.wants(event, plant)]
+    if not endpoints:
+        return 0
+    payload = json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+    now = timezone.now()
+    with transaction.atomic():
+        WebhookDelivery.objects.bulk_create(
+            WebhookDelivery(endpoint=endpoint, event=event, payload=payload, created_at=now, next_attempt_at=now)
+            for endpoint in endpoints
+        )
+        transaction.on_commit(schedule_delivery)
+    return len(endpoints)
+
+
+def powder_critical(powder, quantity):
+    """Emit ``powder.critical`` if the stock change of ``quantity`` took ``powder`` to or below its minimum."""
+    powders_critical([(powder, quantity)])
+
+
+def powders_critical(changes):
+    """``powder_critical()`` for many ``(powder, quantity)`` changes, reading their stock in one query."""
+    changes = [(powder, quantity) for powder, quantity in changes]
+    if not changes:
+        return
+    rows = {
+        row['pk']: row for row in type(changes[0][0]).objects
+        .filter(pk__in=[powder.pk for powder, _ in changes])
+        .values('pk', 'current_stock', 'min_level', 'plant_id')
+    }
+    for powder, quantity in changes:
+        row = rows.get(powder.pk)
+        if row is None:
+            continue
+        stock, minimum = float(row['current_stock']), row['min_level']
+        if stock <= minimum < stock - float(quantity):
+            emit('powder.critical', {
+                'powder': powder.pk, 'sku': powder.sku, 'name': powder.name,
+                'current_stock': stock, 'min_level': minimum,
+            }, plant=row['plant_id'])
+
+
+def qc_failed(report):
+    emit('qc.failed', {
+        'qc_report': report.pk, 'batch_id': report.batch_id, 'powder': report.powder_id,
+        'powder_type': report.powder_type, 'inspector': report.inspector, 'date': report.date,
+        'notes': report.notes,
+    }, plant=report.plant_id)
+
+
+def task_completed(task):
+    emit('task.completed', {
+        'task': task.pk, 'title': task.title, 'priority': task.priority,
+        'assignee': task.assignee.username if task.assignee_id else None,
+    }, plant=task.plant_id)
+
+
+# ── Delivery ──
+
+def schedule_delivery(delay=None):
+    """
+    Queue the delivery job; events raised while one is queued share it. A
+    queued job waiting out a retry is brought forward, so one failing
+    endpoint does not hold back the others.
+    """
+    delay = settings.WEBHOOK_BATCH_DELAY if delay is None else delay
+    job = jobs.enqueue(DELIVER_JOB, unique=True, delay=delay)
+    run_after = timezone.now() + timedelta(seconds=delay)
+    if job.run_after > run_after:
+        Job.objects.filter(pk=job.pk, status='queued').update(run_after=run_after)
+    return job
+
+
+def sign(secret, timestamp, body):
+    return 'sha256=' + hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+
+
+def backoff(attempts):
+    """Seconds before retrying a batch that failed ``attempts`` times, with jitter."""
+    base = settings.WEBHOOK_RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+    return min(base, settings.WEBHOOK_MAX_BACKOFF) * random.uniform(0.8, 1.2)
+
+
+def _post(endpoint, deliveries):
+    """Send one batch. Returns None on a 2xx response, else the error."""
+    body = json.dumps({
+        'deliveries': [
+            {'id': d.pk, 'event': d.event, 'created_at': d.created_at, 'data': d.payload}
+            for d in deliveries
+        ],
+    }, cls=DjangoJSONEncoder).encode()
+    timestamp = str(int(time.time()))
+    request = urllib.request.Request(endpoint.url, data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        'User-Agent': 'metamorph-webhooks/1',
+        'X-Webhook-Timestamp': timestamp,
+        'X-Webhook-Signature': sign(endpoint.secret, timestamp, body),
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=settings.WEBHOOK_TIMEOUT) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        return f"HTTP {e.code}"
+    except (urllib.error.URLError, OSError) as e:
+        return str(getattr(e, 'reason', e))
+    return None
+
+
+def _claim(endpoint, now):
+    """
+    Take the endpoint's oldest due deliveries, leasing them by pushing their
+    next attempt past the send timeout so a concurrent run skips them. A
+    worker that dies mid-send only delays them until the lease runs out.
+    """
+    due = WebhookDelivery.objects.filter(endpoint=endpoint, status='pending', next_attempt_at__lte=now)
+    ids = list(due.order_by('id').values_list('pk', flat=True)[:settings.WEBHOOK_BATCH_SIZE])
+    lease = now + timedelta(seconds=settings.WEBHOOK_TIMEOUT * 3)
+    WebhookDelivery.objects.filter(pk__in=ids, status='pending', next_attempt_at__lte=now).update(next_attempt_at=lease)
+    return list(WebhookDelivery.objects.filter(pk__in=ids, next_attempt_at=lease).order_by('id'))
+
+
+def deliver_endpoint(endpoint, now=None):
+    """Send the endpoint's due deliveries batch by batch; stops at the first failure."""
+    sent = failed = 0
+    while True:
+        now = now or timezone.now()
+        batch = _claim(endpoint, now)
+        if not batch:
+            break
+        ids = [d.pk for d in batch]
+        error = _post(endpoint, batch)
+        now = timezone.now()
+        if error is None:
+            WebhookDelivery.objects.filter(pk__in=ids).update(status='delivered', delivered_at=now, last_error='')
+            WebhookEndpoint.objects.filter(pk=endpoint.pk).update(last_success_at=now)
+            sent += len(batch)
+            continue
+
+        # The batch is retried together, after the backoff of its oldest delivery.
+        attempts = max(d.attempts for d in batch) + 1
+        logger.warning("Webhook %s failed (attempt %s): %s", endpoint.pk, attempts, error)
+        rows = WebhookDelivery.objects.filter(pk__in=ids)
+        rows.update(attempts=F('attempts') + 1, last_error=error,
+                    next_attempt_at=now + timedelta(seconds=backoff(attempts)))
+        rows.filter(attempts__gte=settings.WEBHOOK_MAX_ATTEMPTS).update(status='dead')
+        WebhookEndpoint.objects.filter(pk=endpoint.pk).update(last_failure_at=now)
+        failed += len(batch)
+        break
+    return sent, failed
+
+
+def deliver(now=None):
+    """Send every due delivery and queue the next run for the earliest retry. Returns counts."""
+    now = now or timezone.now()
+    due = WebhookDelivery.objects.filter(status='pending', next_attempt_at__lte=now)
+    endpoints = WebhookEndpoint.objects.filter(pk__in=due.values('endpoint_id'))
+    sent = failed = 0
+    for endpoint in endpoints:
+        s, f = deliver_endpoint(endpoint, now)
+        sent, failed = sent + s, failed + f
+
+    next_at = WebhookDelivery.objects.filter(status='pending').aggregate(at=Min('next_attempt_at'))['at']
+    if next_at is not None:
+        schedule_delivery(delay=max((next_at - timezone.now()).total_seconds(), 0))
+    return {'sent': sent, 'failed': failed}
+
+
+@jobs.register(DELIVER_JOB)
+def deliver_job(job):
+    return deliver()
+
+
+def redeliver(endpoint, deliveries=None):
+    """Put dead-lettered deliveries of ``endpoint`` (or just ``deliveries``) back in the queue."""
+    rows = WebhookDelivery.objects.filter(endpoint=endpoint, status='dead')
+    if deliveries is not None:
+        rows = rows.filter(pk__in=deliveries)
+    count = rows.update(status='pending', attempts=0, next_attempt_at=timezone.now())
+    if count:
+        schedule_delivery(delay=0)
+    return count
@@ -1,6 +1,7 @@
 import { Link, useLocation } from 'react-router-dom';
 import { motion, AnimatePresence } from 'framer-motion';
 import { useAuth } from '../store/useStore';
+import { LOGO_URL } from '../utils/assets';
 
 const navItems = [
   { path: '/', label: 'Dashboard', icon: (
@@ -26,11 +27,11 @@ const navItems = [
   )},
 ];
 
-// Metamorph logo from /logo.png
+// Metamorph logo (public/logo.png)
 function MetamorphLogo({ size = 36 }) {
   return (
     <img
-      src="/logo.png"
+      src={LOGO_URL}
       alt="Metamorph"
       style={{ width: size, height: size, objectFit: 'contain', borderRadius: 6 }}
     />
@@ -2,6 +2,7 @@ import { useState } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { useAuth } from '../store/useStore';
 import { api } from '../services/api';
+import { LOGO_URL } from '../utils/assets';
 
 export default function Login() {
   const { login } = useAuth();
@@ -63,7 +64,7 @@ export default function Login() {
         <div className="text-center mb-8">
           <motion.img 
              initial={{ scale: 0.8 }} animate={{ scale: 1 }} transition={{ delay: 0.2 }}
-             src="/logo.png" alt="Metamorph Logo" className="h-16 mx-auto mb-6" 
+             src={LOGO_URL} alt="Metamorph Logo" className="h-16 mx-auto mb-6" 
           />
           <h1 className="text-3xl font-bold tracking-tight mb-2" style={{ color: 'var(--text-primary)' }}>
              {isLogin ? 'Welcome Back' : 'Create Account'}
@@ -83,6 +83,9 @@ export default function PowderStock() {
         };
 
         if (editingId) {
+            // Untouched stock is left out, so movements posted since the form opened are kept.
+            const loaded = data.find(p => p.id === editingId);
+            if (loaded && Number(loaded.current_stock) === payload.current_stock) delete payload.current_stock;
             await api.put(`/powders/${editingId}/`, payload);
             addToast('Stock entry updated!', 'success');
             logActivity(user.username, 'updated stock for', form.name, 'info');
@@ -178,13 +181,15 @@ export default function PowderStock() {
                   <th className="px-5 py-4 text-xs font-semibold uppercase tracking-wider hidden md:table-cell" style={{ color: 'var(--text-muted)' }}>Location</th>
                   <th className="px-5 py-4 text-xs font-semibold uppercase tracking-wider" style={{ color: 'var(--text-muted)' }}>Stock</th>
                   <th className="px-5 py-4 text-xs font-semibold uppercase tracking-wider" style={{ color: 'var(--text-muted)' }}>Status</th>
+                  <th className="px-5 py-4 text-xs font-semibold uppercase tracking-wider hidden lg:table-cell" style={{ color: 'var(--text-muted)' }}>QC (30d)</th>
+                  <th className="px-5 py-4 text-xs font-semibold uppercase tracking-wider hidden lg:table-cell" style={{ color: 'var(--text-muted)' }}>Value</th>
                   <th className="px-5 py-4"></th>
                 </tr>
               </thead>
               <tbody>
                 <AnimatePresence>
                   {filtered.length === 0 ? (
-                     <tr><td colSpan={7} className="px-5 py-8 text-center text-sm italic" style={{ color: 'var(--text-muted)' }}>No powders match this filter.</td></tr>
+                     <tr><td colSpan={9} className="px-5 py-8 text-center text-sm italic" style={{ color: 'var(--text-muted)' }}>No powders match this filter.</td></tr>
                   ) : (
                     filtered.map((item, i) => (
                       <motion.tr key={item.id} initial={{ opacity: 0 }} animate={{ opacity: 1 }} exit={{ opacity: 0 }}
@@ -201,6 +206,18 @@ export default function PowderStock() {
                           <span className="font-mono font-medium text-sm" style={{ color: 'var(--text-primary)' }}>{item.current_stock}</span> <span className="text-xs text-gray-500">kg</span>
                         </td>
                         <td className="px-5 py-3"><StatusBadge status={item.status} /></td>
+                        <td className="px-5 py-3 hidden lg:table-cell text-sm" title={item.latest_qc_date ? `Last QC ${item.latest_qc_date}` : 'No QC reports'}>
+                          {item.latest_qc_result ? (
+                            <span className={item.latest_qc_result === 'Pass' ? 'text-emerald-500 font-semibold' : 'text-red-500 font-semibold'}>{item.latest_qc_result}</span>
+                          ) : <span style={{ color: 'var(--text-muted)' }}>—</span>}
+                          {item.qc_pass_rate != null && (
+                            <span className="ml-2 text-xs" style={{ color: 'var(--text-muted)' }}>{Math.round(item.qc_pass_rate * 100)}% of {item.qc_count}</span>
+                          )}
+                        </td>
+                        <td className="px-5 py-3 hidden lg:table-cell text-sm font-mono" style={{ color: 'var(--text-primary)' }}
+                          title={item.last_movement_at ? `Last movement ${new Date(item.last_movement_at).toLocaleString('en-IN')}` : 'No movements'}>
+                          {item.stock_value != null ? `$${Number(item.stock_value).toLocaleString('en-IN', { maximumFractionDigits: 0 })}` : '—'}
+                        </td>
                         <td className="px-5 py-3 text-right">
                           {permissions.canDelete && (
                             <button onClick={(e) => { e.stopPropagation(); deleteEntry(item.id, item.name); }}
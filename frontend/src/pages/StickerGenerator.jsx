@@ -2,6 +2,27 @@ import { useState } from 'react';
 import { motion } from 'framer-motion';
 import { jsPDF } from 'jspdf';
 import GlassCard from '../components/GlassCard';
+import { api } from '../services/api';
+import { code128Bars, drawCode128 } from '../utils/code128';
+import { LOGO_URL } from '../utils/assets';
+
+// Scanned at the stations: the lot code when printed, else the model (SKU).
+const barcodeValue = (formData) => (formData.lot || formData.model).trim();
+
+function BarcodePreview({ value }) {
+  if (!value) return null;
+  let barcode;
+  try {
+    barcode = code128Bars(value);
+  } catch {
+    return <p className="text-[8px] text-red-500">Barcode supports plain ASCII only</p>;
+  }
+  return (
+    <svg viewBox={`0 0 ${barcode.modules} 20`} preserveAspectRatio="none" className="w-full h-6">
+      {barcode.bars.map(([offset, width]) => <rect key={offset} x={offset} y={0} width={width} height={20} fill="#000" />)}
+    </svg>
+  );
+}
 
 export default function StickerGenerator() {
   const [formData, setFormData] = useState({
@@ -10,6 +31,7 @@ export default function StickerGenerator() {
     owner: '',
     shade: '',
     pcs: '',
+    lot: '',
     bundles: 1
   });
 
@@ -50,6 +72,7 @@ export default function StickerGenerator() {
       const STICKER_HEIGHT = USABLE_HEIGHT / ROWS; // ~46.16mm
       
       const PADDING = 3;
+      const BARCODE_HEIGHT = 6;
 
       let stickersCreated = 0;
       const totalStickers = parseInt(formData.bundles, 10) || 1;
@@ -76,7 +99,7 @@ export default function StickerGenerator() {
         });
       };
 
-      const logoData = await loadImage('/logo.png');
+      const logoData = await loadImage(LOGO_URL);
 
       while (stickersCreated < totalStickers) {
         if (stickersCreated > 0 && stickersCreated % STICKERS_PER_PAGE === 0) {
@@ -124,8 +147,8 @@ export default function StickerGenerator() {
         doc.line(contentX, separatorY, x + STICKER_WIDTH - PADDING, separatorY);
 
         // 4. Text Area
-        const textStartY = separatorY + 4; // Start slightly below separator
-        doc.setFontSize(9);
+        const textStartY = separatorY + 3.5; // Start slightly below separator
+        doc.setFontSize(8);
         doc.setFont('helvetica', 'normal');
         doc.setTextColor(0);
 
@@ -135,21 +158,33 @@ export default function StickerGenerator() {
           `OWNER  : ${formData.owner}`,
           `SHADE  : ${formData.shade}`,
           `PCS    : ${formData.pcs}`,
-          `BUNDLE : ${bundleNo}/${totalStickers}`
+          `BUNDLE : ${bundleNo}/${totalStickers}`,
+          ...(formData.lot ? [`LOT    : ${formData.lot}`] : [])
         ];
 
-        const lineHeight = 4.5;
+        const lineHeight = 3.6;
         textLines.forEach((text, i) => {
           doc.text(text, contentX, textStartY + (i * lineHeight));
         });
 
+        // 5. Barcode (bottom), for the scan stations
+        drawCode128(doc, barcodeValue(formData), x + 1, y + STICKER_HEIGHT - BARCODE_HEIGHT - 1.5,
+          STICKER_WIDTH - 2, BARCODE_HEIGHT);
+
         stickersCreated++;
       }
 
       doc.save(`Metamorph_Stickers_${formData.model || 'Export'}.pdf`);
+
+      // Record the print so the lot's traceability report lists its labels.
+      api.post('/sticker-prints/', {
+        lot: formData.lot || null,
+        label: `${formData.model} ${formData.shade}`.trim(),
+        copies: totalStickers,
+      }).catch(() => {});
     } catch (err) {
       console.error("Error generating PDF:", err);
-      alert("Failed to generate PDF. Check console for details.");
+      alert(`Failed to generate PDF: ${err.message}`);
     } finally {
       setIsGenerating(false);
     }
@@ -192,6 +227,11 @@ export default function StickerGenerator() {
               <input type="text" name="owner" value={formData.owner} onChange={handleChange} placeholder="e.g. METAMORPH" className="glass-input" />
             </div>
 
+            <div>
+              <label className="block text-xs font-semibold mb-1" style={{ color: 'var(--text-muted)' }}>LOT / BATCH ID (OPTIONAL)</label>
+              <input type="text" name="lot" value={formData.lot} onChange={handleChange} placeholder="e.g. B-2024-117" className="glass-input" />
+            </div>
+
             <div className="grid grid-cols-2 gap-4">
               <div>
                 <label className="block text-xs font-semibold mb-1" style={{ color: 'var(--text-muted)' }}>SHADE</label>
@@ -248,19 +288,22 @@ export default function StickerGenerator() {
             >
               <div className="p-3 h-full flex flex-col">
                 <div className="h-10 mb-2 flex items-center">
-                  <img src="/logo.png" alt="Metamorph" style={{ height: 28, objectFit: 'contain' }} />
+                  <img src={LOGO_URL} alt="Metamorph" style={{ height: 28, objectFit: 'contain' }} />
                 </div>
                 
-                <div className="border-b border-gray-300 w-full mb-3" />
+                <div className="border-b border-gray-300 w-full mb-2" />
                 
-                <div className="flex-1 space-y-1 font-mono text-black text-[9px] leading-tight">
+                <div className="flex-1 space-y-0.5 font-mono text-black text-[8px] leading-tight">
                   <div className="flex"><span className="w-14">MODEL</span><span className="mr-1">:</span> <span className="font-bold truncate">{formData.model || '__________'}</span></div>
                   <div className="flex"><span className="w-14">SIZE</span><span className="mr-1">:</span> <span className="font-bold truncate">{formData.size || '__________'}</span></div>
                   <div className="flex"><span className="w-14">OWNER</span><span className="mr-1">:</span> <span className="font-bold truncate">{formData.owner || '__________'}</span></div>
                   <div className="flex"><span className="w-14">SHADE</span><span className="mr-1">:</span> <span className="font-bold truncate">{formData.shade || '__________'}</span></div>
                   <div className="flex"><span className="w-14">PCS</span><span className="mr-1">:</span> <span className="font-bold truncate">{formData.pcs || '__________'}</span></div>
                   <div className="flex"><span className="w-14">BUNDLE</span><span className="mr-1">:</span> <span className="font-bold truncate">1/{formData.bundles || 1}</span></div>
+                  {formData.lot && <div className="flex"><span className="w-14">LOT</span><span className="mr-1">:</span> <span className="font-bold truncate">{formData.lot}</span></div>}
                 </div>
+
+                <BarcodePreview value={barcodeValue(formData)} />
               </div>
             </motion.div>
           </div>
@@ -269,7 +312,8 @@ export default function StickerGenerator() {
             <strong>Printing Instructions:</strong><br />
             1. Use A4 Sticker Paper.<br />
             2. Print at <strong>100% scale / Actual Size</strong>. Do NOT select "Fit to page".<br />
-            3. The PDF has built-in 10mm margins explicitly designed for your 4x6 label die-cuts.
+            3. The PDF has built-in 10mm margins explicitly designed for your 4x6 label die-cuts.<br />
+            4. The barcode holds the lot ID (or the model when no lot is given) for the scan stations.
           </div>
         </div>
       </div>
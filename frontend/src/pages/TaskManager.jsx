@@ -64,7 +64,7 @@ function TaskCard({ task, overlay, onDelete }) {
   return card;
 }
 
-function Column({ id, title, color, tasks, onDelete }) {
+function Column({ id, title, color, tasks, count, hasMore, onLoadMore, onDelete }) {
   const { setNodeRef } = useDroppable({ id });
   return (
     <GlassCard className="flex flex-col h-full !p-3">
@@ -73,12 +73,17 @@ function Column({ id, title, color, tasks, onDelete }) {
           <div className="w-2.5 h-2.5 rounded-full" style={{ background: color, boxShadow: `0 0 8px ${color}80` }} />
           <h3 className="font-bold text-sm uppercase tracking-wider text-gray-700 dark:text-gray-300">{title}</h3>
         </div>
-        <span className="text-xs font-bold font-mono px-2 py-0.5 rounded-full bg-black/10 dark:bg-white/10" style={{ color: 'var(--text-muted)' }}>{tasks.length}</span>
+        <span className="text-xs font-bold font-mono px-2 py-0.5 rounded-full bg-black/10 dark:bg-white/10" style={{ color: 'var(--text-muted)' }}>{count ?? tasks.length}</span>
       </div>
       <div ref={setNodeRef} className="flex-1 min-h-[150px] p-2 rounded-xl transition-colors" style={{ background: 'var(--surface-hover)' }}>
         <SortableContext items={tasks.map(t => t.id.toString())} strategy={verticalListSortingStrategy}>
           {tasks.map(task => <TaskCard key={task.id} task={task} onDelete={onDelete} />)}
         </SortableContext>
+        {hasMore && (
+          <button onClick={() => onLoadMore(id)} className="w-full text-xs font-medium py-2 rounded-lg hover:bg-black/5 dark:hover:bg-white/5 transition-colors" style={{ color: 'var(--text-muted)' }}>
+            Load more
+          </button>
+        )}
       </div>
     </GlassCard>
   );
@@ -86,6 +91,7 @@ function Column({ id, title, color, tasks, onDelete }) {
 
 export default function TaskManager() {
   const [tasks, setTasks] = useState([]);
+  const [columnMeta, setColumnMeta] = useState({});
   const [loading, setLoading] = useState(true);
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [newTask, setNewTask] = useState(emptyTask);
@@ -104,8 +110,9 @@ export default function TaskManager() {
   const fetchTasks = async () => {
     try {
       setLoading(true);
-      const data = await api.get('/tasks/');
-      setTasks(data);
+      const data = await api.get('/tasks/board/');
+      setTasks(data.columns.flatMap(col => col.tasks));
+      setColumnMeta(Object.fromEntries(data.columns.map(col => [col.status, { count: col.count, next: col.next }])));
     } catch (err) {
       addToast('Failed to load tasks', 'danger');
     } finally {
@@ -113,6 +120,24 @@ export default function TaskManager() {
     }
   };
 
+  const loadMore = async (status) => {
+    const cursor = columnMeta[status]?.next;
+    if (!cursor) return;
+    try {
+      const data = await api.get(`/tasks/board/${status}/?cursor=${cursor}`);
+      setTasks(prev => [...prev, ...data.tasks.filter(t => !prev.some(p => p.id === t.id))]);
+      setColumnMeta(prev => ({ ...prev, [status]: { ...prev[status], next: data.next } }));
+    } catch (err) {
+      addToast('Failed to load more tasks', 'danger');
+    }
+  };
+
+  const shiftCount = (from, to) => setColumnMeta(prev => ({
+    ...prev,
+    [from]: { ...prev[from], count: (prev[from]?.count ?? 1) - 1 },
+    [to]: { ...prev[to], count: (prev[to]?.count ?? 0) + 1 },
+  }));
+
   const handleDragStart = (e) => setActiveId(e.active.id);
 
   const handleDragEnd = async (event) => {
@@ -138,13 +163,16 @@ export default function TaskManager() {
     if (targetStatus && targetStatus !== tasks[taskIndex].status) {
       // Optimistic UI update
       const prevTasks = [...tasks];
+      const prevMeta = columnMeta;
       setTasks(prev => prev.map(t => t.id.toString() === taskId.toString() ? { ...t, status: targetStatus } : t));
+      shiftCount(tasks[taskIndex].status, targetStatus);
       
       try {
         await api.put(`/tasks/${taskId}/`, { ...tasks[taskIndex], status: targetStatus });
         logActivity(user.username, `moved task to ${targetStatus}`, tasks[taskIndex].title, 'info');
       } catch (err) {
         setTasks(prevTasks); // Revert
+        setColumnMeta(prevMeta);
         addToast('Failed to move task', 'danger');
       }
     }
@@ -161,7 +189,7 @@ export default function TaskManager() {
       setNewTask(emptyTask);
       fetchTasks();
     } catch (err) {
-      addToast('Failed to create task', 'danger');
+      addToast(err.message || 'Failed to create task', 'danger');
     }
   };
 
@@ -205,7 +233,8 @@ export default function TaskManager() {
             <DndContext sensors={sensors} collisionDetection={closestCenter} onDragStart={handleDragStart} onDragEnd={handleDragEnd}>
               {COLUMNS.map(col => (
                 <div key={col.id} className="flex-1 min-w-[280px]">
-                  <Column id={col.id} title={col.title} color={col.color} tasks={tasks.filter(t => t.status === col.id)} onDelete={deleteTask} />
+                  <Column id={col.id} title={col.title} color={col.color} tasks={tasks.filter(t => t.status === col.id)}
+                    count={columnMeta[col.id]?.count} hasMore={Boolean(columnMeta[col.id]?.next)} onLoadMore={loadMore} onDelete={deleteTask} />
                 </div>
               ))}
               <DragOverlay>
@@ -226,7 +255,7 @@ export default function TaskManager() {
                    <option value="low">Low Priority</option><option value="medium">Medium Priority</option><option value="high">High Priority</option>
                  </select>
               </div>
-              <div><label className="block text-xs font-semibold mb-1 uppercase" style={{ color: 'var(--text-muted)' }}>Assignee</label><input type="text" value={newTask.assignee} onChange={e => setNewTask({...newTask, assignee: e.target.value})} className="w-full bg-black/5 dark:bg-white/5 border rounded-lg px-3 py-2 text-sm focus:outline-orange-500" style={{ borderColor: 'var(--divider)', color: 'var(--text-primary)' }} placeholder="e.g. John Doe" /></div>
+              <div><label className="block text-xs font-semibold mb-1 uppercase" style={{ color: 'var(--text-muted)' }}>Assignee</label><input type="text" value={newTask.assignee} onChange={e => setNewTask({...newTask, assignee: e.target.value})} className="w-full bg-black/5 dark:bg-white/5 border rounded-lg px-3 py-2 text-sm focus:outline-orange-500" style={{ borderColor: 'var(--divider)', color: 'var(--text-primary)' }} placeholder="Username, e.g. jdoe" /></div>
            </div>
            <button onClick={createTask} className="w-full bg-orange-500 hover:bg-orange-600 text-white font-medium py-2.5 rounded-lg text-sm mt-4 transition-colors">Create Task in Backlog</button>
         </div>
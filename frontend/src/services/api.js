@@ -7,12 +7,38 @@ const getAuthHeaders = () => {
     return token ? { 'Authorization': `Bearer ${token}` } : {};
 };
 
+// Admins can switch plants (a plant code, or 'all'); everyone else is
+// always served their own plant.
+const getPlantHeaders = () => {
+    const plant = localStorage.getItem('mm_plant');
+    return plant ? { 'X-Plant': plant } : {};
+};
+
+function errorMessage(data) {
+    // DRF validation errors look like {"username": ["A user with that username already exists."]}
+    let message = 'API Error';
+    if (data.detail) message = data.detail;
+    else if (data.error) message = data.error;
+    else if (data.message) message = data.message;
+    else if (typeof data === 'object' && Object.keys(data).length > 0) {
+        // Grab the first array string from field validation errors
+        const firstKey = Object.keys(data)[0];
+        if (Array.isArray(data[firstKey])) {
+            message = data[firstKey][0];
+        } else if (typeof data[firstKey] === 'string') {
+            message = data[firstKey];
+        }
+    }
+    return message;
+}
+
 async function fetchApi(endpoint, options = {}) {
     const url = endpoint.startsWith('http') ? endpoint : `${API_URL}${endpoint}`;
     
     const headers = {
         'Content-Type': 'application/json',
         ...getAuthHeaders(),
+        ...getPlantHeaders(),
         ...options.headers,
     };
 
@@ -36,21 +62,7 @@ async function fetchApi(endpoint, options = {}) {
         const data = text ? JSON.parse(text) : {};
 
         if (!response.ok) {
-            // DRF validation errors look like {"username": ["A user with that username already exists."]}
-            let errorMessage = 'API Error';
-            if (data.detail) errorMessage = data.detail;
-            else if (data.error) errorMessage = data.error;
-            else if (data.message) errorMessage = data.message;
-            else if (typeof data === 'object' && Object.keys(data).length > 0) {
-                // Grab the first array string from field validation errors
-                const firstKey = Object.keys(data)[0];
-                if (Array.isArray(data[firstKey])) {
-                    errorMessage = data[firstKey][0];
-                } else if (typeof data[firstKey] === 'string') {
-                    errorMessage = data[firstKey];
-                }
-            }
-            throw new Error(errorMessage);
+            throw new Error(errorMessage(data));
         }
 
         return data;
@@ -60,9 +72,104 @@ async function fetchApi(endpoint, options = {}) {
     }
 }
 
+const newIdempotencyKey = () =>
+    (window.crypto && window.crypto.randomUUID)
+        ? window.crypto.randomUUID()
+        : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+const POST_RETRIES = 3;
+
+// Creates carry an Idempotency-Key so a retry after a dropped connection
+// replays the first response instead of creating a duplicate row. Only
+// network failures are retried; the key stays the same across attempts.
+async function postIdempotent(endpoint, body) {
+    const options = {
+        method: 'POST',
+        body: JSON.stringify(body),
+        headers: { 'Idempotency-Key': newIdempotencyKey() },
+    };
+    for (let attempt = 1; ; attempt++) {
+        try {
+            return await fetchApi(endpoint, options);
+        } catch (error) {
+            if (!(error instanceof TypeError) || attempt >= POST_RETRIES) throw error;
+            await new Promise(resolve => setTimeout(resolve, 500 * 2 ** (attempt - 1)));
+        }
+    }
+}
+
+// GETs issued in the same tick (e.g. every widget loading on page open) are
+// sent together as one POST /batch/ instead of one round trip each.
+const API_PATH = new URL(API_URL, window.location.origin).pathname.replace(/\/$/, '');
+const MAX_BATCH = 20; // BATCH_MAX_REQUESTS on the server
+let pendingGets = [];
+
+function flushGets() {
+    const queued = pendingGets;
+    pendingGets = [];
+    if (queued.length === 0) return;
+    if (queued.length === 1) {
+        const [{ endpoint, resolve, reject }] = queued;
+        fetchApi(endpoint).then(resolve, reject);
+        return;
+    }
+    fetchApi('/batch/', {
+        method: 'POST',
+        body: JSON.stringify({
+            requests: queued.map(({ endpoint }) => ({ method: 'GET', path: `${API_PATH}${endpoint}` })),
+        }),
+    }).then(
+        ({ responses }) => queued.forEach(({ resolve, reject }, i) => {
+            const { status, body } = responses[i];
+            if (status >= 200 && status < 300) resolve(body);
+            else reject(new Error(errorMessage(body || {})));
+        }),
+        (error) => queued.forEach(({ reject }) => reject(error)),
+    );
+}
+
+function batchedGet(endpoint) {
+    if (endpoint.startsWith('http')) return fetchApi(endpoint);
+    return new Promise((resolve, reject) => {
+        pendingGets.push({ endpoint, resolve, reject });
+        if (pendingGets.length === 1) setTimeout(flushGets, 0);
+        else if (pendingGets.length >= MAX_BATCH) flushGets();
+    });
+}
+
+// Viewers read these pages from snapshots the server publishes after each
+// change (no database work per load); unpublished ones fall back to the API.
+const SNAPSHOTS = {
+    '/dashboard-summary/': 'summary',
+    '/powders/': 'powders',
+    '/tasks/board/': 'tasks-board',
+    '/qc-reports/': 'qc-reports',
+    '/gas-records/': 'gas-records',
+};
+
+function tokenClaims() {
+    const token = localStorage.getItem('mm_access_token');
+    try {
+        return JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+    } catch {
+        return {};
+    }
+}
+
+async function snapshotGet(endpoint) {
+    // Revalidated by ETag through the browser cache; unchanged pages are a 304.
+    const response = await fetch(`${API_URL}/snapshots/${SNAPSHOTS[endpoint]}/`, {
+        headers: { ...getAuthHeaders(), ...getPlantHeaders() },
+    }).catch(() => null);
+    if (!response || !response.ok) return batchedGet(endpoint);
+    return response.json();
+}
+
 export const api = {
-    get: (endpoint) => fetchApi(endpoint),
-    post: (endpoint, body) => fetchApi(endpoint, { method: 'POST', body: JSON.stringify(body) }),
+    get: (endpoint) => (SNAPSHOTS[endpoint] && tokenClaims().role === 'viewer')
+        ? snapshotGet(endpoint)
+        : batchedGet(endpoint),
+    post: (endpoint, body) => postIdempotent(endpoint, body),
     put: (endpoint, body) => fetchApi(endpoint, { method: 'PUT', body: JSON.stringify(body) }),
     delete: (endpoint) => fetchApi(endpoint, { method: 'DELETE' }),
     
@@ -86,7 +193,15 @@ export const api = {
     
     logout: () => {
         localStorage.removeItem('mm_access_token');
+        localStorage.removeItem('mm_plant');
     },
 
-    getMe: () => fetchApi('/me/')
+    getMe: () => batchedGet('/me/'),
+
+    getPlants: () => batchedGet('/plants/'),
+
+    setPlant: (code) => {
+        if (code) localStorage.setItem('mm_plant', code);
+        else localStorage.removeItem('mm_plant');
+    },
 };
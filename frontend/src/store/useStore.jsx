@@ -124,16 +124,38 @@ export function useAuth() {
   return useContext(AuthContext);
 }
 
-// UI notifications hook (local only)
-export function useActivityFeed() {
-  const [feed, setFeed] = usePersistedState('activityFeed', []);
+// Activity feed (server-side event log; logActivity only updates the local view
+// until the next fetch, since the API records every write itself)
+const VERB_TYPES = { created: 'success', updated: 'info', deleted: 'danger' };
+const RESOURCE_LABELS = { powder: 'powder', task: 'task', qcreport: 'QC report', gasrecord: 'gas record', cyclecount: 'cycle count', webhookendpoint: 'webhook' };
+
+function toFeedEntry(event) {
+  return {
+    id: event.id, user: event.username || 'system',
+    action: `${event.verb} ${RESOURCE_LABELS[event.resource] || event.resource}`,
+    target: event.object_repr, type: VERB_TYPES[event.verb] || 'info',
+    time: new Date(event.created_at).toLocaleTimeString('en-IN', { hour: '2-digit', minute: '2-digit' }),
+  };
+}
+
+export function useActivityFeed(limit = 20) {
+  const [feed, setFeed] = useState([]);
+
+  useEffect(() => {
+    let cancelled = false;
+    api.get(`/activity/?limit=${limit}`)
+      .then((data) => { if (!cancelled) setFeed(data.results.map(toFeedEntry)); })
+      .catch(() => {});
+    return () => { cancelled = true; };
+  }, [limit]);
+
   const logActivity = useCallback((user, action, target, type = 'info') => {
     const entry = {
-      id: Date.now(), user, action, target, type,
+      id: `local-${Date.now()}`, user, action, target, type,
       time: new Date().toLocaleTimeString('en-IN', { hour: '2-digit', minute: '2-digit' }),
     };
-    setFeed((prev) => [entry, ...prev].slice(0, 50));
-  }, [setFeed]);
+    setFeed((prev) => [entry, ...prev].slice(0, limit));
+  }, [limit]);
   return { feed, logActivity };
 }
 
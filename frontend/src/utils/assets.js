@@ -0,0 +1,3 @@
+// Files in public/ are served under the build's base ('/static/' when Django
+// serves the app), so their URLs are built from it rather than the site root.
+export const LOGO_URL = `${import.meta.env.BASE_URL}logo.png`;
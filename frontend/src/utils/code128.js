@@ -0,0 +1,53 @@
+// Code 128 (set B) barcodes for sticker labels, read back by POST /api/scan/.
+// Each pattern lists bar/space widths in modules, starting with a bar.
+const PATTERNS = [
+  '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212',
+  '221213', '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221',
+  '223211', '221132', '221231', '213212', '223112', '312131', '311222', '321122', '321221',
+  '312212', '322112', '322211', '212123', '212321', '232121', '111323', '131123', '131321',
+  '112313', '132113', '132311', '211313', '231113', '231311', '112133', '112331', '132131',
+  '113123', '113321', '133121', '313121', '211331', '231131', '213113', '213311', '213131',
+  '311123', '311321', '331121', '312113', '312311', '332111', '314111', '221411', '431111',
+  '111224', '111422', '121124', '121421', '141122', '141221', '112214', '112412', '122114',
+  '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111', '111242',
+  '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+  '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311',
+  '113141', '114131', '311141', '411131', '211412', '211214', '211232', '2331112',
+];
+const START_B = 104;
+const STOP = 106;
+export const QUIET_ZONE = 10; // modules of white on each side
+
+// Bar/space widths (in modules) encoding `text`; printable ASCII only.
+export function code128(text) {
+  const values = [START_B];
+  for (const ch of String(text)) {
+    const code = ch.charCodeAt(0);
+    if (code < 32 || code > 126) {
+      throw new Error(`Cannot encode "${ch}" in a barcode.`);
+    }
+    values.push(code - 32);
+  }
+  const checksum = values.reduce((sum, value, i) => sum + value * Math.max(i, 1), 0) % 103;
+  values.push(checksum, STOP);
+  return values.flatMap(value => PATTERNS[value].split('').map(Number));
+}
+
+// Bars as [offset, width] pairs, in modules from the left edge of the quiet zone.
+export function code128Bars(text) {
+  const bars = [];
+  let offset = QUIET_ZONE;
+  code128(text).forEach((width, i) => {
+    if (i % 2 === 0) bars.push([offset, width]);
+    offset += width;
+  });
+  return { bars, modules: offset + QUIET_ZONE };
+}
+
+// Draw `text` as a barcode filling the given box of a jsPDF document.
+export function drawCode128(doc, text, x, y, width, height) {
+  const { bars, modules } = code128Bars(text);
+  const module = width / modules;
+  doc.setFillColor(0, 0, 0);
+  bars.forEach(([offset, w]) => doc.rect(x + offset * module, y, w * module, height, 'F'));
+}
@@ -1,7 +1,13 @@
 import { defineConfig } from 'vite';
 
 export default defineConfig({
+  // '/static/' when Django serves the build (SERVE_FRONTEND); '/' for the static site.
+  base: process.env.VITE_BASE || '/',
   plugins: [
     (await import('@vitejs/plugin-react')).default(),
   ],
+  build: {
+    // Read by collectstatic so Vite's already-hashed files are not hashed again.
+    manifest: true,
+  },
 });
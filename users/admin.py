@@ -1,18 +1,23 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CustomUser, Plant
+
+@admin.register(Plant)
+class PlantAdmin(admin.ModelAdmin):
+    list_display = ['code', 'name', 'created_at']
+    search_fields = ['code', 'name']
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
-    list_display = ['username', 'email', 'role', 'department', 'is_staff']
-    list_filter = ['role', 'department', 'is_staff']
+    list_display = ['username', 'email', 'role', 'plant', 'department', 'is_staff']
+    list_filter = ['role', 'plant', 'department', 'is_staff']
     fieldsets = UserAdmin.fieldsets + (
         ('Profile Information', {
-            'fields': ('role', 'department', 'phone')
+            'fields': ('role', 'plant', 'department', 'phone')
         }),
     )
     add_fieldsets = UserAdmin.add_fieldsets + (
         ('Profile Information', {
-            'fields': ('role', 'department', 'phone', 'email')
+            'fields': ('role', 'plant', 'department', 'phone', 'email')
         }),
     )
\ No newline at end of file
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_default_plant(apps, schema_editor):
+    """Everything so far belongs to one plant; its operators and viewers are scoped to it."""
+    Plant = apps.get_model('users', 'Plant')
+    CustomUser = apps.get_model('users', 'CustomUser')
+    plant, _ = Plant.objects.get_or_create(code=settings.DEFAULT_PLANT_CODE, defaults={'name': 'Main plant'})
+    CustomUser.objects.exclude(role='admin').update(plant=plant)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Plant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(max_length=20, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['code'],
+            },
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='plant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='users', to='users.plant'),
+        ),
+        migrations.RunPython(create_default_plant, migrations.RunPython.noop),
+    ]
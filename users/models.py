@@ -1,6 +1,27 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+
+class Plant(models.Model):
+    """A coating plant. Powders, tasks, QC reports and gas tanks each belong to one."""
+    code = models.SlugField(max_length=20, unique=True)
+    name = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['code']
+
+    def __str__(self):
+        return self.name
+
+
+def default_plant_id():
+    """The ``DEFAULT_PLANT_CODE`` plant, for rows created without one (e.g. single-plant installs)."""
+    plant, _ = Plant.objects.get_or_create(code=settings.DEFAULT_PLANT_CODE, defaults={'name': 'Main plant'})
+    return plant.pk
+
+
 class CustomUser(AbstractUser):
     ROLE_CHOICES = (
         ('admin', 'Admin'),
@@ -11,10 +32,18 @@ class CustomUser(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='viewer')
     department = models.CharField(max_length=100, blank=True, null=True)
     phone = models.CharField(max_length=15, blank=True, null=True)
+    # Operators and viewers only see their plant (the default one unless assigned);
+    # admins without one see all plants.
+    plant = models.ForeignKey(Plant, on_delete=models.PROTECT, null=True, blank=True, related_name='users')
     
     def __str__(self):
         return f"{self.username} ({self.role})"
     
+    def save(self, *args, **kwargs):
+        if self.plant_id is None and self.role != 'admin':
+            self.plant_id = default_plant_id()
+        super().save(*args, **kwargs)
+
     def is_admin(self):
         return self.role == 'admin'
     
@@ -1,4 +1,87 @@
 from rest_framework import permissions
+from rest_framework.exceptions import NotFound, PermissionDenied
+
+from .models import Plant, default_plant_id
+
+# Admins pick a plant with this header (or ?plant=<code>); 'all' means every plant.
+PLANT_HEADER = 'X-Plant'
+ALL_PLANTS = 'all'
+
+
+def _requested_plant(request):
+    return (request.headers.get(PLANT_HEADER) or request.GET.get('plant') or '').strip()
+
+
+def plant_scope(request):
+    """
+    Id of the plant ``request`` is limited to, or None for every plant.
+
+    Operators and viewers are always limited to their own plant and may not
+    ask for another. Admins see the plant they ask for, else their own, else
+    every plant.
+    """
+    if hasattr(request, '_plant_scope'):
+        return request._plant_scope
+    user = request.user
+    code = _requested_plant(request)
+    if getattr(user, 'role', None) == 'admin':
+        if code == ALL_PLANTS or (not code and user.plant_id is None):
+            scope = None
+        elif code:
+            scope = Plant.objects.filter(code=code).values_list('pk', flat=True).first()
+            if scope is None:
+                raise NotFound(f"Unknown plant '{code}'.")
+        else:
+            scope = user.plant_id
+    else:
+        if getattr(user, 'plant_id', None) is None:
+            raise PermissionDenied('Your account is not assigned to a plant.')
+        if code and code != user.plant.code:
+            raise PermissionDenied('You do not have access to this plant.')
+        scope = user.plant_id
+    request._plant_scope = scope
+    return scope
+
+
+def write_plant(request):
+    """Id of the plant rows created by ``request`` belong to."""
+    scope = plant_scope(request)
+    return scope if scope is not None else default_plant_id()
+
+
+def scope_to_plant(queryset, request, field='plant'):
+    """``queryset`` limited to the request's plant; ``field`` is the lookup path to the plant."""
+    scope = plant_scope(request)
+    return queryset if scope is None else queryset.filter(**{field: scope})
+
+
+def plant_of(obj, field='plant'):
+    """Id of the plant ``obj`` belongs to, following the ``field`` lookup path."""
+    *path, last = field.split('__')
+    for name in path:
+        obj = getattr(obj, name, None)
+        if obj is None:
+            return None
+    return getattr(obj, f'{last}_id', None)
+
+
+class HasPlantAccess(permissions.BasePermission):
+    """
+    The request's plant (``X-Plant``) is one the user may see, and so is the
+    object's. Views name the path to the plant in ``plant_field``.
+    """
+    message = 'You do not have access to this plant.'
+
+    def has_permission(self, request, view):
+        if not request.user.is_authenticated:
+            return False
+        plant_scope(request)
+        return True
+
+    def has_object_permission(self, request, view, obj):
+        scope = plant_scope(request)
+        return scope is None or plant_of(obj, getattr(view, 'plant_field', 'plant')) == scope
+
 
 class IsAdmin(permissions.BasePermission):
     def has_permission(self, request, view):